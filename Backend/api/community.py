@@ -4,6 +4,10 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from Backend.model.user_model import User
 from Backend.model.community_model import Community, CommunityCategory, Category
 from Backend.model.homepage_model import UserCommunity
+from Backend.model.post_model import TimelineEntry
+from Backend.model.database_model import db
+from Backend.presence import presence, COMMUNITY
+from Backend.friend_graph import friend_graph
 from Backend.api.loopImage import upload_image, upload_parser, allowed_file
 
 community_ns = Namespace("Community", description="create community")
@@ -50,6 +54,7 @@ class CreateCommunity(Resource):
 
         community = Community.create(name=name, description=description, members=1, owner=user)
         UserCommunity.create(user=user, community=community)
+        presence.add_membership(user.id, COMMUNITY, community.id)
 
         for category_id in categories:
             category = Category.get_or_none(id=category_id)
@@ -163,15 +168,18 @@ class CommunityMembers(Resource):
             return {"msg": "Community not found"}, 404
 
         # Get all members
-        join_qs = UserCommunity.select().where(UserCommunity.community == community)
-        members = [join.user for join in join_qs]
+        members = list(User
+                       .select()
+                       .join(UserCommunity, on=(UserCommunity.user == User.id))
+                       .where(UserCommunity.community == community))
 
-        # Include is_friend field
+        # Include is_friend field, answered for all members at once from the friend graph
+        friends = friend_graph.are_friends(user.id, [m.id for m in members])
         out = []
-        for m in members:
+        for m, profile in zip(members, User.to_dicts(members)):
             out.append({
-                **m.to_dict(),
-                "is_friend": m.is_friend_with(user)
+                **profile,
+                "is_friend": friends[m.id]
             })
 
         return out, 200
@@ -198,11 +206,14 @@ class LeaveCommunity(Resource):
         if not uc_link:
             return {"msg": "You are not a member of this community."}, 400
 
-        uc_link.delete_instance()
+        with db.atomic():
+            uc_link.delete_instance()
+            TimelineEntry.remove(user, community)
 
-        # Decrement member count
-        community.members = Community.members - 1
-        community.save()
+            # Decrement member count
+            community.members = Community.members - 1
+            community.save()
+        presence.remove_membership(user.id, COMMUNITY, community.id)
 
         return {"msg": "Successfully left the community."}, 200
 
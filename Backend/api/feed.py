@@ -1,11 +1,16 @@
 import uuid
 from flask import request, jsonify
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource, fields, reqparse
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from peewee import JOIN, Expression, fn, prefetch
 from Backend.model.user_model import User
 from Backend.model.image_model import Image
-from Backend.model.post_model import Post, Comment, Like
+from Backend.model.post_model import Post, Comment, Like, TimelineEntry, SEARCH_LANGUAGE
+from Backend.model.database_model import db
+from Backend.model.community_model import CommunityCategory, Category
 from Backend.model.homepage_model import Community, UserCommunity
+from Backend.api.pagination import keyset_page, uuid_str
+from datetime import datetime
 
 
 post_ns = Namespace("Post", description="Post and comment handling")
@@ -24,52 +29,115 @@ comment_model = post_ns.model("Comment", {
 })
 
 
+feed_parser = reqparse.RequestParser()
+feed_parser.add_argument("limit", type=int, help="Page size (default 20, max 100)")
+feed_parser.add_argument("before", type=str, help="Cursor returned as next_cursor by the previous page")
+
+post_feed_parser = feed_parser.copy()
+post_feed_parser.add_argument("sort", type=str, choices=("new", "hot"), default="new", help="Chronological or hot ranking")
+
+search_parser = feed_parser.copy()
+search_parser.add_argument("q", type=str, required=True, help="Search terms (web search syntax)")
+search_parser.add_argument("community_id", type=int, help="Only search this community")
+
+# Everything but the search vector, which is only needed inside WHERE clauses
+POST_COLUMNS = [field for field in Post._meta.sorted_fields if field is not Post.search_vector]
+
+
+def serialize_posts(posts, current_user_id=None):
+    """Serialize a page of posts with a fixed number of queries.
+
+    `posts` must have been selected together with their author, the author's
+    profile picture and the community (see `feed_page_query`).
+    """
+    if not posts:
+        return []
+
+    post_ids = [p.id for p in posts]
+
+    # Communities with owner, picture and categories: 2 queries for the whole page
+    Owner = User.alias()
+    Picture = Image.alias()
+    communities_query = (
+        Community
+        .select(Community, Owner, Picture)
+        .join(Owner, on=(Community.owner == Owner.id), attr="owner")
+        .switch(Community)
+        .join(Picture, JOIN.LEFT_OUTER, on=(Community.community_picture == Picture.id), attr="community_picture")
+        .where(Community.id.in_({p.community_id for p in posts}))
+    )
+    categories_query = CommunityCategory.select(CommunityCategory, Category).join(Category)
+    communities = {c.id: c.to_dict() for c in prefetch(communities_query, categories_query)}
+
+    # Which of these posts has the caller liked: 1 query
+    liked = Like.liked_post_ids(current_user_id, post_ids)
+
+    # Latest few comments per post with their authors: 1 query
+    comments = Comment.latest_by_post(post_ids)
+
+    out = []
+    for p in posts:
+        pic = p.author.profile_picture
+        out.append({
+            "id":           str(p.id),
+            "author":       {
+                "username": p.author.username,
+                "photo_url": pic.url if pic is not None else "",
+            },
+            "community":    communities[p.community_id],
+            "topic":        p.topic,
+            "content":      p.content,
+            "created_at":   p.created_at.isoformat(),
+            "likes":        p.likes,
+            "liked_by_user": p.id in liked,
+            "comment_count": p.comment_count,
+            "comments":     [comment.to_dict() for comment in comments[p.id]],
+        })
+    return out
+
+
+def feed_page_query():
+    # Post + author + author's picture + community in a single query
+    return (
+        Post
+        .select(*POST_COLUMNS, User, Image, Community)
+        .join(User, on=(Post.author == User.id))
+        .join(Image, JOIN.LEFT_OUTER, on=(User.profile_picture == Image.id))
+        .switch(Post)
+        .join(Community)
+    )
+
+
+def post_key(post):
+    return post.created_at, str(post.id)
+
+
+def hot_post_key(post):
+    return post.hot_score, str(post.id)
+
+
 @post_ns.route("")
 class PostFeed(Resource):
     @jwt_required(optional=True)
+    @post_ns.expect(post_feed_parser)
     def get(self):
         current = get_jwt_identity()
-        posts_out = []
-
-        # pull all posts (or your filtered query)
-        posts_query = Post.select().order_by(Post.created_at.desc())
 
-        for p in posts_query:
-            # 1) total likes
-            total_likes = Like.select().where(Like.post == p).count()
+        # The parser rejects any sort but "new" and "hot" with a 400
+        sort = post_feed_parser.parse_args()["sort"]
 
-            # 2) has *this* user liked it?
-            liked = False
-            if current:
-                liked = Like.select().where(
-                    (Like.post == p) & (Like.user_id == current)
-                ).exists()
-
-            pic = p.author.profile_picture
-            if isinstance(pic, Image):
-               photo_url = pic.url
+        try:
+            if sort == "hot":
+                # Scores are maintained on write and decayed by `flask decay-hot-scores`
+                posts, next_cursor = keyset_page(
+                    feed_page_query(), (Post.hot_score, Post.id), (float, uuid_str), hot_post_key)
             else:
-               photo_url = pic or ""
-
-            posts_out.append({
-                "id":           str(p.id),
-                "author":       {
-                    "username": p.author.username,
-                    "photo_url": photo_url,
-                },
-                "community":    p.community.to_dict(),
-                "topic":        p.topic,
-                "content":      p.content,
-                "created_at":   p.created_at.isoformat(),
-                "likes":        total_likes,
-                "liked_by_user":liked,
-                "comments": [
-                   comment.to_dict()
-                   for comment in p.comments.order_by(Comment.created_at.asc())
-               ],
-            })
-
-        return posts_out, 200
+                posts, next_cursor = keyset_page(
+                    feed_page_query(), (Post.created_at, Post.id), (datetime, uuid_str), post_key)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        return {"posts": serialize_posts(posts, current), "next_cursor": next_cursor}, 200
 
     @jwt_required()
     @post_ns.expect(post_model)
@@ -97,19 +165,80 @@ class PostFeed(Resource):
         if not membership:
             return {"error": "You must join this community first"}, 403
 
-        # 4) Create the post against the FK
-        post = Post.create(
-            id        = str(uuid.uuid4()),
-            author    = user,
-            community = comm,
-            topic     = data.get("topic"),
-            content   = data.get("content")
-        )
+        # 4) Create the post against the FK and push it onto members' timelines
+        with db.atomic():
+            post = Post.create(
+                id        = str(uuid.uuid4()),
+                author    = user,
+                community = comm,
+                topic     = data.get("topic"),
+                content   = data.get("content")
+            )
+            TimelineEntry.fan_out(post)
         # Reload the post to refresh the author relationship
         post = Post.get(Post.id == post.id)
         return jsonify(post.to_dict())
 
 
+@post_ns.route("/timeline")
+class HomeTimeline(Resource):
+    @jwt_required()
+    @post_ns.expect(feed_parser)
+    def get(self):
+        # Posts from the caller's joined communities, read from their materialized timeline
+        current = get_jwt_identity()
+
+        query = (
+            feed_page_query()
+            .switch(Post)
+            .join(TimelineEntry, on=(TimelineEntry.post == Post.id))
+            .where(TimelineEntry.user == current)
+        )
+        try:
+            posts, next_cursor = keyset_page(
+                query, (TimelineEntry.created_at, TimelineEntry.post), (datetime, uuid_str), post_key)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        return {"posts": serialize_posts(posts, current), "next_cursor": next_cursor}, 200
+
+
+@post_ns.route("/search")
+class SearchPosts(Resource):
+    @jwt_required(optional=True)
+    @post_ns.expect(search_parser)
+    def get(self):
+        current = get_jwt_identity()
+
+        terms = request.args.get("q", "").strip()
+        if not terms:
+            return {"error": "Search query is required"}, 400
+
+        # Matches come from the GIN index on search_vector, best ranked first
+        tsquery = fn.websearch_to_tsquery(SEARCH_LANGUAGE, terms)
+        rank = fn.ts_rank(Post.search_vector, tsquery).cast("float8")
+        query = (
+            feed_page_query()
+            .select_extend(rank.alias("rank"))
+            .where(Expression(Post.search_vector, "@@", tsquery))
+        )
+
+        community_id = request.args.get("community_id")
+        if community_id:
+            try:
+                query = query.where(Post.community == int(community_id))
+            except ValueError:
+                return {"error": "Invalid community_id"}, 400
+
+        try:
+            posts, next_cursor = keyset_page(
+                query, (rank, Post.id), (float, uuid_str), lambda post: (post.rank, str(post.id)))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        return {"posts": serialize_posts(posts, current), "next_cursor": next_cursor}, 200
+
+
 @post_ns.route("/<string:post_id>/like")
 class LikePost(Resource):
     @jwt_required()
@@ -120,20 +249,10 @@ class LikePost(Resource):
         if not post or not user:
             return {"error": "Not found"}, 404
 
-        # Toggle the Like row
-        existing = Like.get_or_none((Like.post == post) & (Like.user == user))
-        if existing:
-            existing.delete_instance()
-        else:
-            Like.create(post=post, user=user)
+        # Toggle the Like row and bump Post.likes in the same transaction
+        liked, total = Like.toggle(post, user)
 
-        # Recompute the true count
-        total = Like.select().where(Like.post == post).count()
-        # (optional) persist it if you want to keep post.likes in sync
-        post.likes = total
-        post.save()
-
-        return {"likes": total, "liked_by_user": existing is None}, 200
+        return {"likes": total, "liked_by_user": liked}, 200
 
 
 @post_ns.route("/<string:post_id>/comment")
@@ -160,9 +279,43 @@ class CommentPost(Resource):
         if not content:
             return jsonify({"error": "Comment content is required"}), 400
 
-        comment = Comment.create(
-            post=post,
-            user=user,
-            content=content
+        comment = Comment.add(post, user, content)
+        return jsonify(comment.to_dict())
+
+
+def comment_key(comment):
+    return comment.created_at, comment.id
+
+
+@post_ns.route("/<string:post_id>/comments")
+class PostComments(Resource):
+    @jwt_required(optional=True)
+    @post_ns.expect(feed_parser)
+    def get(self, post_id):
+        # Newest first; pass next_cursor as `before` to scroll back through the thread
+        try:
+            uuid.UUID(post_id)
+        except ValueError:
+            return {"error": "Invalid post ID. Please try again."}, 400
+
+        post = Post.get_or_none(Post.id == post_id)
+        if not post:
+            return {"error": "Post not found"}, 404
+
+        query = (
+            Comment
+            .select(Comment, User)
+            .join(User)
+            .where(Comment.post == post)
         )
-        return jsonify(comment.to_dict())
\ No newline at end of file
+        try:
+            comments, next_cursor = keyset_page(
+                query, (Comment.created_at, Comment.id), (datetime, int), comment_key)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        return {
+            "comments": [comment.to_dict() for comment in comments],
+            "comment_count": post.comment_count,
+            "next_cursor": next_cursor,
+        }, 200
\ No newline at end of file
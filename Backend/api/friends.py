@@ -1,12 +1,24 @@
-from flask import jsonify, request
+from flask import request
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from flask_restx import Namespace, Resource, fields
-from peewee import DoesNotExist, IntegrityError, fn
-from Backend.model.user_model import User, Friend
+from flask_restx import Namespace, Resource, fields, reqparse
+from peewee import JOIN, DoesNotExist, IntegrityError
+from Backend.model.user_model import User, Friend, Friendship, FriendSuggestion
+from Backend.model.image_model import Image
+from Backend.api.pagination import keyset_page
 from datetime import datetime
 from Backend.model.database_model import db
+from Backend.presence import presence
+from Backend.friend_graph import friend_graph
 friends_ns = Namespace('Friends', "Friends Space")
 
+SUGGESTIONS_PER_REQUEST = 10
+# Counts change rarely and only need to be roughly current
+COUNTS_MAX_AGE = 30
+
+page_parser = reqparse.RequestParser()
+page_parser.add_argument("limit", type=int, help="Page size (default 20, max 100)")
+page_parser.add_argument("before", type=str, help="Cursor returned as next_cursor by the previous page")
+
 # Helper to find user identity
 
 
@@ -57,46 +69,97 @@ friend_list_model = friends_ns.model('FriendList', {
 @friends_ns.route("/suggestions")
 class SuggestUsers(Resource):
     @friends_ns.doc('get_suggested_users')
+    @friends_ns.expect(page_parser)
     @friends_ns.response(200, 'List of users not yet connected')
     @friends_ns.response(401, 'Unauthorized (JWT token required)')
     def get(self):
         current_user = get_user()
-        existing_relations = Friend.select().where(
-            (Friend.user == current_user) | (
-                Friend.connected_user == current_user)
+        # Anyone with a Friend row either way, whatever its status
+        related = (Friend.select(Friend.connected_user).where(Friend.user == current_user) |
+                   Friend.select(Friend.user).where(Friend.connected_user == current_user))
+
+        # Ranked lists come from `flask refresh-friend-suggestions`; connections
+        # made since it last ran are filtered out here
+        suggested_users = (
+            User
+            .select(User, Image, FriendSuggestion.score)
+            .join(FriendSuggestion, on=(FriendSuggestion.suggested_user == User.id), attr='suggestion')
+            .switch(User)
+            .join(Image, JOIN.LEFT_OUTER, on=(User.profile_picture == Image.id))
+            .where((FriendSuggestion.user == current_user) & ~(User.id.in_(related)))
         )
-        connected_ids = {current_user}
-        for relation in existing_relations:
-            connected_ids.add(relation.user.id)
-            connected_ids.add(relation.connected_user.id)
+        try:
+            users, next_cursor = keyset_page(
+                suggested_users, (FriendSuggestion.score, FriendSuggestion.suggested_user), (float, int),
+                lambda user: (user.suggestion.score, user.id))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        users = User.to_dicts(users)
 
-        suggested_users = User.select().where(~User.id.in_(connected_ids)).limit(10)
+        if not users and not request.args.get("before"):
+            # Nothing computed yet (e.g. a new account): one unpaged list of friends of
+            # friends, most mutual friends first
+            nearby = [user_id for user_id, _ in
+                      friend_graph.friends_of_friends(int(current_user), SUGGESTIONS_PER_REQUEST * 2)]
+            if nearby:
+                rank = {user_id: i for i, user_id in enumerate(nearby)}
+                candidates = User.select().where(User.id.in_(nearby) & ~(User.id.in_(related)))
+                users = sorted(User.to_dicts(candidates), key=lambda user: rank[user["id"]])
+                users = users[:SUGGESTIONS_PER_REQUEST]
+        if not users and not request.args.get("before"):
+            # Then anyone not yet connected
+            fallback = (User.select()
+                        .where((User.id != current_user) & ~(User.id.in_(related)))
+                        .limit(SUGGESTIONS_PER_REQUEST))
+            users = User.to_dicts(fallback)
+        return {"users": users, "next_cursor": next_cursor}, 200
 
-        users = []
-        for user in suggested_users:
-            users.append(user.to_dict())
-        return jsonify(users)
+
+@friends_ns.route("/mutual/<string:email>")
+class MutualFriends(Resource):
+    @friends_ns.doc('get_mutual_friends')
+    @friends_ns.response(401, 'Unauthorized (JWT token required)')
+    @friends_ns.response(404, 'User not found')
+    def get(self, email):
+        current_user = int(get_user())
+        other = get_user_or_404(email)
+        mutual = friend_graph.mutual_friends(current_user, other.id)
+        users = User.select().where(User.id.in_(mutual)).order_by(User.id) if mutual else []
+        return {"count": len(mutual), "friends": User.cards(users)}, 200
 
 
 @friends_ns.route("/list")
 class GetFriendsList(Resource):
     @friends_ns.doc('get_friend_list')
+    @friends_ns.expect(page_parser)
+    @friends_ns.response(401, 'Unauthorized (JWT token required)')
+    def get(self):
+        current_user = get_user()
+        # Ordered by friend id, so a page is a range of the (user, friend) index
+        friends_query = (User
+                         .select(User, Image)
+                         .join(Friendship, on=(Friendship.friend == User.id))
+                         .switch(User)
+                         .join(Image, JOIN.LEFT_OUTER, on=(User.profile_picture == Image.id))
+                         .where(Friendship.user == current_user))
+        try:
+            friends, next_cursor = keyset_page(friends_query, (Friendship.friend,), (int,), lambda user: (user.id,))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        return {"friends": User.to_dicts(friends), "next_cursor": next_cursor}, 200
+
+
+@friends_ns.route("/counts")
+class FriendCounts(Resource):
+    @friends_ns.doc('get_friend_counts')
     @friends_ns.response(401, 'Unauthorized (JWT token required)')
     def get(self):
+        # Totals for the paged lists, kept out of them so pages stay cheap and this can be cached
         current_user = get_user()
-        friends_query = User.select().join(
-            Friend,
-            on=(
-                ((Friend.user == current_user) & (Friend.connected_user == User.id)) |
-                ((Friend.connected_user == current_user) & (Friend.user == User.id))
-            )
-        ).where(
-            (Friend.status == 'accepted') & (User.id != current_user)
-        ).distinct()
-        friends = []
-        for friend in friends_query:
-            friends.append(friend.to_dict())
-        return jsonify(friends)
+        pending = Friend.select().where(
+            (Friend.connected_user == current_user) & (Friend.status == 'pending')).count()
+        counts = {"friends": len(friend_graph.friends(int(current_user))), "pending_requests": pending}
+        return counts, 200, {"Cache-Control": f"private, max-age={COUNTS_MAX_AGE}"}
 
 
 @friends_ns.route("/request")
@@ -150,16 +213,31 @@ class SendFriendRequest(Resource):
 @friends_ns.route("/requests/pending")
 class GetPendingRequests(Resource):
     @friends_ns.doc('get_pending_requests')
+    @friends_ns.expect(page_parser)
     @friends_ns.response(200, 'Success', friends_ns.model('PendingRequestsList', {
         'pending_requests': fields.List(fields.Nested(friend_request_model))
     }))
     @friends_ns.response(401, 'Unauthorized (JWT token required)')
     def get(self):
         current_user = get_user()
-        pending_requests = Friend.select().where(
-            (Friend.status == 'pending') &
-            (Friend.connected_user_id == current_user)
-        ).distinct()
+        Requester = User.alias()
+        Recipient = User.alias()
+        pending_requests = (
+            Friend
+            .select(Friend, Requester, Image, Recipient.email)
+            .join(Requester, on=(Friend.user == Requester.id), attr='user')
+            .join(Image, JOIN.LEFT_OUTER, on=(Requester.profile_picture == Image.id), attr='profile_picture')
+            .switch(Friend)
+            .join(Recipient, on=(Friend.connected_user == Recipient.id), attr='connected_user')
+            .where((Friend.status == 'pending') & (Friend.connected_user == current_user))
+        )
+        try:
+            pending_requests, next_cursor = keyset_page(
+                pending_requests, (Friend.created_at, Friend.id), (datetime, int),
+                lambda req: (req.created_at, req.id))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
         requests = []
         for req in pending_requests:
             requests.append({
@@ -172,7 +250,7 @@ class GetPendingRequests(Resource):
                 'created_at': req.created_at.isoformat(),
                 "profile_picture_url": req.user.profile_picture.url if req.user.profile_picture is not None else None
             })
-        return jsonify(requests)
+        return {"pending_requests": requests, "next_cursor": next_cursor}, 200
 
 
 @friends_ns.route("/request/<string:request_id>/respond")
@@ -202,7 +280,15 @@ class RespondToFriendRequest(Resource):
         try:
             with db.atomic():
                 friend_request.status = 'accepted' if action == 'accept' else 'rejected'
+                friend_request.updated_at = datetime.now()
                 friend_request.save()
+                if friend_request.status == 'accepted':
+                    Friendship.link(friend_request.user_id, friend_request.connected_user_id)
+                else:
+                    Friendship.unlink(friend_request.user_id, friend_request.connected_user_id)
+            if friend_request.status == 'accepted':
+                friend_graph.add(friend_request.user_id, friend_request.connected_user_id)
+                presence.add_friendship(friend_request.user_id, friend_request.connected_user_id)
             return {
                 "request_id": str(friend_request.id),
                 "requester": friend_request.user.email,
@@ -4,6 +4,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from Backend.model.user_model import User
 from Backend.model.message_model import GroupChat, GroupChatMember
 from Backend.model.database_model import db
+from Backend.presence import presence, GROUP
 
 groupchat_ns = Namespace('GroupChat', description='Group chat operations')
 
@@ -26,9 +27,13 @@ class GroupChatAPI(Resource):
 
         with db.atomic():
             group = GroupChat.create(name=group_name, creator=creator)
-            GroupChatMember.create(group=group, user=creator)
+            GroupChatMember.join(group, creator)
+            members = [creator]
             for email in member_emails:
                 member = User.get(User.email == email)
-                GroupChatMember.create(group=group, user=member)
+                GroupChatMember.join(group, member)
+                members.append(member)
+        for member in members:
+            presence.add_membership(member.id, GROUP, group.id)
 
         return {"message": "Group chat created", "group_id": group.id}, 201
@@ -1,9 +1,13 @@
 from flask import jsonify, request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from peewee import IntegrityError
 from Backend.model.user_model import User
 from Backend.model.homepage_model import Announcement, Event, UserCommunity, RSVP
 from Backend.model.community_model import Community
+from Backend.model.post_model import TimelineEntry
+from Backend.model.database_model import db
+from Backend.presence import presence, COMMUNITY
 from datetime import datetime, timedelta
 
 homepage_ns = Namespace("Homepage", description="Joining communities and events")
@@ -95,10 +99,18 @@ class JoinCommunity(Resource):
         ).exists():
             return {"msg": "Already a member"}, 400
 
-        UserCommunity.create(user=user, community=community)
-
-        community.members += 1
-        community.save()
+        try:
+            with db.atomic():
+                UserCommunity.create(user=user, community=community)
+                # Pull the community's existing posts into the new member's timeline
+                TimelineEntry.backfill(user, community)
+
+                community.members += 1
+                community.save()
+        except IntegrityError:
+            # Lost a race with a concurrent join (unique on user, community)
+            return {"msg": "Already a member"}, 400
+        presence.add_membership(user.id, COMMUNITY, community.id)
 
         return {"msg": "Community joined!"}, 200
 
@@ -135,7 +147,10 @@ class RSVPEvent(Resource):
         if RSVP.select().where((RSVP.user == user) & (RSVP.event == event)).exists():
             return {"msg": "Already RSVPed"}, 400
 
-        RSVP.create(user=user, event=event)
+        try:
+            RSVP.create(user=user, event=event)
+        except IntegrityError:
+            return {"msg": "Already RSVPed"}, 400
 
         return {"msg": "RSVP successful!"}
 
@@ -1,12 +1,16 @@
 from flask import request, jsonify
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource, fields, reqparse
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from peewee import fn
-from Backend.model import message_model
-from Backend.model.message_model import (Message, MessageRead, GroupChat, GroupChatMember, GroupMessage,
-                                         CommunityMessage, CommunityMessageRead)
+from peewee import JOIN, Case, Expression, Select, Value, ValuesList, fn
+from Backend.model.message_model import (Message, GroupChat, GroupChatMember, GroupMessage,
+                                         CommunityMessage, ReadWatermark, UnreadCounter, UnreadTotal, search_text)
+from Backend.model.post_model import SEARCH_LANGUAGE
 from Backend.model.user_model import User
+from Backend.model.image_model import Image
 from Backend.model.homepage_model import UserCommunity
+from Backend.api.pagination import keyset_page, message_page, parse_limit, MESSAGE_PAGE_SIZE
+from Backend.message_archive import archived_messages, direct_conversation
+from Backend.presence import presence, GROUP
 
 
 message_ns = Namespace('Message', description='Messaging operations')
@@ -24,6 +28,78 @@ new_message = message_ns.model('NewCommunityMessage', {
     'text': fields.String(required=True, description='The content of the message')
 })
 
+sync_request = message_ns.model('SyncRequest', {
+    'direct': fields.Raw(description='{"<partner email>": last seen message id}'),
+    'group': fields.Raw(description='{"<group id>": last seen message id}'),
+    'community': fields.Raw(description='{"<community id>": last seen message id}'),
+    'limit': fields.Integer(description='Most messages returned per conversation (default 50, max 100)'),
+})
+
+history_parser = reqparse.RequestParser()
+history_parser.add_argument('limit', type=int, help='Page size (default 50, max 100)')
+history_parser.add_argument('before', type=int, help='Only messages older than this message id')
+history_parser.add_argument('after', type=int, help='Only messages newer than this message id')
+
+search_parser = reqparse.RequestParser()
+search_parser.add_argument('q', type=str, required=True, help='Search terms (web search syntax)')
+search_parser.add_argument('with', type=str, help='Only direct messages with this user (email)')
+search_parser.add_argument('group_id', type=int, help='Only this group chat')
+search_parser.add_argument('community_id', type=int, help='Only this community chat')
+search_parser.add_argument('limit', type=int, help='Page size (default 20, max 100)')
+search_parser.add_argument('before', type=str, help='Cursor from the previous page')
+
+
+def sender_of(message):
+    # Archived messages can outlive their sender's account
+    try:
+        return message.sender
+    except User.DoesNotExist:
+        return None
+
+
+def direct_message_dict(m):
+    sender = sender_of(m)
+    return {
+        "id": str(m.id),
+        "text": m.text,
+        "from": sender.email if sender else None,
+        "timestamp": m.date.isoformat() + "Z"
+    }
+
+
+def group_message_dict(m):
+    sender = sender_of(m)
+    return {
+        "id": str(m.id),
+        "text": m.text,
+        "from": sender.email if sender else None,
+        "username": sender.username if sender else None,
+        "avatar": sender.profile_picture.url if sender and sender.profile_picture else None,
+        "timestamp": m.date.isoformat() + "Z"
+    }
+
+
+def with_archived(model, messages, conversation):
+    # Once a history page runs past the oldest message left in the database,
+    # the rest of it comes from the archived months of that conversation
+    limit = parse_limit(request.args.get("limit"), default=MESSAGE_PAGE_SIZE)
+    if request.args.get("after") or len(messages) >= limit:
+        return messages
+    before = messages[0].id if messages else request.args.get("before")
+    return archived_messages(model, conversation, int(before) if before else None, limit - len(messages)) + messages
+
+
+def community_message_dict(message):
+    sender = sender_of(message)
+    return {
+        'id': message.id,
+        'from': sender.email if sender else None,
+        'from_name': (sender.username or sender.email) if sender else None,
+        'from_profile_picture': sender.profile_picture.url if sender and sender.profile_picture else None,
+        'text': message.text,
+        'timestamp': str(message.date)
+    }
+
 
 def check_user_is_member_of_community(user, community_id):
     return UserCommunity.select().where(
@@ -33,7 +109,7 @@ def check_user_is_member_of_community(user, community_id):
 @message_ns.route("/community/<int:community_id>/messages")
 class CommunityChat(Resource):
     @jwt_required()
-
+    @message_ns.expect(history_parser)
     def get(self, community_id):
         user_id = get_jwt_identity()
         try:
@@ -42,11 +118,17 @@ class CommunityChat(Resource):
             if not check_user_is_member_of_community(user, community_id):
                 return {"error": "You are not a member of this community"}, 403
 
-            messages = (CommunityMessage
-                        .select()
-                        .where(CommunityMessage.community == community_id)
-                        .order_by(CommunityMessage.date.asc())
-                        )
+            query = (CommunityMessage
+                     .select(CommunityMessage, User, Image)
+                     .join(User, on=(CommunityMessage.sender == User.id))
+                     .join(Image, JOIN.LEFT_OUTER, on=(User.profile_picture == Image.id))
+                     .where(CommunityMessage.community == community_id)
+                     )
+            try:
+                messages = message_page(query, CommunityMessage.id)
+            except ValueError as e:
+                return {"error": str(e)}, 400
+            messages = with_archived(CommunityMessage, messages, str(community_id))
 
             #     'id': fields.Integer,
             #     'sender': fields.String,
@@ -54,17 +136,10 @@ class CommunityChat(Resource):
             #     'timestamp': fields.String,
             #     'delivered': fields.Boolean
 
-            return [
-                {
-                    'id': message.id,
-                    'from': message.sender.email,
-                    'from_name': message.sender.username if message.sender.username else message.sender.email,
-                    'from_profile_picture': message.sender.profile_picture.url if message.sender.profile_picture else None,
-                    'text': message.text,
-                    'timestamp': str(message.date)
-                }
-                for message in messages
-            ]
+            if messages:
+                ReadWatermark.advance(user, ReadWatermark.COMMUNITY, community_id, max(m.id for m in messages))
+
+            return [community_message_dict(message) for message in messages]
 
         except User.DoesNotExist:
             return {"error": "User not found"}, 404
@@ -88,6 +163,149 @@ def post(self, community_id):
     return msg, 201
 
 
+def distinct_partners(user, own, other):
+    """CTE of the distinct `other` ids of messages whose `own` side is the user.
+
+    A loose index scan: each step probes the (own, other, id) index for the next
+    partner id, so it costs one probe per partner rather than a read of every message.
+    """
+    First, Next = Message.alias(), Message.alias()
+    base = (First
+            .select(fn.MIN(getattr(First, other)).alias("partner"))
+            .where(getattr(First, own) == user.id)
+            .cte(f"partners_{other}", recursive=True, columns=("partner",)))
+    following = (Next
+                 .select(fn.MIN(getattr(Next, other)))
+                 .where((getattr(Next, own) == user.id) & (getattr(Next, other) > base.c.partner)))
+    step = Select([base], [following]).where(base.c.partner.is_null(False))
+    return base.union_all(step)
+
+
+def direct_conversation_summaries(user):
+    """One summary per direct-message partner, newest conversation first.
+
+    Five queries however long the history: each partner's latest message id,
+    those messages, the partners with their pictures, the caller's unread
+    counters, and the partners' read watermarks. Partners are found and their
+    latest ids taken by probing the (sender, recipient, id) and
+    (recipient, sender, id) indexes, never by reading the whole inbox.
+    """
+    sent_to = distinct_partners(user, "sender", "recipient")
+    received_from = distinct_partners(user, "recipient", "sender")
+    partners = (Select([sent_to], [sent_to.c.partner]).where(sent_to.c.partner.is_null(False))
+                | Select([received_from], [received_from.c.partner]).where(received_from.c.partner.is_null(False)))
+
+    Sent, Received = Message.alias(), Message.alias()
+    Partner = partners.alias("partner_ids")
+    latest_ids = [message_id for (message_id,) in (
+        Message
+        .select(fn.GREATEST(
+            Sent.select(fn.MAX(Sent.id)).where((Sent.sender == user.id) & (Sent.recipient == Partner.c.partner)),
+            Received.select(fn.MAX(Received.id)).where(
+                (Received.sender == Partner.c.partner) & (Received.recipient == user.id))))
+        .from_(Partner)
+        .with_cte(sent_to, received_from)
+        .tuples()
+    )]
+    if not latest_ids:
+        return []
+    # Fetched by id in a second query: the planner can't size the partner list
+    # above, and joined to it would rather hash the whole message table
+    latest = list(
+        Message
+        .select()
+        .where(Message.id.in_(latest_ids))
+        .order_by(Message.date.desc(), Message.id.desc())
+    )
+
+    user_ids = {m.sender_id for m in latest} | {m.recipient_id for m in latest}
+    users = {
+        u.id: u for u in
+        User.select(User, Image)
+        .join(Image, JOIN.LEFT_OUTER, on=(User.profile_picture == Image.id))
+        .where(User.id.in_(user_ids))
+    }
+
+    unread_counts = unread_counters(user, ReadWatermark.DIRECT)
+
+    # How far each partner has read their conversation with the caller
+    partner_read = dict(
+        ReadWatermark
+        .select(ReadWatermark.user, ReadWatermark.last_read_id)
+        .where(
+            (ReadWatermark.kind == ReadWatermark.DIRECT) &
+            (ReadWatermark.conversation_id == user.id) &
+            (ReadWatermark.user.in_(user_ids))
+        )
+        .tuples()
+    )
+
+    summaries = []
+    for msg in latest:
+        sender, recipient = users[msg.sender_id], users[msg.recipient_id]
+        from_me = msg.sender_id == user.id
+        other = recipient if from_me else sender
+        summaries.append({
+            "conversation_id": "_".join(sorted([user.email, other.email])),
+            "is_group": False,
+            "last_message": {
+                "message": msg.text,
+                "timestamp": msg.date.isoformat() + "Z"
+            },
+            "sender_id": sender.email,
+            "sender_pfp": sender.profile_picture.url if sender.profile_picture else None,
+            "recipient_id": recipient.email,
+            "recipient_pfp": recipient.profile_picture.url if recipient.profile_picture else None,
+            "delivered": msg.delivered,
+            "other_user_username": other.username,
+            "other_user_email": other.email,
+            "unread_count": unread_counts.get(other.id, 0),
+            "from_me": from_me,
+            "recipient_seen": from_me and msg.id <= partner_read.get(other.id, 0)
+        })
+    return summaries
+
+
+def unread_counters(user, kind):
+    # {conversation id: unread count}, maintained as messages are written and read
+    return dict(
+        UnreadCounter
+        .select(UnreadCounter.conversation_id, UnreadCounter.count)
+        .where((UnreadCounter.user == user) & (UnreadCounter.kind == kind))
+        .tuples()
+    )
+
+
+def group_conversation_summaries(user):
+    # Latest message of every group the user belongs to (one query) and its unread count (one more).
+    # Each group's newest id is a backward (group, id) index probe, however long its history is.
+    Latest = GroupMessage.alias()
+    latest_ids = (
+        GroupChatMember
+        .select(Latest.select(fn.MAX(Latest.id)).where(Latest.group == GroupChatMember.group))
+        .where(GroupChatMember.user == user)
+    )
+    latest = (
+        GroupMessage
+        .select(GroupMessage, GroupChat)
+        .join(GroupChat)
+        .where(GroupMessage.id.in_(latest_ids))
+        .order_by(GroupMessage.date.desc(), GroupMessage.id.desc())
+    )
+    unread_counts = unread_counters(user, ReadWatermark.GROUP)
+    return [{
+        "conversation_id": f"group_{msg.group.id}",
+        "is_group": True,
+        "group_id": msg.group.id,
+        "group_name": msg.group.name,
+        "last_message": {
+            "message": msg.text,
+            "timestamp": msg.date.isoformat() + "Z"
+        },
+        "unread_count": unread_counts.get(msg.group.id, 0)
+    } for msg in latest]
+
+
 @message_ns.route("/conversations")
 class Conversations(Resource):
     @jwt_required()
@@ -96,101 +314,26 @@ class Conversations(Resource):
         try:
             user = User.get_by_id(user_id)
 
-            # --- Direct Messages ---
-            messages = (
-                Message.select()
-                .where((Message.sender == user) | (Message.recipient == user))
-                .order_by(Message.date.desc())
-            )
-
-            conversations = {}
-
-            for msg in messages:
-                other = msg.recipient if msg.sender == user else msg.sender
-                room_id = "_".join(sorted([user.email, other.email]))
-                from_me = msg.sender == user
-
-                unread_count = (
-                    Message
-                    .select()
-                    .where(
-                        (Message.sender == other) &
-                        (Message.recipient == user) &
-                        (~Message.id.in_(
-                            MessageRead.select(MessageRead.message)
-                            .where(MessageRead.user == user)
-                        ))
-                    )
-                    .count()
-                )
-
-                recipient_seen = (
-                    from_me and
-                    MessageRead.select()
-                        .where((MessageRead.message == msg) & (MessageRead.user == msg.recipient))
-                        .exists()
-                )
-
-                if room_id not in conversations:
-                    conversations[room_id] = {
-                        "conversation_id": room_id,
-                        "is_group": False,
-                        "last_message": {
-                            "message": msg.text,
-                            "timestamp": msg.date.isoformat() + "Z"
-                        },
-                        "sender_id": msg.sender.email,
-                        "sender_pfp": msg.sender.profile_picture.url if msg.sender.profile_picture else None,
-                        "recipient_id": msg.recipient.email,
-                        "recipient_pfp": msg.recipient.profile_picture.url if msg.recipient.profile_picture else None,
-                        "delivered": msg.delivered,
-                        "other_user_username": other.username,
-                        "other_user_email": other.email,
-                        "unread_count": unread_count,
-                        "from_me": from_me,
-                        "recipient_seen": recipient_seen
-                    }
-
-            # --- Group Chats ---
-            group_memberships = (
-                message_model.GroupChatMember
-                .select()
-                .where(message_model.GroupChatMember.user == user)
-            )
-
-            for membership in group_memberships:
-                group = membership.group
-
-                # Only include if group has messages
-                latest_msg = (
-                    message_model.GroupMessage
-                    .select()
-                    .where(message_model.GroupMessage.group == group)
-                    .order_by(message_model.GroupMessage.date.desc())
-                    .first()
-                )
-
-                if latest_msg:
-                    conversations[f"group_{group.id}"] = {
-                        "conversation_id": f"group_{group.id}",
-                        "is_group": True,
-                        "group_id": group.id,
-                        "group_name": group.name,
-                        "last_message": {
-                            "message": latest_msg.text,
-                            "timestamp": latest_msg.date.isoformat() + "Z"
-                        }
-                    }
-
-            return jsonify(list(conversations.values()))
+            conversations = direct_conversation_summaries(user) + group_conversation_summaries(user)
+            return jsonify(conversations)
 
         except User.DoesNotExist:
             return {"error": "User not found"}, 404
 
 
+@message_ns.route("/unread")
+class UnreadBadge(Resource):
+    @jwt_required()
+    def get(self):
+        # Total unread direct and group messages, for the app badge
+        total = UnreadTotal.select(UnreadTotal.count).where(UnreadTotal.user == get_jwt_identity()).scalar()
+        return {"total": total or 0}, 200
+
+
 @message_ns.route("/history/<recipient_email>")
 class MessageHistory(Resource):
     @jwt_required()
+    @message_ns.expect(history_parser)
     def get(self, recipient_email):
         current_user_id = get_jwt_identity()
 
@@ -198,33 +341,27 @@ class MessageHistory(Resource):
             current_user = User.get_by_id(current_user_id)
             recipient = User.get(User.email == recipient_email)
 
-            messages = (
+            query = (
                 Message
-                .select()
+                .select(Message, User)
+                .join(User, on=(Message.sender == User.id))
                 .where(
                     ((Message.sender == current_user) & (Message.recipient == recipient)) |
                     ((Message.sender == recipient) & (Message.recipient == current_user))
                 )
-                .order_by(Message.date.asc())
             )
+            try:
+                messages = message_page(query, Message.id)
+            except ValueError as e:
+                return {"error": str(e)}, 400
+            messages = with_archived(Message, messages, direct_conversation(current_user.id, recipient.id))
 
-            # Mark unread messages as read
-            unread_messages = [
-                m for m in messages
-                if m.recipient == current_user and not MessageRead.select()
-                    .where((MessageRead.message == m) & (MessageRead.user == current_user))
-                    .exists()
-            ]
-
-            for m in unread_messages:
-                MessageRead.create(message=m, user=current_user)
+            # Mark everything up to the newest message received on this page as read
+            last_received = max((m.id for m in messages if m.recipient_id == current_user.id), default=None)
+            if last_received is not None:
+                ReadWatermark.advance(current_user, ReadWatermark.DIRECT, recipient.id, last_received)
 
-            return [{
-                "id": str(m.id),
-                "text": m.text,
-                "from": m.sender.email,
-                "timestamp": m.date.isoformat() + "Z"
-            } for m in messages]
+            return [direct_message_dict(m) for m in messages]
 
         except User.DoesNotExist:
             return {"error": "User not found"}, 404
@@ -233,27 +370,247 @@ class MessageHistory(Resource):
 @message_ns.route("/group-history/<int:group_id>")
 class GroupChatHistory(Resource):
     @jwt_required()
+    @message_ns.expect(history_parser)
     def get(self, group_id):
+        user_id = get_jwt_identity()
+        is_member = (GroupChatMember.select()
+                     .where((GroupChatMember.group == group_id) & (GroupChatMember.user == user_id))
+                     .exists())
+        if not is_member:
+            return {"error": "You are not a member of this group"}, 403
+
+        query = (
+            GroupMessage
+            .select(GroupMessage, User, Image)
+            .join(User, on=(GroupMessage.sender == User.id))
+            .join(Image, JOIN.LEFT_OUTER, on=(User.profile_picture == Image.id))
+            .where(GroupMessage.group == group_id)
+        )
         try:
-            messages = (
-                GroupMessage
-                .select(GroupMessage, User)
-                .join(User, on=(GroupMessage.sender == User.id))
-                .where(GroupMessage.group == group_id)
-                .order_by(GroupMessage.date.asc())
-            )
+            messages = message_page(query, GroupMessage.id)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        messages = with_archived(GroupMessage, messages, str(group_id))
+
+        if messages:
+            ReadWatermark.advance(user_id, ReadWatermark.GROUP, group_id, max(m.id for m in messages))
+
+        return [group_message_dict(m) for m in messages]
+
+def messages_since(model, conversation, since, limit, where):
+    """Messages after each conversation's last seen id, at most `limit` + 1 per conversation.
+
+    `since` maps conversation ids (as matched by the `conversation`
+    expression) to the last message id the client has. One query for all
+    conversations, oldest first.
+    """
+    if not since:
+        return []
+    seen = ValuesList(list(since.items())).cte('seen', columns=('conversation_id', 'last_seen_id'))
+    ranked = (
+        model
+        .select(model.id, fn.ROW_NUMBER().over(partition_by=[conversation], order_by=[model.id]).alias("position"))
+        .join(seen, on=((conversation == seen.c.conversation_id) & (model.id > seen.c.last_seen_id)))
+        .where(where)
+        .with_cte(seen)
+    )
+    return list(
+        model
+        .select(model, User, Image)
+        .join(User, on=(model.sender == User.id))
+        .join(Image, JOIN.LEFT_OUTER, on=(User.profile_picture == Image.id))
+        .switch(model)
+        .join(ranked, on=(model.id == ranked.c.id))
+        .where(ranked.c.position <= limit + 1)
+        .order_by(model.id)
+    )
 
-            return [{
-                "id": str(m.id),
-                "text": m.text,
-                "from": m.sender.email,
-                "username": m.sender.username,
-                "avatar": m.sender.profile_picture.url if m.sender.profile_picture else None,
-                "timestamp": m.date.isoformat() + "Z"
-            } for m in messages]
 
-        except Exception as e:
-            return {"error": str(e)}, 500
+def group_by_conversation(messages, conversation_of, limit, serialize, key):
+    by_conversation = {}
+    for m in messages:
+        by_conversation.setdefault(conversation_of(m), []).append(m)
+    return [{
+        key: conversation,
+        "messages": [serialize(m) for m in rows[:limit]],
+        # More than a page was missed: fetch the rest through the history endpoint with `after`
+        "has_more": len(rows) > limit,
+    } for conversation, rows in by_conversation.items()]
+
+
+def parse_since(raw):
+    if raw is None:
+        return {}
+    if not isinstance(raw, dict):
+        raise ValueError("Expected an object of conversation -> last seen message id")
+    try:
+        return {key: int(value) for key, value in raw.items()}
+    except (TypeError, ValueError) as e:
+        raise ValueError("Last seen message ids must be integers") from e
+
+
+def sync_messages(user_id, data):
+    """Everything a reconnecting client missed, in at most four queries.
+
+    `data` holds the client's last seen message id per conversation (see
+    SyncRequest). Only conversations the user can read are returned; access
+    is checked inside the queries. Raises ValueError on malformed input.
+    """
+    limit = parse_limit(data.get('limit'), default=MESSAGE_PAGE_SIZE)
+    direct = parse_since(data.get('direct'))
+    try:
+        groups = {int(group_id): seen for group_id, seen in parse_since(data.get('group')).items()}
+        communities = {int(community_id): seen for community_id, seen in parse_since(data.get('community')).items()}
+    except ValueError as e:
+        raise ValueError("Group and community ids must be integers") from e
+
+    partners = {}
+    if direct:
+        partners = dict(User.select(User.id, User.email).where(User.email.in_(list(direct))).tuples())
+    partner = Case(None, [(Message.sender == user_id, Message.recipient)], Message.sender)
+    direct_messages = messages_since(
+        Message, partner, {partner_id: direct[email] for partner_id, email in partners.items()}, limit,
+        (Message.sender == user_id) | (Message.recipient == user_id))
+
+    group_messages = messages_since(
+        GroupMessage, GroupMessage.group, groups, limit,
+        GroupMessage.group.in_(
+            GroupChatMember.select(GroupChatMember.group).where(GroupChatMember.user == user_id)))
+
+    community_messages = messages_since(
+        CommunityMessage, CommunityMessage.community, communities, limit,
+        CommunityMessage.community.in_(
+            UserCommunity.select(UserCommunity.community).where(UserCommunity.user == user_id)))
+
+    user_id = int(user_id)
+    return {
+        "direct": group_by_conversation(
+            direct_messages,
+            lambda m: partners[m.recipient_id if m.sender_id == user_id else m.sender_id],
+            limit, direct_message_dict, "email"),
+        "group": group_by_conversation(
+            group_messages, lambda m: m.group_id, limit, group_message_dict, "group_id"),
+        "community": group_by_conversation(
+            community_messages, lambda m: m.community_id, limit, community_message_dict, "community_id"),
+    }
+
+
+def search_matches(model, kind, conversation, tsquery, where):
+    # One UNION branch: the user's readable messages of one kind matching the query
+    return (model
+            .select(Value(kind).alias('kind'), model.id.alias('id'), conversation.alias('conversation_id'),
+                    model.sender.alias('sender_id'), model.text.alias('text'), model.date.alias('date'),
+                    fn.ts_rank(search_text(model), tsquery).cast('float8').alias('rank'))
+            .where(Expression(search_text(model), '@@', tsquery) & where))
+
+
+def search_query(user_id, terms, partner_id=None, group_id=None, community_id=None):
+    """Ranked matches across every conversation the user can read, as one UNION ALL query.
+
+    Each branch is a GIN index match on the message text, restricted to the
+    user's own direct messages or to groups/communities they belong to.
+    Giving one conversation's id searches only that conversation.
+    """
+    tsquery = fn.websearch_to_tsquery(SEARCH_LANGUAGE, terms)
+    only = partner_id or group_id or community_id
+    branches = []
+
+    if partner_id or not only:
+        where = (Message.sender == user_id) | (Message.recipient == user_id)
+        if partner_id:
+            where = (((Message.sender == user_id) & (Message.recipient == partner_id)) |
+                     ((Message.sender == partner_id) & (Message.recipient == user_id)))
+        partner = Case(None, [(Message.sender == user_id, Message.recipient)], Message.sender)
+        branches.append(search_matches(Message, 'direct', partner, tsquery, where))
+
+    if group_id or not only:
+        groups = GroupChatMember.select(GroupChatMember.group).where(GroupChatMember.user == user_id)
+        if group_id:
+            groups = groups.where(GroupChatMember.group == group_id)
+        branches.append(search_matches(
+            GroupMessage, 'group', GroupMessage.group, tsquery, GroupMessage.group.in_(groups)))
+
+    if community_id or not only:
+        communities = UserCommunity.select(UserCommunity.community).where(UserCommunity.user == user_id)
+        if community_id:
+            communities = communities.where(UserCommunity.community == community_id)
+        branches.append(search_matches(
+            CommunityMessage, 'community', CommunityMessage.community, tsquery,
+            CommunityMessage.community.in_(communities)))
+
+    matches = branches[0]
+    for branch in branches[1:]:
+        matches = matches.union_all(branch)
+    matches = matches.alias('matches')
+
+    partner = User.alias('partner')
+    return (User
+            .select(matches.c.kind, matches.c.id, matches.c.conversation_id, matches.c.text, matches.c.date,
+                    matches.c.rank, User.email.alias('sender_email'), partner.email.alias('partner_email'))
+            .from_(matches)
+            .join(User, on=(matches.c.sender_id == User.id))
+            .join(partner, JOIN.LEFT_OUTER, on=((matches.c.kind == 'direct') &
+                                                (partner.id == matches.c.conversation_id)))
+            .dicts()), matches
+
+
+def search_result_dict(row):
+    return {
+        "kind": row["kind"],
+        # Partner email for direct messages (as in /history/<email>), else the group/community id
+        "conversation": row["partner_email"] if row["kind"] == "direct" else row["conversation_id"],
+        "id": row["id"],
+        "text": row["text"],
+        "from": row["sender_email"],
+        "timestamp": row["date"].isoformat() + "Z",
+        "rank": row["rank"],
+    }
+
+
+@message_ns.route("/search")
+class SearchMessages(Resource):
+    @jwt_required()
+    @message_ns.expect(search_parser)
+    def get(self):
+        user_id = get_jwt_identity()
+        terms = request.args.get("q", "").strip()
+        if not terms:
+            return {"error": "Search query is required"}, 400
+
+        partner_id = None
+        if request.args.get("with"):
+            partner_id = User.select(User.id).where(User.email == request.args["with"]).scalar()
+            if partner_id is None:
+                return {"error": "User not found"}, 404
+        try:
+            group_id = int(request.args.get("group_id") or 0) or None
+            community_id = int(request.args.get("community_id") or 0) or None
+        except ValueError:
+            return {"error": "Invalid group_id or community_id"}, 400
+
+        query, matches = search_query(user_id, terms, partner_id, group_id, community_id)
+        try:
+            # Best match first; kind and id break ties, as ids repeat across the three tables
+            rows, next_cursor = keyset_page(
+                query, (matches.c.rank, matches.c.kind, matches.c.id), (float, str, int),
+                lambda row: (row["rank"], row["kind"], row["id"]))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        return {"results": [search_result_dict(row) for row in rows], "next_cursor": next_cursor}, 200
+
+
+@message_ns.route("/sync")
+class SyncMessages(Resource):
+    @jwt_required()
+    @message_ns.expect(sync_request)
+    def post(self):
+        # Reconnect catch-up: only what arrived after each conversation's last seen id
+        try:
+            return sync_messages(get_jwt_identity(), request.get_json() or {}), 200
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
 
 @message_ns.route("/group/<int:group_id>/members")
 class GroupMembers(Resource):
@@ -324,7 +681,8 @@ class AddGroupMember(Resource):
                         (GroupChatMember.group == group) & (GroupChatMember.user == user)
                     ).exists()
                     if not exists:
-                        GroupChatMember.create(group=group, user=user)
+                        GroupChatMember.join(group, user)
+                        presence.add_membership(user.id, GROUP, group.id)
                         added.append(email)
                 except User.DoesNotExist:
                     continue
@@ -351,6 +709,7 @@ class LeaveGroup(Resource):
 
             if deleted == 0:
                 return {"message": "You are not a member of this group"}, 404
+            presence.remove_membership(int(user_id), GROUP, group.id)
 
             return {"message": "Left group successfully"}, 200
 
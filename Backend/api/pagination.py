@@ -0,0 +1,92 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from flask import request
+from peewee import Tuple
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MESSAGE_PAGE_SIZE = 50
+
+
+def parse_limit(raw, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    # Clamp the requested page size so a client can't ask for the whole table
+    if raw in (None, ""):
+        return default
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid limit") from e
+    if limit < 1:
+        raise ValueError("Invalid limit")
+    return min(limit, maximum)
+
+
+def uuid_str(value):
+    # Cursor value type for UUID primary keys (psycopg2 wants them as strings)
+    return str(uuid.UUID(value))
+
+
+def encode_cursor(*values):
+    # Opaque keyset cursor, e.g. (created_at, id) of the last row on a page
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token, *types):
+    # Raises ValueError for anything that isn't a cursor we handed out
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return [datetime.fromisoformat(v) if t is datetime else t(v) for v, t in zip(values, types)]
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_page(query, key_fields, key_types, key_of):
+    """Apply the request's limit/before keyset pagination, largest key first.
+
+    `key_fields` are the sort columns (the last one must make the key unique),
+    `key_types` how to decode each cursor value and `key_of(row)` the key
+    values of a returned row. Returns the page's rows and the cursor for the
+    next page (or None). Raises ValueError on a bad limit or cursor.
+    """
+    limit = parse_limit(request.args.get("limit"))
+
+    before = request.args.get("before")
+    if before:
+        values = decode_cursor(before, *key_types)
+        query = query.where(Tuple(*key_fields) < Tuple(*values))
+
+    rows = list(query.order_by(*[field.desc() for field in key_fields]).limit(limit + 1))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*key_of(rows[-1]))
+    return rows, next_cursor
+
+
+def message_page(query, id_field):
+    """Page a chat history by message id, returned oldest first.
+
+    With no cursor this is the latest page; `before=<id>` scrolls back and
+    `after=<id>` fetches what arrived since. Raises ValueError on bad arguments.
+    """
+    limit = parse_limit(request.args.get("limit"), default=MESSAGE_PAGE_SIZE)
+    before = request.args.get("before")
+    after = request.args.get("after")
+    if before and after:
+        raise ValueError("Use either before or after, not both")
+
+    try:
+        if after:
+            return list(query.where(id_field > int(after)).order_by(id_field.asc()).limit(limit))
+        if before:
+            query = query.where(id_field < int(before))
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+    return list(query.order_by(id_field.desc()).limit(limit))[::-1]
@@ -0,0 +1,42 @@
+from flask_restx import Namespace, Resource
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from Backend.model.homepage_model import UserCommunity
+from Backend.model.message_model import GroupChatMember
+from Backend.presence import presence, FRIENDS, COMMUNITY, GROUP
+
+presence_ns = Namespace('Presence', description='Who is online right now')
+
+
+def online_response(user_ids):
+    return {"online": sorted(user_ids), "count": len(user_ids)}, 200
+
+
+@presence_ns.route("/friends")
+class OnlineFriends(Resource):
+    @jwt_required()
+    def get(self):
+        return online_response(presence.online(FRIENDS, int(get_jwt_identity())))
+
+
+@presence_ns.route("/community/<int:community_id>")
+class OnlineInCommunity(Resource):
+    @jwt_required()
+    def get(self, community_id):
+        # Only members can see who is around in a community
+        is_member = UserCommunity.select().where(
+            (UserCommunity.community == community_id) & (UserCommunity.user == get_jwt_identity())).exists()
+        if not is_member:
+            return {"error": "Community not found"}, 404
+        return online_response(presence.online(COMMUNITY, community_id))
+
+
+@presence_ns.route("/group/<int:group_id>")
+class OnlineInGroup(Resource):
+    @jwt_required()
+    def get(self, group_id):
+        # Only members can see who is around in a group
+        is_member = GroupChatMember.select().where(
+            (GroupChatMember.group == group_id) & (GroupChatMember.user == get_jwt_identity())).exists()
+        if not is_member:
+            return {"error": "Group not found"}, 404
+        return online_response(presence.online(GROUP, group_id))
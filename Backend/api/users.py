@@ -2,10 +2,14 @@ import bcrypt
 from dotenv import load_dotenv
 from flask import request, jsonify
 from Backend.api.uploads import ALLOWED_EXTENSIONS
-from Backend.model.user_model import User, Neurotype, UserNeurotype, UserInterest, Interest
+from Backend.model.user_model import (User, Neurotype, UserNeurotype, UserInterest, Interest, Friendship,
+                                      FriendSuggestion, SuggestionState)
 from Backend.model.community_model import Community
 from Backend.model.homepage_model import UserCommunity
+from Backend.model.post_model import TimelineEntry
+from Backend.model.message_model import ReadWatermark, UnreadCounter, UnreadTotal
 from Backend.api.loopImage import upload_image, upload_parser, allowed_file
+from Backend.friend_graph import friend_graph
 
 from flask_jwt_extended import get_jwt_identity
 from flask_jwt_extended import jwt_required
@@ -167,8 +171,17 @@ class DeleteCurrentUser(Resource):
         UserNeurotype.delete().where(UserNeurotype.user == user).execute()
         UserInterest.delete().where(UserInterest.user == user).execute()
         UserCommunity.delete().where(UserCommunity.user == user).execute()
+        TimelineEntry.delete().where(TimelineEntry.user == user).execute()
+        Friendship.delete().where((Friendship.user == user) | (Friendship.friend == user)).execute()
+        FriendSuggestion.delete().where(
+            (FriendSuggestion.user == user) | (FriendSuggestion.suggested_user == user)).execute()
+        SuggestionState.delete().where(SuggestionState.user == user).execute()
+        ReadWatermark.delete().where(ReadWatermark.user == user).execute()
+        UnreadCounter.delete().where(UnreadCounter.user == user).execute()
+        UnreadTotal.delete().where(UnreadTotal.user == user).execute()
 
         # Delete the user
         user.delete_instance()
+        friend_graph.remove_user(user.id)
 
         return {"msg": "User deleted successfully"}, 200
@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, jsonify, request
 from flask_socketio import SocketIO, emit, join_room
 from Backend.api.auth import auth_ns
 from Backend.api.community import community_ns
@@ -7,18 +7,23 @@ from Backend.api.loopImage import image_ns
 from Backend.api.users import user_ns
 from Backend.api.feed import post_ns
 from Backend.api.homepage import homepage_ns
-from Backend.api.message import message_ns
+from Backend.api.message import message_ns, sync_messages
 from Backend.api.personal_profile import personal_profile_ns
 from Backend.api.groupchat import groupchat_ns
+from Backend.api.presence import presence_ns
+from Backend.cli import COMMANDS
+from Backend.socket_queue import socketio_queue_options
+from Backend.message_writer import MessageWriter
+from Backend.presence import presence, memberships_of
+from Backend.friend_graph import friend_graph
+from Backend.socket_session import DIRECT, GROUP, COMMUNITY, authenticate, start_session, current_user, join, joined
 import os
 from flask_jwt_extended import JWTManager
 from dotenv import load_dotenv
 from flask_restx import Api
 
-from peewee import DoesNotExist
-from Backend.model.database_model import db
-from Backend.model import user_model, post_model, homepage_model, image_model, community_model, message_model
-from Backend.model.user_model import User
+from Backend.model.database_model import db, pool_stats
+from Backend.model import community_model, message_model, migrations, partitions
 from Backend.model.message_model import Message
 
 UPLOAD_FOLDER = "./images"
@@ -28,7 +33,10 @@ ALLOWED_EXTENSIONS = {"txt", "pdf", "png", "jpg", "jpeg", "gif"}
 app = Flask(__name__)
 api = Api(app, doc="/docs")
 
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Async mode is set by server.py in production; unset lets Flask-SocketIO pick for local runs.
+# SOCKETIO_MESSAGE_QUEUE lets several processes share rooms (see socket_queue.py)
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=os.environ.get("SOCKETIO_ASYNC_MODE"),
+                    **socketio_queue_options())
 
 load_dotenv()  # take environment variables
 
@@ -65,110 +73,184 @@ api.add_namespace(personal_profile_ns, path="/personal_profile")
 api.add_namespace(image_ns, path="/image")
 api.add_namespace(community_ns, path="/community")
 api.add_namespace(groupchat_ns, path="/groupchats")
+api.add_namespace(presence_ns, path="/presence")
 
+for command in COMMANDS:
+    app.cli.add_command(command)
 
-db.connect()
 
-db.create_tables(
-    [user_model.User, user_model.Interest, user_model.UserInterest, user_model.Neurotype, user_model.UserNeurotype, user_model.Friend, user_model.UserPhoto, post_model.Post, post_model.Comment, post_model.Like,
-     community_model.Community, community_model.CommunityCategory, community_model.Category, homepage_model.Announcement, homepage_model.Event, homepage_model.UserCommunity, homepage_model.RSVP, image_model.Image,
-     message_model.Message, message_model.Message, message_model.CommunityMessage, message_model.CommunityMessageRead, message_model.MessageRead, message_model.GroupChat, message_model.GroupChatMember, message_model.GroupMessage])
+# Chat messages are written straight away or write-behind, per CHAT_PERSISTENCE
+message_writer = MessageWriter()
+initialized = False
 
 
-for topic in community_model.TOPICS:
-    for subtopic in community_model.TOPICS[topic]:
-        category, created = community_model.Category.get_or_create(
-            topic=topic, subtopic=subtopic)
+def init_app(background_tasks=True):
+    """Prepare the database and, for a server process, start its background tasks.
+
+    Called once by whatever runs the app (server.py, `python -m Backend.app`); the CLI,
+    tests and benchmarks pass background_tasks=False. Importing this module does neither.
+    """
+    global initialized
+    if initialized:
+        return
+    initialized = True
+
+    with db.connection_context():
+        # Creates a fresh database or applies pending migrations (see Backend/model/migrations.py)
+        migrations.migrate_database()
+        # Keeps next months' chat partitions ready even if `flask maintain-partitions` isn't scheduled
+        for model in partitions.PARTITIONED_MODELS:
+            partitions.ensure_partitions(model)
+
+        for topic in community_model.TOPICS:
+            for subtopic in community_model.TOPICS[topic]:
+                category, created = community_model.Category.get_or_create(
+                    topic=topic, subtopic=subtopic)
+
+        friend_graph.load()
+
+    if background_tasks:
+        message_writer.start(socketio)
+        # Expires sockets whose client stopped sending heartbeats (e.g. a crashed process's)
+        socketio.start_background_task(presence.run_sweeper, socketio.sleep)
+        # Picks up friendships accepted through other processes
+        socketio.start_background_task(friend_graph.run_refresher, socketio.sleep)
+
+
+# Each request borrows a pooled connection and hands it back when it's done
+@app.before_request
+def open_db_connection():
+    db.connect(reuse_if_open=True)
+
+@app.teardown_request
+def close_db_connection(exc):
+    if not db.is_closed():
+        db.close()
+
+@app.route("/health/db")
+def database_pool_stats():
+    return jsonify(pool_stats())
 
 
 @socketio.on('connect')
-def handle_connect():
-    print("Client connected")
+@db.connection_context()
+def handle_connect(auth=None):
+    # Authenticate once; chat events then read the sender from the socket session
+    user = authenticate(auth)
+    if user is None:
+        return False
+    start_session(user)
+    presence.connect(user['id'], request.sid, list(memberships_of(user['id'])))
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print("Client disconnected")
+    user = current_user()
+    if user is not None:
+        presence.disconnect(user['id'], request.sid)
+
+@socketio.on('heartbeat')
+def handle_heartbeat():
+    user = current_user()
+    if user is not None:
+        presence.heartbeat(user['id'], request.sid)
 
 @socketio.on('send_message')
+@db.connection_context()
 def handle_send_message(data):
-    try:
-        sender = User.get(User.email == data['from'])
-        recipient_email = data['room'].replace(data['from'], '').replace('_', '')
-        recipient = User.get(User.email == recipient_email)
-
-        message = Message.create(
-            text=data['text'],
-            sender=sender,
-            recipient=recipient,
-            delivered=True
-        )
-
-        emit('receive_message', {
-            'id': message.id,
-            'from': sender.email,
-            'text': message.text,
-            'timestamp': str(message.date)
-        }, room=data['room'])
-
-    except DoesNotExist:
-        print("User not found for sender or recipient")
+    sender = current_user()
+    recipient_id = joined(DIRECT, data['room'])
+    if recipient_id is None:
+        print("Direct room not joined")
+        return
+
+    message = message_writer.write(
+        Message,
+        text=data['text'],
+        sender=sender['id'],
+        recipient=recipient_id,
+        delivered=True
+    )
+
+    emit('receive_message', {
+        'id': message.id,
+        'from': sender['email'],
+        'text': message.text,
+        'timestamp': str(message.date)
+    }, room=data['room'])
 
 @socketio.on('send_community_message')
+@db.connection_context()
 def handle_send_community_message(data):
-    try:
-        sender = User.get(User.email == data['from'])
-        community = community_model.Community.get(community_model.Community.id == data['room'])
-
-        message = message_model.CommunityMessage.create(
-            text=data['text'],
-            sender=sender,
-            community=community,
-            delivered=True
-        )
-
-        emit('receive_message', {
-            'id': message.id,
-            'from': sender.email,
-            'from_name': message.sender.username if message.sender.username else message.sender.email,
-            'from_profile_picture': message.sender.profile_picture.url if message.sender.profile_picture else None,
-            'text': message.text,
-            'timestamp': str(message.date)
-        }, room=data['room'])
-
-    except DoesNotExist:
-        print("User or Community not found")
+    sender = current_user()
+    community_id = joined(COMMUNITY, data['room'])
+    if community_id is None:
+        print("Community room not joined")
+        return
+
+    message = message_writer.write(
+        message_model.CommunityMessage,
+        text=data['text'],
+        sender=sender['id'],
+        community=community_id,
+        delivered=True
+    )
+
+    emit('receive_message', {
+        'id': message.id,
+        'from': sender['email'],
+        'from_name': sender['username'] or sender['email'],
+        'from_profile_picture': sender['avatar'],
+        'text': message.text,
+        'timestamp': str(message.date)
+    }, room=data['room'])
 
 @socketio.on('join_room')
+@db.connection_context()
 def handle_join_room(data):
-    room = data['room']
+    room = str(data['room'])
+    if not join(room, data.get('kind')):
+        print(f"Not allowed in room: {room}")
+        return
     join_room(room)
-    print(f"Joined room: {room}")
+
+@socketio.on('sync')
+@db.connection_context()
+def handle_sync(data):
+    # Same as POST /message/sync; the answer goes back as the event's acknowledgement
+    user = current_user()
+    try:
+        return sync_messages(user['id'], data or {})
+    except ValueError as e:
+        return {'error': str(e)}
 
 @socketio.on('send_group_message')
+@db.connection_context()
 def handle_send_group_message(data):
-    try:
-        sender = User.get(User.email == data['from'])
-        group = message_model.GroupChat.get_by_id(data['group_id'])
-
-        msg = message_model.GroupMessage.create(
-            group=group,
-            sender=sender,
-            text=data['text'],
-            delivered=True
-        )
-
-        emit('receive_group_message', {
-            'id': msg.id,
-            'from': sender.email,
-            'text': msg.text,
-            'timestamp': str(msg.date),
-            'username': sender.username,
-            'avatar': sender.profile_picture.url if sender.profile_picture else None
-        }, room=str(group.id))  # emit to group room
-    except DoesNotExist:
-        print("Sender or group not found")
+    sender = current_user()
+    group_id = joined(GROUP, data['group_id'])
+    if group_id is None:
+        print("Group room not joined")
+        return
+
+    msg = message_writer.write(
+        message_model.GroupMessage,
+        group=group_id,
+        sender=sender['id'],
+        text=data['text'],
+        delivered=True
+    )
+
+    emit('receive_group_message', {
+        'id': msg.id,
+        'from': sender['email'],
+        'text': msg.text,
+        'timestamp': str(msg.date),
+        'username': sender['username'],
+        'avatar': sender['avatar']
+    }, room=str(group_id))  # emit to group room
 
 
 if __name__ == "__main__":
+    init_app()
     socketio.run(app, host="0.0.0.0", port=5002,
                  debug=True, allow_unsafe_werkzeug=True)
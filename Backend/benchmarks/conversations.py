@@ -0,0 +1,94 @@
+"""Conversation list latency for a user with a large direct-message inbox (100k messages by default).
+
+Seeds one user who has exchanged --messages messages with --partners people,
+plus as many messages between other users, into the DATABASE_* database, then
+times GET /message/conversations. Point it at a throwaway database
+(e.g. `createdb loop_bench`):
+
+    DATABASE_NAME=loop_bench python -m Backend.benchmarks.conversations --messages 100000
+"""
+import argparse
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+from peewee import chunked
+
+from Backend.model.database_model import db
+from Backend.model.message_model import Message
+from Backend.model.user_model import User
+
+
+def insert_all(model, rows):
+    for batch in chunked(rows, 5000):
+        model.insert_many(batch).execute()
+
+
+def seed(messages, partners, seed=0):
+    """The inbox owner's id. Partner activity is skewed (Zipf-like) and spread over the last 90 days."""
+    rng = np.random.default_rng(seed)
+    run = uuid.uuid4().hex[:8]
+    insert_all(User, [{"email": f"bench-{run}-{i}@aucklanduni.ac.nz", "hash_salted_password": "x",
+                       "firstname": "Bench", "lastname": str(i), "username": f"bench-{run}-{i}"}
+                      for i in range(partners * 2 + 1)])
+    user_ids = [u for (u,) in User.select(User.id).where(User.email.startswith(f"bench-{run}-"))
+                .order_by(User.id).tuples()]
+    owner, others = user_ids[0], np.array(user_ids[1:])
+
+    weights = 1 / np.arange(1, partners + 1)
+    weights /= weights.sum()
+    now = datetime.utcnow()
+    ages = np.sort(rng.uniform(0, 90 * 24 * 3600, messages * 2))[::-1]
+
+    def message(i, a, b):
+        return {"sender": int(a), "recipient": int(b), "text": f"benchmark {i}",
+                "date": now - timedelta(seconds=float(ages[i]))}
+
+    inbox = rng.choice(others[:partners], size=messages, p=weights)
+    sent = rng.random(messages) < 0.5
+    noise = rng.choice(others, size=(messages, 2))
+    rows = []
+    for i in range(messages):
+        rows.append(message(2 * i, owner, inbox[i]) if sent[i] else message(2 * i, inbox[i], owner))
+        rows.append(message(2 * i + 1, *noise[i]))
+    insert_all(Message, rows)
+    db.execute_sql("ANALYZE message")
+    return owner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100000, help="messages in the user's inbox")
+    parser.add_argument("--partners", type=int, default=1000, help="people the user has messaged with")
+    parser.add_argument("--requests", type=int, default=200, help="conversation list requests to time")
+    args = parser.parse_args()
+
+    from Backend.app import app, init_app
+    from flask_jwt_extended import create_access_token
+
+    # Migrates the database without starting the server's background tasks
+    init_app(background_tasks=False)
+
+    with db.connection_context():
+        started = time.perf_counter()
+        owner = seed(args.messages, args.partners)
+        print(f"seed {args.messages} inbox messages: {time.perf_counter() - started:.1f}s")
+
+    client = app.test_client()
+    with app.app_context():
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(owner))}"}
+    latencies = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        response = client.get("/message/conversations", headers=headers)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.get_json()
+    latencies.sort()
+    print(f"GET /message/conversations ({len(response.get_json())} conversations): "
+          f"p50 {1000 * statistics.median(latencies):.1f}ms p99 {1000 * latencies[int(len(latencies) * 0.99)]:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Friend suggestion refresh and lookup at scale (50k users by default).
+
+Seeds users with interests, neurotypes, communities and friend requests into
+the DATABASE_* database, then times a full refresh, an incremental refresh
+with nothing changed and with 1% of users changed, and GET /friends/suggestions.
+Point it at a throwaway database (e.g. `createdb loop_bench`):
+
+    DATABASE_NAME=loop_bench python -m Backend.benchmarks.friend_suggestions --users 50000
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+import numpy as np
+from peewee import chunked
+
+from Backend.model.database_model import db
+from Backend.model.community_model import Community
+from Backend.model.homepage_model import UserCommunity
+from Backend.model.user_model import User, Interest, UserInterest, Neurotype, UserNeurotype, Friend
+
+
+def insert_all(model, rows):
+    for batch in chunked(rows, 5000):
+        model.insert_many(batch).execute()
+
+
+def seed(users, seed=0):
+    """Users with ~6 of 200 interests, ~2 of 12 neurotypes, ~3 of 500 communities and ~10 friend rows each.
+
+    Popularity is skewed (Zipf-like), as real interests and communities are.
+    """
+    rng = np.random.default_rng(seed)
+    run = uuid.uuid4().hex[:8]
+    insert_all(User, [{"email": f"bench-{run}-{i}@aucklanduni.ac.nz", "hash_salted_password": "x",
+                       "firstname": "Bench", "lastname": str(i), "username": f"bench-{run}-{i}"}
+                      for i in range(users)])
+    user_ids = np.array([u for (u,) in User.select(User.id).where(User.email.startswith(f"bench-{run}-"))
+                        .order_by(User.id).tuples()])
+
+    def catalogue(model, prefix, n):
+        insert_all(model, [{"name": f"{prefix} {run} {i}"} for i in range(n)])
+        return np.array([i for (i,) in model.select(model.id).where(model.name.startswith(f"{prefix} {run} "))
+                         .order_by(model.id).tuples()])
+
+    def memberships(choices, per_user):
+        weights = 1 / np.arange(1, len(choices) + 1)
+        weights /= weights.sum()
+        pairs = set()
+        for user_id, n in zip(user_ids, rng.poisson(per_user, len(user_ids))):
+            for choice in rng.choice(choices, size=min(max(n, 1), len(choices)), replace=False, p=weights):
+                pairs.add((int(user_id), int(choice)))
+        return pairs
+
+    interests = catalogue(Interest, "interest", 200)
+    neurotypes = catalogue(Neurotype, "neurotype", 12)
+    insert_all(Community, [{"name": f"community {run} {i}", "description": "benchmark", "owner": int(user_ids[0])}
+                           for i in range(500)])
+    communities = np.array([i for (i,) in Community.select(Community.id)
+                            .where(Community.name.startswith(f"community {run} ")).tuples()])
+
+    insert_all(UserInterest, [{"user": u, "interest": i} for u, i in memberships(interests, 6)])
+    insert_all(UserNeurotype, [{"user": u, "neurotype": n} for u, n in memberships(neurotypes, 2)])
+    insert_all(UserCommunity, [{"user": u, "community": c} for u, c in memberships(communities, 3)])
+    friends = {(int(a), int(b)) for a, b in rng.choice(user_ids, size=(len(user_ids) * 5, 2)) if a != b}
+    friends = {(a, b) for a, b in friends if (b, a) not in friends or a < b}
+    insert_all(Friend, [{"user": a, "connected_user": b, "status": "accepted"} for a, b in friends])
+    return user_ids, interests, rng
+
+
+def timed(label, action):
+    started = time.perf_counter()
+    result = action()
+    print(f"{label}: {time.perf_counter() - started:.1f}s" + (f" ({result})" if isinstance(result, int) else ""))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--metric", default="cosine", choices=("cosine", "jaccard"))
+    parser.add_argument("--requests", type=int, default=200, help="suggestion lookups to time")
+    args = parser.parse_args()
+
+    from Backend.app import app, init_app
+    from Backend.recommender import refresh_suggestions
+    from flask_jwt_extended import create_access_token
+
+    # Migrates the database without starting the server's background tasks
+    init_app(background_tasks=False)
+    with db.connection_context():
+        user_ids, interests, rng = timed(f"seed {args.users} users", lambda: seed(args.users))
+        timed("full refresh (users recomputed)", lambda: refresh_suggestions(full=True, metric=args.metric))
+        timed("incremental refresh, nothing changed", lambda: refresh_suggestions(metric=args.metric))
+        changed = rng.choice(user_ids, size=max(1, len(user_ids) // 100), replace=False)
+        insert_all(UserInterest, [{"user": int(u), "interest": int(rng.choice(interests))} for u in changed])
+        timed("incremental refresh, 1% changed", lambda: refresh_suggestions(metric=args.metric))
+
+    client = app.test_client()
+    latencies = []
+    for user_id in rng.choice(user_ids, size=args.requests):
+        with app.app_context():
+            headers = {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+        started = time.perf_counter()
+        response = client.get("/friends/suggestions", headers=headers)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.get_json()
+    latencies.sort()
+    print(f"GET /friends/suggestions: p50 {1000 * statistics.median(latencies):.1f}ms "
+          f"p99 {1000 * latencies[int(len(latencies) * 0.99)]:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Chat message search latency over a million messages.
+
+Seeds --messages chat messages (half direct, a quarter each group and
+community) written with a skewed vocabulary of --words words into the
+DATABASE_* database, then times GET /message/search for a user in 10 groups
+and 10 communities, for common, middling and rare terms. Point it at a
+throwaway database (e.g. `createdb loop_bench`):
+
+    DATABASE_NAME=loop_bench python -m Backend.benchmarks.message_search --messages 1000000
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from peewee import chunked
+
+from Backend.model.database_model import db
+from Backend.model.community_model import Community
+from Backend.model.homepage_model import UserCommunity
+from Backend.model.message_model import Message, GroupChat, GroupChatMember, GroupMessage, CommunityMessage
+from Backend.model.user_model import User
+
+
+def insert_all(model, rows):
+    for batch in chunked(rows, 5000):
+        model.insert_many(batch).execute()
+
+
+def ids(model, field, prefix):
+    return [i for (i,) in model.select(model.id).where(field.startswith(prefix)).order_by(model.id).tuples()]
+
+
+def generate(model, columns, values, n, params):
+    """Insert n rows server-side; `values` may use g (the row number), %(users)s and %(words)s."""
+    # Word k of the vocabulary turns up roughly in proportion to 1/k, as in real text
+    text = ("(SELECT string_agg('word' || floor(power(%(words)s, random()))::int, ' ') "
+            "FROM generate_series(1, 6 + g %% 10))")
+    for start in range(0, n, 100000):
+        db.execute_sql(
+            f'INSERT INTO "{model._meta.table_name}" (text, date, {columns}) '
+            f"SELECT {text}, now() AT TIME ZONE 'utc' - random() * interval '60 days', {values} "
+            f"FROM generate_series(%(start)s, %(end)s) AS g",
+            dict(params, start=start, end=min(start + 100000, n) - 1))
+
+
+def seed(messages, users, words):
+    """The searching user's id. They take part in 1 in 20 direct messages and belong to 10 of 50 groups and communities."""
+    run = uuid.uuid4().hex[:8]
+    insert_all(User, [{"email": f"bench-{run}-{i}@aucklanduni.ac.nz", "hash_salted_password": "x",
+                       "firstname": "Bench", "lastname": str(i), "username": f"bench-{run}-{i}"}
+                      for i in range(users)])
+    user_ids = ids(User, User.email, f"bench-{run}-")
+    me = user_ids[0]
+    insert_all(GroupChat, [{"name": f"group {run} {i}", "creator": me} for i in range(50)])
+    group_ids = ids(GroupChat, GroupChat.name, f"group {run} ")
+    insert_all(Community, [{"name": f"community {run} {i}", "description": "benchmark", "owner": me}
+                           for i in range(50)])
+    community_ids = ids(Community, Community.name, f"community {run} ")
+    insert_all(GroupChatMember, [{"group": g, "user": me} for g in group_ids[:10]])
+    insert_all(UserCommunity, [{"user": me, "community": c} for c in community_ids[:10]])
+
+    params = {"users": user_ids, "groups": group_ids, "communities": community_ids, "me": me, "words": words}
+    someone = "(%(users)s::int[])[1 + floor(random() * array_length(%(users)s::int[], 1))::int]"
+    generate(Message, "delivered, sender_id, recipient_id",
+             f"true, CASE WHEN g %% 20 = 0 THEN %(me)s ELSE {someone} END, {someone}", messages // 2, params)
+    generate(GroupMessage, "sender_id, group_id",
+             f"{someone}, (%(groups)s::int[])[1 + g %% 50]", messages // 4, params)
+    generate(CommunityMessage, "delivered, sender_id, community_id",
+             f"true, {someone}, (%(communities)s::int[])[1 + g %% 50]", messages // 4, params)
+    # As autovacuum would have by now; also flushes the GIN indexes' pending lists
+    db.execute_sql("VACUUM ANALYZE")
+    return me
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=5000, help="vocabulary size")
+    parser.add_argument("--requests", type=int, default=50, help="searches to time per query")
+    args = parser.parse_args()
+
+    from Backend.app import app, init_app
+    from flask_jwt_extended import create_access_token
+
+    # Migrates the database without starting the server's background tasks
+    init_app(background_tasks=False)
+
+    with db.connection_context():
+        started = time.perf_counter()
+        me = seed(args.messages, args.users, args.words)
+        group = GroupChatMember.select(GroupChatMember.group).where(GroupChatMember.user == me).scalar()
+        print(f"seed {args.messages} messages: {time.perf_counter() - started:.1f}s")
+
+    client = app.test_client()
+    with app.app_context():
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(me))}"}
+    rare = args.words // 2
+    cursor = client.get("/message/search?q=word1", headers=headers).get_json()["next_cursor"]
+    searches = {
+        "common term": "q=word1",
+        "middling term": "q=word20",
+        "rare term": f"q=word{rare}",
+        "two terms": "q=word2+word3",
+        "common term, next page": f"q=word1&before={cursor}",
+        "common term, one group": f"q=word1&group_id={group}",
+    }
+    for label, query in searches.items():
+        latencies = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            response = client.get(f"/message/search?{query}", headers=headers)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.get_json()
+        latencies.sort()
+        print(f"GET /message/search {label} ({len(response.get_json()['results'])} results): "
+              f"p50 {1000 * statistics.median(latencies):.1f}ms p99 {1000 * latencies[int(len(latencies) * 0.99)]:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""HTTP request rate and Socket.IO message throughput of a running server.
+
+Start the server under test on a throwaway database, then point this at it:
+
+    # the old Dockerfile mode: Werkzeug dev server (on port 5002; `flask run` skips init_app)
+    python -m Backend.app
+    # the production entry point, optionally with SERVER_WORKERS=4 SOCKETIO_MESSAGE_QUEUE=postgres
+    SERVER_PORT=5000 python -m Backend.server
+
+    python -m Backend.benchmarks.server_throughput --url http://localhost:5000
+
+It registers its own users (bench-<run>-<n>@aucklanduni.ac.nz), so run it
+against a development database only. Needs `pip install -r Backend/requirements-dev.txt`
+for the websocket client.
+"""
+import argparse
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import socketio
+
+
+def register(url, run, n):
+    response = requests.post(f"{url}/auth/register", json={
+        "firstname": "Bench", "lastname": str(n), "email": f"bench-{run}-{n}@aucklanduni.ac.nz", "password": "bench"})
+    response.raise_for_status()
+    return f"bench-{run}-{n}@aucklanduni.ac.nz", response.json()["access_token"]
+
+
+def http_benchmark(url, path, token, clients, seconds):
+    """Requests/s and latency percentiles of `clients` threads GETting `path` back to back."""
+    latencies = []
+    errors = [0]
+    deadline = time.monotonic() + seconds
+
+    def client():
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token}"
+        mine = []
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                ok = session.get(url + path, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                mine.append(time.monotonic() - start)
+            else:
+                errors[0] += 1
+        latencies.extend(mine)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    return {
+        "requests/s": len(latencies) / elapsed,
+        "p50 ms": 1000 * statistics.median(latencies) if latencies else None,
+        "p99 ms": 1000 * latencies[int(len(latencies) * 0.99)] if latencies else None,
+        "errors": errors[0],
+    }
+
+
+def connect(url, token, on_message=None):
+    client = socketio.Client(reconnection=False)
+    if on_message is not None:
+        client.on("receive_message", on_message)
+    client.connect(url, auth={"token": token}, transports=["websocket"], wait_timeout=10)
+    return client
+
+
+def socket_benchmark(url, users, messages):
+    """Direct messages delivered per second, with pairs of users chatting at once.
+
+    Each pair's two sockets join their direct room; the first sends `messages`
+    messages and both count what comes back, so every send is one database
+    write and two deliveries.
+    """
+    pairs = [(users[i], users[i + 1]) for i in range(0, len(users) - 1, 2)]
+    expected = 2 * messages * len(pairs)
+    received = [0]
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def on_message(data):
+        with lock:
+            received[0] += 1
+            if received[0] == expected:
+                done.set()
+
+    clients = []
+    for (a_email, a_token), (b_email, b_token) in pairs:
+        room = "_".join(sorted((a_email, b_email)))
+        sender, receiver = connect(url, a_token, on_message), connect(url, b_token, on_message)
+        for client in (sender, receiver):
+            client.emit("join_room", {"room": room, "kind": "direct"})
+        clients.append((sender, receiver, room))
+    # Joins are handled in order per socket, but give every room a moment to settle
+    time.sleep(1)
+
+    def send(sender, room):
+        for i in range(messages):
+            sender.emit("send_message", {"room": room, "text": f"benchmark {i}"})
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(len(clients)) as pool:
+        for sender, _, room in clients:
+            pool.submit(send, sender, room)
+    done.wait(timeout=max(60, messages))
+    elapsed = time.monotonic() - started
+    for sender, receiver, _ in clients:
+        sender.disconnect()
+        receiver.disconnect()
+    return {"messages/s": messages * len(pairs) / elapsed, "deliveries/s": received[0] / elapsed,
+            "delivered": f"{received[0]}/{expected}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--path", default="/post", help="endpoint for the HTTP benchmark")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent HTTP clients")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--pairs", type=int, default=20, help="concurrent chatting pairs of sockets")
+    parser.add_argument("--messages", type=int, default=100, help="messages each pair sends")
+    args = parser.parse_args()
+
+    run = uuid.uuid4().hex[:8]
+    users = [register(args.url, run, n) for n in range(2 * args.pairs)]
+    for name, result in (("http", http_benchmark(args.url, args.path, users[0][1], args.clients, args.seconds)),
+                         ("socket", socket_benchmark(args.url, users, args.messages))):
+        print(name, " ".join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                             for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import functools
+
+import click
+from flask.cli import with_appcontext
+
+from Backend.message_archive import MESSAGE_ARCHIVE_AFTER_MONTHS, MESSAGE_ARCHIVE_DIR, archive_old_partitions
+from Backend.model import migrations, partitions
+from Backend.recommender import refresh_suggestions
+from Backend.model.database_model import db
+from Backend.model.user_model import User
+from Backend.model.post_model import Post, TimelineEntry, Like, Comment
+from Backend.model.message_model import UnreadCounter
+
+
+# Maintenance commands, run with e.g. `flask --app Backend.app rebuild-timelines`
+
+def with_initialized_app(command):
+    """Like with_appcontext, but first migrates the database; never starts the server's background tasks."""
+    @with_appcontext
+    @functools.wraps(command)
+    def wrapper(*args, **kwargs):
+        from Backend.app import init_app
+        init_app(background_tasks=False)
+        return command(*args, **kwargs)
+    return wrapper
+
+
+@click.command("rebuild-timelines")
+@click.option("--user-id", type=int, default=None, help="Only rebuild this user's timeline")
+@with_initialized_app
+def rebuild_timelines(user_id):
+    """Rebuild materialized home timelines from community memberships."""
+    user = None
+    if user_id is not None:
+        user = User.get_or_none(User.id == user_id)
+        if user is None:
+            raise click.ClickException(f"User {user_id} not found")
+
+    with db.atomic():
+        TimelineEntry.rebuild(user)
+
+    entries = TimelineEntry.select()
+    if user is not None:
+        entries = entries.where(TimelineEntry.user == user)
+    click.echo(f"Rebuilt timelines ({entries.count()} entries)")
+
+
+@click.command("reconcile-like-counts")
+@with_initialized_app
+def reconcile_like_counts():
+    """Recount Post.likes from the like table where they have drifted."""
+    fixed = Like.reconcile_counts()
+    click.echo(f"Repaired like counts on {fixed} posts")
+
+
+@click.command("reconcile-comment-counts")
+@with_initialized_app
+def reconcile_comment_counts():
+    """Recount Post.comment_count from the comment table where it has drifted."""
+    fixed = Comment.reconcile_counts()
+    click.echo(f"Repaired comment counts on {fixed} posts")
+
+
+@click.command("backfill-post-search")
+@click.option("--batch-size", type=int, default=1000, show_default=True)
+@with_initialized_app
+def backfill_post_search(batch_size):
+    """Fill the full-text search vector of posts that don't have one yet."""
+    updated = Post.backfill_search_vectors(batch_size)
+    click.echo(f"Indexed {updated} posts")
+
+
+@click.command("decay-hot-scores")
+@with_initialized_app
+def decay_hot_scores():
+    """Re-score recent posts for the hot feed. Run periodically, e.g. every 10 minutes from cron."""
+    rescored = Post.recompute_hot_scores()
+    click.echo(f"Re-scored {rescored} posts")
+
+
+@click.command("rebuild-unread-counts")
+@with_initialized_app
+def rebuild_unread_counts():
+    """Recompute unread counters and badge totals from messages and read watermarks."""
+    UnreadCounter.rebuild()
+    click.echo(f"Rebuilt {UnreadCounter.select().count()} unread counters")
+
+
+@click.command("refresh-friend-suggestions")
+@click.option("--full", is_flag=True, help="Recompute every user, not just those whose profile changed")
+@with_initialized_app
+def refresh_friend_suggestions(full):
+    """Precompute ranked friend suggestions. Run incrementally every few minutes and with --full nightly."""
+    try:
+        recomputed = refresh_suggestions(full)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Recomputed suggestions for {recomputed} users")
+
+
+@click.command("maintain-partitions")
+@click.option("--ahead", type=int, default=partitions.MESSAGE_PARTITIONS_AHEAD, show_default=True,
+              help="Months to create ahead of the current one")
+@with_initialized_app
+def maintain_partitions(ahead):
+    """Create upcoming monthly chat partitions. Run at least monthly, e.g. daily from cron."""
+    for model in partitions.PARTITIONED_MODELS:
+        created = partitions.ensure_partitions(model, ahead)
+        click.echo(f"{model._meta.table_name}: created {created} partitions")
+
+
+@click.command("archive-messages")
+@click.option("--after-months", type=int, default=MESSAGE_ARCHIVE_AFTER_MONTHS, show_default=True,
+              help="Archive months that ended more than this many months ago")
+@click.option("--directory", default=MESSAGE_ARCHIVE_DIR, show_default=True)
+@with_initialized_app
+def archive_messages(after_months, directory):
+    """Move old monthly chat partitions out of the database into gzipped JSONL files."""
+    for table, month, count in archive_old_partitions(after_months, directory):
+        click.echo(f"Archived {table} {month:%Y-%m} ({count} messages)")
+
+
+@click.command("migrate")
+@with_appcontext
+def migrate():
+    """Apply pending schema migrations and list what has been applied."""
+    # The server also migrates on startup; this is for running it ahead of a deploy
+    for version, name in migrations.migrate_database():
+        click.echo(f"Applied {version:03d} {name}")
+    for m in migrations.SchemaMigration.select().order_by(migrations.SchemaMigration.version):
+        click.echo(f"{m.version:03d} {m.name} ({m.applied_at:%Y-%m-%d %H:%M})")
+
+
+COMMANDS = [rebuild_timelines, reconcile_like_counts, reconcile_comment_counts, backfill_post_search,
+            decay_hot_scores, rebuild_unread_counts, refresh_friend_suggestions, maintain_partitions,
+            archive_messages, migrate]
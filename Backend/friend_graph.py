@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from Backend.model.database_model import db
+from Backend.model.user_model import Friend
+
+logger = logging.getLogger(__name__)
+
+# How often each process picks up friendships accepted by other processes
+FRIEND_GRAPH_REFRESH_SECONDS = int(os.environ.get("FRIEND_GRAPH_REFRESH_SECONDS", 30))
+# Re-read changes this far behind the newest one seen, for transactions that committed late
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+class FriendGraph:
+    """Accepted friendships as one set of friend ids per user, held in this process.
+
+    Loaded from the Friend table at startup, updated directly by the friends
+    API and topped up every FRIEND_GRAPH_REFRESH_SECONDS from rows whose
+    updated_at moved, so other processes' writes arrive within that window.
+    """
+
+    def __init__(self):
+        self._friends = defaultdict(set)
+        self._lock = threading.RLock()
+        self._synced_to = None  # newest Friend.updated_at read so far
+        self.loaded = False
+
+    def load(self):
+        """(Re)build the whole graph from the database."""
+        friends = defaultdict(set)
+        synced_to = None
+        query = (Friend
+                 .select(Friend.user, Friend.connected_user, Friend.updated_at)
+                 .where(Friend.status == 'accepted')
+                 .tuples())
+        for a, b, updated_at in query.iterator():
+            friends[a].add(b)
+            friends[b].add(a)
+            synced_to = max(synced_to, updated_at) if synced_to else updated_at
+        with self._lock:
+            self._friends = friends
+            self._synced_to = synced_to
+            self.loaded = True
+        return sum(len(ids) for ids in friends.values()) // 2
+
+    def refresh(self):
+        """Apply Friend rows changed since the last load or refresh. Returns how many were read."""
+        if self._synced_to is None:
+            return self.load()
+        changed = (Friend
+                   .select(Friend.user, Friend.connected_user, Friend.status, Friend.updated_at)
+                   .where(Friend.updated_at >= self._synced_to - REFRESH_OVERLAP)
+                   .tuples())
+        count = 0
+        for a, b, status, updated_at in changed:
+            if status == 'accepted':
+                self.add(a, b)
+            else:
+                self.remove(a, b)
+            with self._lock:
+                self._synced_to = max(self._synced_to, updated_at)
+            count += 1
+        return count
+
+    def run_refresher(self, sleep):
+        while True:
+            sleep(FRIEND_GRAPH_REFRESH_SECONDS)
+            try:
+                with db.connection_context():
+                    self.refresh()
+            except Exception:
+                logger.exception("Friend graph refresh failed")
+
+    # Writes from this process
+
+    def add(self, user_id, friend_id):
+        with self._lock:
+            self._friends[user_id].add(friend_id)
+            self._friends[friend_id].add(user_id)
+
+    def remove(self, user_id, friend_id):
+        with self._lock:
+            self._friends.get(user_id, set()).discard(friend_id)
+            self._friends.get(friend_id, set()).discard(user_id)
+
+    def remove_user(self, user_id):
+        with self._lock:
+            for friend_id in self._friends.pop(user_id, ()):
+                self._friends[friend_id].discard(user_id)
+
+    # Reads
+
+    def friends(self, user_id):
+        with self._lock:
+            return set(self._friends.get(user_id, ()))
+
+    def are_friends(self, user_id, other_ids):
+        """{other id: whether they are friends with `user_id`} for a batch of ids."""
+        friends = self.friends(user_id)
+        return {other_id: other_id in friends for other_id in other_ids}
+
+    def mutual_friends(self, user_id, other_id):
+        with self._lock:
+            return self._friends.get(user_id, set()) & self._friends.get(other_id, set())
+
+    def mutual_counts(self, user_id, other_ids):
+        """{other id: number of friends they share with `user_id`}."""
+        with self._lock:
+            friends = self._friends.get(user_id, set())
+            return {other_id: len(friends & self._friends.get(other_id, set())) for other_id in other_ids}
+
+    def friends_of_friends(self, user_id, limit=None):
+        """Users two steps away who aren't friends yet, as (id, mutual friends), most mutual first."""
+        with self._lock:
+            friends = self._friends.get(user_id, set())
+            counts = Counter(
+                candidate for friend_id in friends for candidate in self._friends.get(friend_id, ())
+                if candidate != user_id and candidate not in friends)
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+friend_graph = FriendGraph()
@@ -0,0 +1,171 @@
+import gzip
+import json
+import os
+from datetime import date, datetime
+
+from peewee import JOIN
+
+from Backend.message_writer import decode_row
+from Backend.model.database_model import db
+from Backend.model.image_model import Image
+from Backend.model.user_model import User
+from Backend.model.message_model import Message, GroupMessage, MessageArchive
+from Backend.model.partitions import PARTITIONED_MODELS, add_months, month_start, partitions
+
+# Where archived months are written, as <dir>/<table>/<YYYY-MM>.jsonl.gz. Each
+# conversation is its own gzip member in the file, so one can be read on its own.
+MESSAGE_ARCHIVE_DIR = os.environ.get("MESSAGE_ARCHIVE_DIR", "message-archive")
+# Months are archived once they are entirely older than this many months
+MESSAGE_ARCHIVE_AFTER_MONTHS = int(os.environ.get("MESSAGE_ARCHIVE_AFTER_MONTHS", 12))
+ARCHIVE_BATCH_SIZE = 5000
+
+
+def direct_conversation(user_id, other_id):
+    return ":".join(str(i) for i in sorted((int(user_id), int(other_id))))
+
+
+def conversation_of(model, row):
+    if model is Message:
+        return direct_conversation(row["sender"], row["recipient"])
+    return str(row["group"] if model is GroupMessage else row["community"])
+
+
+def conversation_order(model):
+    # Keeps each conversation's rows together, oldest first
+    if model is Message:
+        sender, recipient = Message.sender.column_name, Message.recipient.column_name
+        return f'LEAST("{sender}", "{recipient}"), GREATEST("{sender}", "{recipient}"), "id"'
+    column = (model.group if model is GroupMessage else model.community).column_name
+    return f'"{column}", "id"'
+
+
+def archive_path(directory, model, month):
+    return os.path.join(directory, model._meta.table_name, f"{month:%Y-%m}.jsonl.gz")
+
+
+def archive_partition(model, month, partition, directory=MESSAGE_ARCHIVE_DIR):
+    """Write one monthly partition to disk, catalogue it, then detach and drop it.
+
+    The file is complete and fsynced before the partition is dropped, so an
+    interrupted run leaves the month in the database and can simply be rerun.
+    Returns how many messages were archived.
+    """
+    path = archive_path(directory, model, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fields = model._meta.sorted_fields
+    columns = ", ".join(f'"{field.column_name}"' for field in fields)
+
+    conversations = {}
+    with open(path + ".tmp", "wb") as raw, db.atomic():
+        # Streams the month in batches through a server-side cursor; it closes with the transaction
+        db.execute_sql(f'DECLARE archive_rows NO SCROLL CURSOR FOR '
+                       f'SELECT {columns} FROM "{partition}" ORDER BY {conversation_order(model)}')
+        out = stats = None
+        while True:
+            rows = db.execute_sql(f"FETCH {ARCHIVE_BATCH_SIZE} FROM archive_rows").fetchall()
+            if not rows:
+                break
+            for values in rows:
+                row = {field.name: value for field, value in zip(fields, values)}
+                conversation = conversation_of(model, row)
+                if conversation not in conversations:
+                    if out is not None:
+                        out.close()
+                        stats["byte_length"] = raw.tell() - stats["byte_offset"]
+                    stats = conversations[conversation] = {
+                        "row_count": 0, "min_id": row["id"], "max_id": row["id"], "byte_offset": raw.tell()}
+                    out = gzip.GzipFile(fileobj=raw, mode="wb")
+                record = {key: value.isoformat() if isinstance(value, datetime) else value
+                          for key, value in row.items()}
+                out.write((json.dumps(record) + "\n").encode("utf-8"))
+                stats["row_count"] += 1
+                stats["max_id"] = row["id"]
+        if out is not None:
+            out.close()
+            stats["byte_length"] = raw.tell() - stats["byte_offset"]
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(path + ".tmp", path)
+
+    with db.atomic():
+        (MessageArchive
+         .delete()
+         .where((MessageArchive.source_table == model._meta.table_name) & (MessageArchive.month == month))
+         .execute())
+        if conversations:
+            MessageArchive.insert_many([
+                {"source_table": model._meta.table_name, "month": month, "conversation": conversation,
+                 "path": path, **stats}
+                for conversation, stats in conversations.items()
+            ]).execute()
+        db.execute_sql(f'ALTER TABLE "{model._meta.table_name}" DETACH PARTITION "{partition}"')
+        db.execute_sql(f'DROP TABLE "{partition}"')
+    return sum(stats["row_count"] for stats in conversations.values())
+
+
+def archive_old_partitions(after_months=MESSAGE_ARCHIVE_AFTER_MONTHS, directory=MESSAGE_ARCHIVE_DIR, today=None):
+    """Archive every monthly chat partition that ended more than `after_months` months ago.
+
+    Returns (table, month, messages archived) for each partition moved out.
+    """
+    cutoff = add_months(month_start(today or date.today()), -after_months)
+    archived = []
+    for model in PARTITIONED_MODELS:
+        for month, partition in partitions(model):
+            if add_months(month, 1) <= cutoff:
+                count = archive_partition(model, month, partition, directory)
+                archived.append((model._meta.table_name, month, count))
+    return archived
+
+
+def read_archive(model, path, offset=None, length=None):
+    """Rows of an archived month, or only those of the conversation stored at `offset`."""
+    if offset is None:
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            for line in archive:
+                yield decode_row(model, json.loads(line))
+        return
+    with open(path, "rb") as archive:
+        archive.seek(offset)
+        member = archive.read(length)
+    for line in gzip.decompress(member).decode("utf-8").splitlines():
+        yield decode_row(model, json.loads(line))
+
+
+def archived_messages(model, conversation, before=None, limit=50):
+    """The latest `limit` archived messages of a conversation older than id `before`, oldest first.
+
+    Only this conversation's part of each month the catalogue lists for it
+    is read. Senders are loaded with one query so the messages serialize like
+    ones from the database.
+    """
+    entries = (MessageArchive
+               .select(MessageArchive.path, MessageArchive.byte_offset, MessageArchive.byte_length)
+               .where((MessageArchive.source_table == model._meta.table_name) &
+                      (MessageArchive.conversation == conversation))
+               .order_by(MessageArchive.max_id.desc()))
+    if before is not None:
+        entries = entries.where(MessageArchive.min_id < before)
+
+    found = []
+    for entry in entries:
+        rows = [row for row in read_archive(model, entry.path, entry.byte_offset, entry.byte_length)
+                if conversation_of(model, row) == conversation and (before is None or row["id"] < before)]
+        found[:0] = rows[-(limit - len(found)):]
+        if len(found) >= limit:
+            break
+    if not found:
+        return []
+
+    senders = {
+        user.id: user for user in
+        User.select(User, Image)
+        .join(Image, JOIN.LEFT_OUTER, on=(User.profile_picture == Image.id))
+        .where(User.id.in_({row["sender"] for row in found}))
+    }
+    messages = []
+    for row in found:
+        message = model(**row)
+        message.sender = senders.get(row["sender"])  # None once the sender deleted their account
+        messages.append(message)
+    return messages
@@ -0,0 +1,280 @@
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from peewee import DateTimeField
+
+from Backend.model.database_model import db
+from Backend.model.message_model import Message, CommunityMessage, GroupMessage, UnreadCounter
+
+logger = logging.getLogger(__name__)
+
+# How chat messages reach the database:
+#   sync       INSERT before the message is emitted (default)
+#   batched    emit first, INSERT in batches; a crash loses the unflushed window
+#   journaled  like batched, but each message is appended and fsynced to a local
+#              journal before it is emitted and replayed on the next start
+CHAT_PERSISTENCE = os.environ.get("CHAT_PERSISTENCE", "sync")
+CHAT_FLUSH_INTERVAL = int(os.environ.get("CHAT_FLUSH_INTERVAL_MS", 50)) / 1000
+CHAT_FLUSH_BATCH_SIZE = int(os.environ.get("CHAT_FLUSH_BATCH_SIZE", 100))
+# How often the flusher checks, between flushes, whether the buffer has filled
+CHAT_WAKEUP_CHECK_INTERVAL = 0.005
+# Each process journals to <CHAT_JOURNAL_PATH>.<host>.<pid>, so workers sharing
+# a directory never replay each other's live journals
+CHAT_JOURNAL_PATH = os.environ.get("CHAT_JOURNAL_PATH", "chat-journal.jsonl")
+# Ids reserved from the table's sequence per round trip. Ids are only ordered
+# by send time within a process, so keep this small when running several.
+CHAT_ID_BLOCK = int(os.environ.get("CHAT_ID_BLOCK", 20))
+
+MODES = ("sync", "batched", "journaled")
+MESSAGE_MODELS = {model._meta.table_name: model for model in (Message, CommunityMessage, GroupMessage)}
+
+
+class IdAllocator:
+    """Hands out primary keys ahead of the INSERT by reserving blocks from the table's sequence."""
+
+    def __init__(self, block_size=CHAT_ID_BLOCK):
+        self.block_size = block_size
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, model, count):
+        table = model._meta.table_name
+        cursor = db.execute_sql(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)", (table, count))
+        return [row[0] for row in cursor.fetchall()]
+
+    def next_id(self, model):
+        with self._lock:
+            ids = self._ids.setdefault(model, deque())
+            if not ids:
+                ids.extend(self._reserve(model, self.block_size))
+            return ids.popleft()
+
+
+class MessageWriter:
+    """Persists chat messages, either straight away or write-behind in batches.
+
+    `write()` returns the message with its id and date filled in so it can be
+    emitted immediately. In the write-behind modes rows are buffered and
+    flushed with one insert_many per table when the buffer reaches
+    `batch_size` or every `interval` seconds, whichever comes first.
+    """
+
+    def __init__(self, mode=CHAT_PERSISTENCE, interval=CHAT_FLUSH_INTERVAL, batch_size=CHAT_FLUSH_BATCH_SIZE,
+                 journal_path=CHAT_JOURNAL_PATH, ids=None):
+        if mode not in MODES:
+            raise ValueError(f"CHAT_PERSISTENCE must be one of {', '.join(MODES)}")
+        self.mode = mode
+        self.interval = interval
+        self.batch_size = batch_size
+        self.journal_prefix = journal_path
+        self.journal_path = f"{journal_path}.{journal_owner()}"
+        self.ids = ids or IdAllocator()
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._journal = None
+        self._flushed_journals = []
+        self._wakeup = threading.Event()
+
+    @property
+    def write_behind(self):
+        return self.mode != "sync"
+
+    def write(self, model, **fields):
+        if not self.write_behind:
+            with db.atomic():
+                message = model.create(**fields)
+                UnreadCounter.record(model, [message.__data__])
+            return message
+
+        message = model(id=self.ids.next_id(model), **fields)
+        row = dict(message.__data__)
+        with self._lock:
+            if self.mode == "journaled":
+                self._append_to_journal(model, row)
+            self._buffer.append((model, row))
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return message
+
+    def flush(self):
+        """Insert everything buffered so far. Returns how many rows were written."""
+        with self._flush_lock:
+            with self._lock:
+                flushing = self._rotate_journal()
+                pending, self._buffer = self._buffer, []
+            if flushing:
+                self._flushed_journals.append(flushing)
+            if not pending:
+                return 0
+
+            by_model = {}
+            for model, row in pending:
+                by_model.setdefault(model, []).append(row)
+            try:
+                with db.connection_context():
+                    with db.atomic():
+                        for model, rows in by_model.items():
+                            insert_messages(model, rows)
+            except Exception:
+                logger.exception("Chat message flush failed, retrying %s rows", len(pending))
+                with self._lock:
+                    self._buffer[:0] = pending
+                return 0
+
+            # Failed flushes are retried with the next batch, so their journals go too
+            for path in self._flushed_journals:
+                os.remove(path)
+            self._flushed_journals = []
+            return len(pending)
+
+    def _wait(self, sleep):
+        # Up to `interval`, or until write() finds the buffer full. Waits only
+        # with `sleep`: blocking on the Event would stall an unpatched green hub
+        deadline = time.monotonic() + self.interval
+        while not self._wakeup.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sleep(min(remaining, CHAT_WAKEUP_CHECK_INTERVAL))
+        self._wakeup.clear()
+
+    def run(self, sleep):
+        # Background flusher; `sleep` is the server's (green-friendly) sleep
+        while True:
+            try:
+                self._wait(sleep)
+                self.flush()
+            except Exception:
+                # Unflushed rows stay buffered (and journaled); try again next round
+                logger.exception("Chat message flusher failed")
+            sleep(0)
+
+    def start(self, socketio):
+        """Replay any journal left by a crash and start flushing in the background."""
+        if not self.write_behind:
+            return
+        self.recover()
+        socketio.start_background_task(self.run, socketio.sleep)
+        atexit.register(self.flush)
+
+    # Journal: one JSON line per message. On flush the live file is renamed to
+    # <path>.<timestamp>.flushing and removed once its rows are committed.
+
+    def _append_to_journal(self, model, row):
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        record = {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+        self._journal.write(json.dumps({"table": model._meta.table_name, "row": record}) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _rotate_journal(self):
+        if self._journal is None:
+            return None
+        self._journal.close()
+        self._journal = None
+        flushing = f"{self.journal_path}.{datetime.utcnow():%Y%m%d%H%M%S%f}.flushing"
+        os.replace(self.journal_path, flushing)
+        return flushing
+
+    def recover(self):
+        """Insert rows from journals that never got flushed. Returns how many were replayed.
+
+        Only this process's own journals (left by an earlier process with the
+        same host and pid) and those of processes on this host that are no
+        longer running are replayed; a live worker's journal is left alone.
+        """
+        directory = os.path.dirname(os.path.abspath(self.journal_prefix))
+        prefix = os.path.basename(self.journal_prefix) + "."
+        host = socket.gethostname()
+        leftovers = []
+        for name in sorted(os.listdir(directory)):
+            owner = journal_file_owner(name[len(prefix):]) if name.startswith(prefix) else None
+            if owner is None:
+                continue
+            if owner == (host, os.getpid()) or (owner[0] == host and not process_alive(owner[1])):
+                leftovers.append(os.path.join(directory, name))
+            else:
+                logger.info("Leaving chat journal %s to its owner", name)
+
+        replayed = 0
+        for path in leftovers:
+            by_model = {}
+            try:
+                with open(path, encoding="utf-8") as journal:
+                    for line in journal:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            break  # torn final line from the crash
+                        model = MESSAGE_MODELS[entry["table"]]
+                        by_model.setdefault(model, []).append(decode_row(model, entry["row"]))
+            except FileNotFoundError:
+                continue  # another starting worker replayed it first
+            with db.connection_context():
+                with db.atomic():
+                    for model, rows in by_model.items():
+                        insert_messages(model, rows)
+            replayed += sum(len(rows) for rows in by_model.values())
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        if replayed:
+            logger.warning("Recovered %s chat messages from the journal", replayed)
+        return replayed
+
+
+def journal_owner():
+    return f"{socket.gethostname()}.{os.getpid()}"
+
+
+def journal_file_owner(suffix):
+    """(host, pid) from the part of a journal file name after the prefix, or None if it isn't one."""
+    if suffix.endswith(".flushing"):
+        # <host>.<pid>.<timestamp>.flushing
+        parts = suffix[:-len(".flushing")].rsplit(".", 2)
+        if len(parts) != 3:
+            return None
+        host, pid = parts[0], parts[1]
+    else:
+        host, _, pid = suffix.rpartition(".")
+    if not host or not pid.isdigit():
+        return None
+    return host, int(pid)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+def insert_messages(model, rows):
+    # Ids are pre-assigned, so a replayed row is simply skipped, and only the
+    # rows that really went in count towards unread counters
+    inserted = {row_id for (row_id,) in
+                model.insert_many(rows).on_conflict_ignore().returning(model.id).tuples().execute()}
+    UnreadCounter.record(model, [row for row in rows if row['id'] in inserted])
+
+
+def decode_row(model, row):
+    fields = model._meta.fields
+    return {
+        name: datetime.fromisoformat(value) if isinstance(fields.get(name), DateTimeField) and value else value
+        for name, value in row.items()
+    }
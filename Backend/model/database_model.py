@@ -1,6 +1,7 @@
 import os
 
 from peewee import *
+from playhouse.pool import PooledPostgresqlDatabase
 from dotenv import load_dotenv
 
 if not os.environ.get('DATABASE_NAME'):
@@ -13,8 +14,32 @@ DATABASE_PASSWORD = os.environ['DATABASE_PASSWORD']
 DATABASE_HOST = os.environ['DATABASE_HOST']
 DATABASE_PORT = os.environ['DATABASE_PORT']
 
+# Pool sizing: max connections per process, seconds before an idle connection is
+# recycled, and seconds a request waits for a free connection before failing
+DATABASE_MAX_CONNECTIONS = int(os.environ.get('DATABASE_MAX_CONNECTIONS', 20))
+DATABASE_STALE_TIMEOUT = int(os.environ.get('DATABASE_STALE_TIMEOUT', 300))
+DATABASE_POOL_TIMEOUT = int(os.environ.get('DATABASE_POOL_TIMEOUT', 10))
 
-db = PostgresqlDatabase(DATABASE_NAME, user=DATABASE_USER, password=DATABASE_PASSWORD, host=DATABASE_HOST, port=DATABASE_PORT)
+
+# Every request and socket event checks a connection out and returns it (see app.py)
+db = PooledPostgresqlDatabase(DATABASE_NAME, user=DATABASE_USER, password=DATABASE_PASSWORD, host=DATABASE_HOST, port=DATABASE_PORT,
+                              max_connections=DATABASE_MAX_CONNECTIONS, stale_timeout=DATABASE_STALE_TIMEOUT,
+                              timeout=DATABASE_POOL_TIMEOUT)
+
+
+def pool_stats():
+    # Snapshot of this process's pool, for tuning worker counts against max_connections.
+    # The counts come from PooledDatabase internals: peewee is pinned in requirements.txt
+    # and tests/test_database_pool.py checks them against the real pool
+    in_use = len(db._in_use)
+    idle = len(db._connections)
+    return {
+        'max_connections': DATABASE_MAX_CONNECTIONS,
+        'in_use': in_use,
+        'idle': idle,
+        'available': DATABASE_MAX_CONNECTIONS - in_use,
+        'stale_timeout': DATABASE_STALE_TIMEOUT,
+    }
 
 class BaseModel(Model):
     class Meta:
@@ -38,6 +38,16 @@ class UserCommunity(BaseModel):
     community = ForeignKeyField(Community, backref="memberships")
     created_at = DateTimeField(default=datetime.datetime.utcnow)
 
+    class Meta:
+        indexes = (
+            (('user', 'community'), True),
+        )
+
 class RSVP(BaseModel):
     user = ForeignKeyField(User, backref="event_rsvps")
     event = ForeignKeyField(Event, backref="rsvps")
+
+    class Meta:
+        indexes = (
+            (('user', 'event'), True),
+        )
@@ -1,8 +1,11 @@
-from peewee import CharField, DateTimeField, TextField, ForeignKeyField, BooleanField, AutoField, Model
+from collections import Counter
+from peewee import (CharField, DateField, DateTimeField, TextField, ForeignKeyField, BooleanField, AutoField,
+                    BigIntegerField, IntegerField, Model, EXCLUDED, JOIN, SQL, Value, fn)
 from datetime import datetime
 from Backend.model.database_model import BaseModel, db
 from Backend.model.user_model import User
 from Backend.model.community_model import Community
+from Backend.model.post_model import SEARCH_LANGUAGE
 
 class CommunityMessage(BaseModel):
     id = AutoField()
@@ -14,6 +17,9 @@ class CommunityMessage(BaseModel):
 
     class Meta :
         table_name = 'community_messages'
+        indexes = (
+            (('community', 'id'), False),  # chat history pages by id
+        )
 
     def to_dict(self):
         return {
@@ -25,16 +31,6 @@ class CommunityMessage(BaseModel):
             'delivered': self.delivered
         }
 
-class CommunityMessageRead(BaseModel):
-    id = AutoField()
-    message = ForeignKeyField(CommunityMessage, backref="reads")
-    user = ForeignKeyField(User, backref="read_community_messages")
-    read_at = DateTimeField(default=datetime.utcnow)
-
-    class Meta:
-        table_name = 'community_message_read'
-
-
 class Message(BaseModel):
     text = CharField()
     date = DateTimeField(default=datetime.utcnow)
@@ -42,15 +38,13 @@ class Message(BaseModel):
     recipient = ForeignKeyField(User, backref='received_messages')
     delivered = BooleanField(default=False)
 
-
-class MessageRead(BaseModel):
-    message = ForeignKeyField(Message, backref="reads")
-    user = ForeignKeyField(User, backref="read_messages")
-    read_at = DateTimeField(default=datetime.utcnow)
-
     class Meta:
-        database = db
-        indexes = ((("message", "user"), True),)  # Prevent duplicates
+        # One per direction, so either side of a conversation is an index range
+        indexes = (
+            (('sender', 'recipient', 'id'), False),
+            (('recipient', 'sender', 'id'), False),
+        )
+
 
 class GroupChat(BaseModel):
     name = CharField()
@@ -61,9 +55,218 @@ class GroupChatMember(BaseModel):
     group = ForeignKeyField(GroupChat, backref='members')
     user = ForeignKeyField(User, backref='group_memberships')
 
+    @classmethod
+    def join(cls, group, user):
+        # Messages from before the member joined start out read, so they never count as unread
+        with db.atomic():
+            member = cls.create(group=group, user=user)
+            latest = GroupMessage.select(fn.MAX(GroupMessage.id)).where(GroupMessage.group == group).scalar()
+            if latest:
+                ReadWatermark.advance(user, ReadWatermark.GROUP, group.id, latest)
+        return member
+
 class GroupMessage(BaseModel):
     text = CharField()
     sender = ForeignKeyField(User, backref='sent_group_messages')
     group = ForeignKeyField(GroupChat, backref='messages')
     date = DateTimeField(default=datetime.utcnow)
 
+    class Meta:
+        indexes = (
+            (('group', 'id'), False),
+        )
+
+
+def search_text(model):
+    # Chat text as a tsvector. Searches must use this exact expression to hit the GIN index below.
+    return fn.to_tsvector(SEARCH_LANGUAGE, model.text)
+
+
+for _model in (Message, CommunityMessage, GroupMessage):
+    _model.add_index(_model.index(search_text(_model), using='GIN', name=f'{_model._meta.table_name}_text_search'))
+
+
+class MessageArchive(BaseModel):
+    # One conversation's messages in a month that was moved out to a gzipped JSONL file
+    source_table = CharField()
+    month = DateField()
+    conversation = CharField()  # "<user id>:<user id>" (lower first) for direct messages, else the group/community id
+    path = CharField()
+    row_count = IntegerField()
+    min_id = IntegerField()
+    max_id = IntegerField()
+    # Where this conversation's own gzip member sits in the file; null for files that
+    # predate per-conversation members, which are read whole
+    byte_offset = BigIntegerField(null=True)
+    byte_length = BigIntegerField(null=True)
+    archived_at = DateTimeField(default=datetime.utcnow)
+
+    class Meta:
+        table_name = 'message_archive'
+        indexes = (
+            (('source_table', 'conversation', 'max_id'), False),
+        )
+
+
+class ReadWatermark(BaseModel):
+    # Highest message id a user has read in a conversation; everything at or below it counts as read
+    DIRECT = 'direct'        # conversation_id is the other user's id
+    GROUP = 'group'          # conversation_id is the GroupChat id
+    COMMUNITY = 'community'  # conversation_id is the Community id
+
+    user = ForeignKeyField(User, backref='read_watermarks')
+    kind = CharField(choices=[(DIRECT, 'Direct'), (GROUP, 'Group'), (COMMUNITY, 'Community')])
+    conversation_id = IntegerField()
+    last_read_id = IntegerField(default=0)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    class Meta:
+        table_name = 'read_watermark'
+        indexes = (
+            (('user', 'kind', 'conversation_id'), True),
+            (('kind', 'conversation_id'), False),  # "has the other side seen it" lookups
+        )
+
+    @classmethod
+    def advance(cls, user, kind, conversation_id, message_id):
+        # Upsert that only ever moves forward, so an older page can't rewind it;
+        # the conversation's unread counter is recounted in the same transaction
+        with db.atomic():
+            (cls
+             .insert(user=user, kind=kind, conversation_id=conversation_id, last_read_id=message_id)
+             .on_conflict(
+                 conflict_target=[cls.user, cls.kind, cls.conversation_id],
+                 update={
+                     cls.last_read_id: fn.GREATEST(cls.last_read_id, EXCLUDED.last_read_id),
+                     cls.updated_at: datetime.utcnow(),
+                 })
+             .execute())
+            if kind != cls.COMMUNITY:
+                UnreadCounter.settle(user, kind, conversation_id)
+
+
+class UnreadCounter(BaseModel):
+    # Unread messages per direct/group conversation, kept in step with message writes and read watermarks
+    user = ForeignKeyField(User, backref='unread_counters')
+    kind = CharField(choices=[(ReadWatermark.DIRECT, 'Direct'), (ReadWatermark.GROUP, 'Group')])
+    conversation_id = IntegerField()  # same meaning as ReadWatermark.conversation_id
+    count = IntegerField(default=0)
+
+    class Meta:
+        table_name = 'unread_counter'
+        indexes = (
+            (('user', 'kind', 'conversation_id'), True),
+        )
+
+    @classmethod
+    def _add(cls, counters):
+        # `counters` is a query selecting (user, kind, conversation_id, count) rows to add on, or a
+        # list of them. Sorted by user so concurrent writers lock counter rows in the same order.
+        fields = [cls.user, cls.kind, cls.conversation_id, cls.count]
+        if isinstance(counters, list):
+            insert = cls.insert_many(sorted(counters), fields=fields)
+        else:
+            insert = cls.insert_from(counters.order_by(SQL('1')), fields)
+        (insert
+         .on_conflict(
+             conflict_target=[cls.user, cls.kind, cls.conversation_id],
+             update={cls.count: cls.count + EXCLUDED.count})
+         .execute())
+
+    @classmethod
+    def record(cls, model, rows):
+        """Count newly written messages as unread for everyone but their sender.
+
+        `rows` are the written messages' field dicts. Must run in the
+        transaction that inserted them.
+        """
+        if model is Message:
+            per_conversation = Counter((row['recipient'], row['sender']) for row in rows)
+            cls._add([(recipient, ReadWatermark.DIRECT, sender, n)
+                      for (recipient, sender), n in per_conversation.items()])
+            UnreadTotal.add(list(Counter(row['recipient'] for row in rows).items()))
+        elif model is GroupMessage:
+            per_sender = Counter((row['group'], row['sender']) for row in rows)
+            for (group, sender), n in per_sender.items():
+                members = GroupChatMember.select(GroupChatMember.user).where(
+                    (GroupChatMember.group == group) & (GroupChatMember.user != sender))
+                cls._add(members.select_extend(Value(ReadWatermark.GROUP), Value(group), Value(n)))
+                UnreadTotal.add(members.select_extend(Value(n)))
+
+    @classmethod
+    def settle(cls, user, kind, conversation_id):
+        # Recount after the read watermark moved. The row lock makes message writers that
+        # commit meanwhile wait and add on top of the recount instead of being overwritten.
+        counter = cls.select().where(
+            (cls.user == user) & (cls.kind == kind) & (cls.conversation_id == conversation_id)).for_update().first()
+        if counter is None:
+            return
+        last_read = ReadWatermark.select(ReadWatermark.last_read_id).where(
+            (ReadWatermark.user == user) & (ReadWatermark.kind == kind) &
+            (ReadWatermark.conversation_id == conversation_id)).scalar() or 0
+        if kind == ReadWatermark.DIRECT:
+            unread = Message.select().where(
+                (Message.recipient == user) & (Message.sender == conversation_id) & (Message.id > last_read))
+        else:
+            unread = GroupMessage.select().where(
+                (GroupMessage.group == conversation_id) & (GroupMessage.sender != user) & (GroupMessage.id > last_read))
+        remaining = unread.count()
+        if remaining != counter.count:
+            cls.update(count=remaining).where(cls.id == counter.id).execute()
+            UnreadTotal.update(count=UnreadTotal.count + (remaining - counter.count)).where(
+                UnreadTotal.user == user).execute()
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every counter and total from the messages and read watermarks.
+
+        Group members' watermarks start at the group's latest message when they
+        join (see GroupChatMember.join), which keeps earlier messages out.
+        """
+        with db.atomic():
+            cls.delete().execute()
+            UnreadTotal.delete().execute()
+
+            direct_read = ReadWatermark.alias()
+            cls._add(
+                Message
+                .select(Message.recipient, Value(ReadWatermark.DIRECT), Message.sender, fn.COUNT(Message.id))
+                .join(direct_read, JOIN.LEFT_OUTER, on=(
+                    (direct_read.user == Message.recipient) & (direct_read.kind == ReadWatermark.DIRECT) &
+                    (direct_read.conversation_id == Message.sender)))
+                .where(Message.id > fn.COALESCE(direct_read.last_read_id, 0))
+                .group_by(Message.recipient, Message.sender))
+
+            group_read = ReadWatermark.alias()
+            cls._add(
+                GroupChatMember
+                .select(GroupChatMember.user, Value(ReadWatermark.GROUP), GroupChatMember.group, fn.COUNT(GroupMessage.id))
+                .join(GroupMessage, on=(
+                    (GroupMessage.group == GroupChatMember.group) & (GroupMessage.sender != GroupChatMember.user)))
+                .join(group_read, JOIN.LEFT_OUTER, on=(
+                    (group_read.user == GroupChatMember.user) & (group_read.kind == ReadWatermark.GROUP) &
+                    (group_read.conversation_id == GroupChatMember.group)))
+                .where(GroupMessage.id > fn.COALESCE(group_read.last_read_id, 0))
+                .group_by(GroupChatMember.user, GroupChatMember.group))
+
+            UnreadTotal.add(cls.select(cls.user, fn.SUM(cls.count)).group_by(cls.user))
+
+
+class UnreadTotal(BaseModel):
+    # Sum of a user's UnreadCounters, for the badge: one primary key lookup
+    user = ForeignKeyField(User, primary_key=True, backref='unread_total')
+    count = IntegerField(default=0)
+
+    class Meta:
+        table_name = 'unread_total'
+
+    @classmethod
+    def add(cls, totals):
+        # `totals` is a query selecting (user, count) rows to add on, or a list of them
+        if isinstance(totals, list):
+            insert = cls.insert_many(sorted(totals), fields=[cls.user, cls.count])
+        else:
+            insert = cls.insert_from(totals.order_by(SQL('1')), [cls.user, cls.count])
+        (insert
+         .on_conflict(conflict_target=[cls.user], update={cls.count: cls.count + EXCLUDED.count})
+         .execute())
@@ -0,0 +1,246 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+from peewee import EXCLUDED, CharField, DateTimeField, IntegerField, Table, Value, fn
+from playhouse.migrate import PostgresqlMigrator, migrate
+
+from Backend.model.database_model import BaseModel, db
+from Backend.model import user_model, post_model, homepage_model, image_model, community_model, message_model
+from Backend.model.post_model import Post, Comment
+from Backend.model.message_model import Message, CommunityMessage, GroupMessage, ReadWatermark, UnreadCounter, UnreadTotal
+from Backend.model.homepage_model import UserCommunity, RSVP
+from Backend.model.partitions import PARTITIONED_MODELS, partition_table
+
+# Every table the app uses; new tables only need adding here, create_tables() creates them
+MODELS = [
+    user_model.User, user_model.Interest, user_model.UserInterest, user_model.Neurotype, user_model.UserNeurotype,
+    user_model.Friend, user_model.Friendship, user_model.UserPhoto,
+    user_model.FriendSuggestion, user_model.SuggestionState,
+    post_model.Post, post_model.Comment, post_model.Like, post_model.TimelineEntry,
+    community_model.Community, community_model.CommunityCategory, community_model.Category,
+    homepage_model.Announcement, homepage_model.Event, homepage_model.UserCommunity, homepage_model.RSVP,
+    image_model.Image,
+    message_model.Message, message_model.CommunityMessage, message_model.ReadWatermark,
+    message_model.GroupChat, message_model.GroupChatMember, message_model.GroupMessage,
+    message_model.UnreadCounter, message_model.UnreadTotal, message_model.MessageArchive,
+]
+
+
+class SchemaMigration(BaseModel):
+    version = IntegerField(primary_key=True)
+    name = CharField()
+    applied_at = DateTimeField(default=datetime.utcnow)
+
+    class Meta:
+        table_name = 'schema_migration'
+
+
+# Arbitrary, but the same in every process: pg_advisory_lock key held while migrating
+MIGRATION_LOCK_ID = 7201001
+
+
+@contextmanager
+def advisory_lock(key):
+    # Session-level, so it holds across the separate transactions of each migration
+    db.execute_sql("SELECT pg_advisory_lock(%s)", (key,))
+    try:
+        yield
+    finally:
+        db.execute_sql("SELECT pg_advisory_unlock(%s)", (key,))
+
+
+# Schema changes to existing tables, applied in order and recorded in schema_migration.
+# Register new ones with @migration(<next version>, "<name>") at the bottom of this file.
+MIGRATIONS = []
+
+
+def migration(version, name):
+    def register(apply):
+        MIGRATIONS.append((version, name, apply))
+        return apply
+    return register
+
+
+def add_missing_column(migrator, model, field):
+    table = model._meta.table_name
+    if field.column_name in {column.name for column in db.get_columns(table)}:
+        return False
+    migrate(migrator.add_column(table, field.column_name, field))
+    return True
+
+
+def add_missing_index(migrator, model, fields, unique=False):
+    # Named like peewee names Meta.indexes, so create_tables() sees them as existing
+    table = model._meta.table_name
+    columns = [model._meta.fields[name].column_name for name in fields]
+    if any(index.columns == columns for index in db.get_indexes(table)):
+        return False
+    migrate(migrator.add_index(table, columns, unique))
+    return True
+
+
+def delete_duplicates(model, *fields):
+    # Keep the oldest row of each group so a unique index can be built
+    keep = model.select(fn.MIN(model.id)).group_by(*fields)
+    return model.delete().where(model.id.not_in(keep)).execute()
+
+
+def collapse_read_receipts(legacy_table, message_model, kind, conversation_column):
+    """Fold a legacy per-message read-receipt table into read watermarks, then drop it."""
+    if not db.table_exists(legacy_table):
+        return False
+    ReadWatermark.create_table(safe=True)
+
+    reads = Table(legacy_table)
+    latest_read = (
+        message_model
+        .select(reads.c.user_id, Value(kind), conversation_column, fn.MAX(message_model.id), Value(datetime.utcnow()))
+        .join(reads, on=(reads.c.message_id == message_model.id))
+        .group_by(reads.c.user_id, conversation_column)
+    )
+    (ReadWatermark
+     .insert_from(latest_read, [ReadWatermark.user, ReadWatermark.kind, ReadWatermark.conversation_id,
+                                ReadWatermark.last_read_id, ReadWatermark.updated_at])
+     .on_conflict(
+         conflict_target=[ReadWatermark.user, ReadWatermark.kind, ReadWatermark.conversation_id],
+         update={ReadWatermark.last_read_id: fn.GREATEST(ReadWatermark.last_read_id, EXCLUDED.last_read_id)})
+     .execute())
+    db.execute_sql(f'DROP TABLE "{legacy_table}"')
+    return True
+
+
+def pending_migrations():
+    applied = {m.version for m in SchemaMigration.select(SchemaMigration.version)}
+    return [m for m in sorted(MIGRATIONS, key=lambda m: m[0]) if m[0] not in applied]
+
+
+def migrate_database():
+    """Bring the database up to date: create it from scratch or apply pending migrations.
+
+    Every worker runs this on startup; the advisory lock makes the others
+    wait for the first one and then find nothing left to do.
+    """
+    with advisory_lock(MIGRATION_LOCK_ID):
+        return _migrate_database()
+
+
+def _migrate_database():
+    fresh = not db.table_exists(user_model.User._meta.table_name)
+    SchemaMigration.create_table(safe=True)
+
+    if fresh:
+        # The models already describe the latest schema, apart from partitioning
+        with db.atomic():
+            db.create_tables(MODELS)
+            for model in PARTITIONED_MODELS:
+                partition_table(model)
+        for version, name, _ in pending_migrations():
+            SchemaMigration.create(version=version, name=name)
+        return []
+
+    applied = []
+    migrator = PostgresqlMigrator(db)
+    for version, name, apply in pending_migrations():
+        # Each migration commits on its own, so a failure leaves earlier ones recorded
+        with db.atomic():
+            apply(migrator)
+            SchemaMigration.create(version=version, name=name)
+        applied.append((version, name))
+
+    # New tables, plus any Meta indexes a migration didn't create
+    db.create_tables(MODELS)
+
+    # Batched outside any transaction; a no-op once every post has a vector
+    Post.backfill_search_vectors()
+    return applied
+
+
+@migration(1, "post comment_count")
+def add_post_comment_count(migrator):
+    if add_missing_column(migrator, Post, Post.comment_count):
+        Comment.reconcile_counts()
+
+
+@migration(2, "post search_vector")
+def add_post_search_vector(migrator):
+    # Existing rows are backfilled in batches by migrate_database()
+    add_missing_column(migrator, Post, Post.search_vector)
+
+
+@migration(3, "post hot_score")
+def add_post_hot_score(migrator):
+    if add_missing_column(migrator, Post, Post.hot_score):
+        Post.recompute_hot_scores()
+    add_missing_index(migrator, Post, ("hot_score", "id"))
+
+
+@migration(4, "read watermarks")
+def add_read_watermarks(migrator):
+    # Read receipts used to be one row per message read
+    collapse_read_receipts("messageread", Message, ReadWatermark.DIRECT, Message.sender)
+    collapse_read_receipts("community_message_read", CommunityMessage, ReadWatermark.COMMUNITY,
+                           CommunityMessage.community)
+
+
+@migration(5, "chat and feed hot path indexes")
+def add_hot_path_indexes(migrator):
+    add_missing_index(migrator, Message, ("sender", "recipient", "id"))
+    add_missing_index(migrator, Message, ("recipient", "sender", "id"))
+    add_missing_index(migrator, CommunityMessage, ("community", "id"))
+    add_missing_index(migrator, GroupMessage, ("group", "id"))
+    add_missing_index(migrator, Post, ("created_at", "id"))
+    add_missing_index(migrator, Post, ("community", "created_at", "id"))
+    add_missing_index(migrator, Comment, ("post", "created_at", "id"))
+    add_missing_index(migrator, post_model.Like, ("user", "post"))
+
+    delete_duplicates(UserCommunity, UserCommunity.user, UserCommunity.community)
+    add_missing_index(migrator, UserCommunity, ("user", "community"), unique=True)
+    delete_duplicates(RSVP, RSVP.user, RSVP.event)
+    add_missing_index(migrator, RSVP, ("user", "event"), unique=True)
+
+
+@migration(6, "unread counters")
+def add_unread_counters(migrator):
+    db.create_tables([UnreadCounter, UnreadTotal])
+    UnreadCounter.rebuild()
+
+
+@migration(7, "monthly chat partitions")
+def partition_chat_tables(migrator):
+    # Copies each table into its partitioned replacement; expect a lock on chat while it runs
+    for model in PARTITIONED_MODELS:
+        partition_table(model)
+
+
+@migration(8, "chat text search indexes")
+def add_chat_search_indexes(migrator):
+    # Builds each GIN index in one pass over the table; chat writes wait until it finishes
+    for model in PARTITIONED_MODELS:
+        for index in model._meta.fields_to_index():
+            if index._name.endswith("_text_search"):
+                model._schema.create_index(index, safe=True)
+
+
+@migration(9, "friend suggestions")
+def add_friend_suggestions(migrator):
+    # Filled by `flask refresh-friend-suggestions`; until then /friends/suggestions falls back to unranked users
+    db.create_tables([user_model.FriendSuggestion, user_model.SuggestionState])
+
+
+@migration(10, "friend updated_at index")
+def add_friend_updated_at_index(migrator):
+    add_missing_index(migrator, user_model.Friend, ("updated_at",))
+
+
+@migration(11, "symmetric friendships")
+def add_friendships(migrator):
+    db.create_tables([user_model.Friendship])
+    user_model.Friendship.backfill()
+
+
+@migration(12, "per-conversation archive offsets")
+def add_archive_offsets(migrator):
+    MessageArchive = message_model.MessageArchive
+    if db.table_exists(MessageArchive._meta.table_name):
+        add_missing_column(migrator, MessageArchive, MessageArchive.byte_offset)
+        add_missing_column(migrator, MessageArchive, MessageArchive.byte_length)
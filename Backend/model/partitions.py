@@ -0,0 +1,135 @@
+import os
+import re
+from datetime import date, datetime
+
+from peewee import ForeignKeyField
+
+from Backend.model.database_model import db
+from Backend.model.message_model import Message, CommunityMessage, GroupMessage
+
+# Chat tables are range partitioned by month on their `date` column
+PARTITIONED_MODELS = [Message, CommunityMessage, GroupMessage]
+# Months of empty partitions kept ready ahead of the current one
+MESSAGE_PARTITIONS_AHEAD = int(os.environ.get("MESSAGE_PARTITIONS_AHEAD", 3))
+
+# Held while a partition is created, so workers starting together don't race
+PARTITION_LOCK_ID = 7201002
+
+PARTITION_SUFFIX = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(model, month):
+    return f"{model._meta.table_name}_p{month:%Y_%m}"
+
+
+def is_partitioned(model):
+    cursor = db.execute_sql(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = %s AND c.relnamespace = to_regnamespace(current_schema())::oid",
+        (model._meta.table_name,))
+    return cursor.fetchone() is not None
+
+
+def partitions(model):
+    """(month, partition table name) of every monthly partition, oldest first."""
+    cursor = db.execute_sql(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = %s", (model._meta.table_name,))
+    found = []
+    for (name,) in cursor.fetchall():
+        match = PARTITION_SUFFIX.search(name)
+        if match:  # skips the default partition
+            found.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(found)
+
+
+def create_partition(model, month):
+    table = model._meta.table_name
+    name = partition_name(model, month)
+    bounds = (month, add_months(month, 1))
+    if db.table_exists(name):
+        return False
+
+    with db.atomic():
+        # Another process may have created it while we waited for the lock
+        db.execute_sql("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (PARTITION_LOCK_ID, name))
+        if db.table_exists(name):
+            return False
+        default = f"{table}_default"
+        stray = db.table_exists(default) and db.execute_sql(
+            f'SELECT 1 FROM "{default}" WHERE "date" >= %s AND "date" < %s LIMIT 1', bounds).fetchone()
+        if stray:
+            # Rows that landed in the default partition move into their month
+            db.execute_sql(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"')
+        db.execute_sql(f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', bounds)
+        if stray:
+            db.execute_sql(f'INSERT INTO "{name}" SELECT * FROM "{default}" WHERE "date" >= %s AND "date" < %s', bounds)
+            db.execute_sql(f'DELETE FROM "{default}" WHERE "date" >= %s AND "date" < %s', bounds)
+            db.execute_sql(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+    return True
+
+
+def ensure_partitions(model, ahead=MESSAGE_PARTITIONS_AHEAD, since=None):
+    """Create monthly partitions from `since` (default: this month) through `ahead` months from now.
+
+    Returns how many were created.
+    """
+    month = month_start(since or datetime.utcnow())
+    last = add_months(month_start(datetime.utcnow()), ahead)
+    created = 0
+    while month <= last:
+        created += create_partition(model, month)
+        month = add_months(month, 1)
+    return created
+
+
+def partition_table(model):
+    """Turn a plain chat table into a monthly partitioned one, keeping its rows, ids and sequence.
+
+    Postgres needs the partition key in the primary key, so it becomes (id, date);
+    ids still come from the table's sequence and stay unique. Runs inside a
+    transaction, so a failure leaves the original table in place.
+    """
+    if is_partitioned(model):
+        return False
+
+    table = model._meta.table_name
+    legacy = f"{table}_unpartitioned"
+    sequence = db.execute_sql("SELECT pg_get_serial_sequence(%s, 'id')", (table,)).fetchone()[0]
+
+    db.execute_sql(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+    # Free up the index names for the new table
+    db.execute_sql(f'ALTER INDEX "{table}_pkey" RENAME TO "{legacy}_pkey"')
+    for index in db.get_indexes(legacy):
+        if index.name != f"{legacy}_pkey":
+            db.execute_sql(f'DROP INDEX "{index.name}"')
+
+    db.execute_sql(f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS) PARTITION BY RANGE ("date")')
+    db.execute_sql(f'ALTER TABLE "{table}" ADD PRIMARY KEY ("id", "date")')
+    db.execute_sql(f'ALTER SEQUENCE {sequence} OWNED BY "{table}"."id"')
+    for field in model._meta.sorted_fields:
+        if isinstance(field, ForeignKeyField):
+            db.execute_sql(
+                f'ALTER TABLE "{table}" ADD FOREIGN KEY ("{field.column_name}") '
+                f'REFERENCES "{field.rel_model._meta.table_name}" ("{field.rel_field.column_name}")')
+
+    oldest = db.execute_sql(f'SELECT MIN("date") FROM "{legacy}"').fetchone()[0]
+    ensure_partitions(model, since=oldest)
+    # Catches anything outside the prepared months instead of failing the insert
+    db.execute_sql(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+    # Created on the parent, so every partition gets them
+    model._schema.create_indexes(safe=True)
+
+    db.execute_sql(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+    db.execute_sql(f'DROP TABLE "{legacy}"')
+    return True
@@ -1,11 +1,36 @@
-from peewee import CharField, TextField, ForeignKeyField, DateTimeField, IntegerField, UUIDField, CompositeKey
-from .database_model import BaseModel
+from peewee import CharField, TextField, ForeignKeyField, DateTimeField, IntegerField, FloatField, UUIDField, CompositeKey, Value, fn
+from playhouse.postgres_ext import TSVectorField
+from .database_model import BaseModel, db
 from .user_model import User, UserPhoto
-from .homepage_model import Community
+from .homepage_model import Community, UserCommunity
 from .image_model import Image
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import defaultdict
 import uuid
 
+COMMENT_PREVIEW_SIZE = 3
+SEARCH_LANGUAGE = 'english'
+
+
+# "Hot" ranking: (likes + 2 * comments + 1) / (age in hours + 2) ^ 1.5
+HOT_COMMENT_WEIGHT = 2
+HOT_GRAVITY = 1.5
+HOT_WINDOW = timedelta(days=7)  # older posts are no longer re-scored and drop to 0
+NEW_POST_HOT_SCORE = 1 / 2 ** HOT_GRAVITY
+
+
+def hot_score(likes, comment_count, created_at, now=None):
+    # SQL expression, so writes can score a post from its updated counters in the same UPDATE
+    age = Value(now or datetime.now()) - created_at
+    age_hours = fn.GREATEST(fn.date_part('epoch', age) / 3600, 0)
+    return (likes + HOT_COMMENT_WEIGHT * comment_count + 1) / fn.power(age_hours + 2, HOT_GRAVITY)
+
+
+def search_document(topic, content):
+    # Topic matches rank above content matches; works on values or on Post columns
+    return (fn.setweight(fn.to_tsvector(SEARCH_LANGUAGE, fn.COALESCE(topic, '')), 'A')
+            .concat(fn.setweight(fn.to_tsvector(SEARCH_LANGUAGE, fn.COALESCE(content, '')), 'B')))
+
 class Post(BaseModel):
     id = UUIDField(primary_key=True, default=uuid.uuid4)
     author = ForeignKeyField(User, backref='posts')
@@ -14,11 +39,53 @@ class Post(BaseModel):
     topic = CharField(null=True)
     created_at = DateTimeField(default=datetime.now)
     likes = IntegerField(default=0)
+    comment_count = IntegerField(default=0)
+    search_vector = TSVectorField(null=True)  # GIN indexed, kept in sync by save()
+    hot_score = FloatField(default=NEW_POST_HOT_SCORE)
+
+    class Meta:
+        indexes = (
+            (('hot_score', 'id'), False),
+            (('created_at', 'id'), False),
+            (('community', 'created_at', 'id'), False),
+        )
 
-    def to_dict(self, current_user_id=None):
-        liked_by_user = False
-        if current_user_id:
-            liked_by_user = Like.get_or_none((Like.post == self.id) & (Like.user == current_user_id)) is not None
+    def save(self, *args, **kwargs):
+        self.search_vector = search_document(self.topic, self.content)
+        return super().save(*args, **kwargs)
+
+    @classmethod
+    def backfill_search_vectors(cls, batch_size=1000):
+        """Fill search_vector for posts written before it existed, one short transaction per batch."""
+        total = 0
+        while True:
+            with db.atomic():
+                batch = cls.select(cls.id).where(cls.search_vector.is_null()).limit(batch_size)
+                updated = (cls
+                           .update(search_vector=search_document(cls.topic, cls.content))
+                           .where(cls.id.in_(batch))
+                           .execute())
+            if not updated:
+                return total
+            total += updated
+
+    @classmethod
+    def recompute_hot_scores(cls, window=HOT_WINDOW):
+        """Re-apply time decay to recent posts in one bulk UPDATE. Returns posts re-scored."""
+        now = datetime.now()
+        cutoff = now - window
+        rescored = (cls
+                    .update(hot_score=hot_score(cls.likes, cls.comment_count, cls.created_at, now))
+                    .where(cls.created_at >= cutoff)
+                    .execute())
+        cls.update(hot_score=0).where((cls.created_at < cutoff) & (cls.hot_score != 0)).execute()
+        return rescored
+
+    def to_dict(self, current_user_id=None, liked_post_ids=None):
+        # Pass liked_post_ids (see Like.liked_post_ids) when serializing a page of posts
+        if liked_post_ids is None:
+            liked_post_ids = Like.liked_post_ids(current_user_id, [self.id]) if current_user_id else set()
+        liked_by_user = self.id in liked_post_ids
         # 1) If the user has a profile_picture FK, get the .url string
         if isinstance(self.author.profile_picture, Image):
             photo_url = self.author.profile_picture.url
@@ -47,7 +114,8 @@ class Post(BaseModel):
                 "name": f"{self.author.firstname or ''} {self.author.lastname or ''}".strip() or self.author.email,
                 "photo_url": photo_url
             },
-            "comments": [comment.to_dict() for comment in self.comments.order_by(Comment.created_at.asc())],
+            "comment_count": self.comment_count,
+            "comments": [comment.to_dict() for comment in Comment.latest_by_post([self.id])[self.id]],
             "liked_by_user": liked_by_user
     }
 
@@ -57,19 +125,164 @@ class Comment(BaseModel):
     content = TextField()
     created_at = DateTimeField(default=datetime.now)
 
+    class Meta:
+        indexes = (
+            (('post', 'created_at', 'id'), False),
+        )
+
     def to_dict(self):
         return {
+            "id": self.id,
             "user": self.user.username,
-            "post_id": str(self.post.id),
+            "post_id": str(self.post_id),
             "content": self.content,
             "created_at": self.created_at.isoformat()
         }
 
+    @classmethod
+    def add(cls, post, user, content):
+        # Create the comment and bump the post's counter and hot score together
+        with db.atomic():
+            comment = cls.create(post=post, user=user, content=content)
+            (Post
+             .update(comment_count=Post.comment_count + 1,
+                     hot_score=hot_score(Post.likes, Post.comment_count + 1, Post.created_at))
+             .where(Post.id == post.id)
+             .execute())
+        return comment
+
+    @classmethod
+    def latest_by_post(cls, post_ids, per_post=COMMENT_PREVIEW_SIZE):
+        """The newest `per_post` comments of each post, oldest first, with their authors.
+
+        One query for any number of posts; returns {post_id: [Comment, ...]}.
+        """
+        ranked = (cls
+                  .select(cls.id, fn.ROW_NUMBER().over(
+                      partition_by=[cls.post],
+                      order_by=[cls.created_at.desc(), cls.id.desc()]).alias('position'))
+                  .where(cls.post.in_(post_ids)))
+        query = (cls
+                 .select(cls, User)
+                 .join(User)
+                 .switch(cls)
+                 .join(ranked, on=(cls.id == ranked.c.id))
+                 # Repeating the post filter lets the outer read use the post index too
+                 .where(cls.post.in_(post_ids) & (ranked.c.position <= per_post))
+                 .order_by(cls.created_at.asc(), cls.id.asc()))
+
+        comments = defaultdict(list)
+        for comment in query:
+            comments[comment.post_id].append(comment)
+        return comments
+
+    @classmethod
+    def reconcile_counts(cls):
+        """Repair drift between Post.comment_count and the comment rows. Returns posts fixed."""
+        actual = (cls
+                  .select(fn.COUNT(cls.id))
+                  .where(cls.post == Post.id))
+        return Post.update(comment_count=actual).where(Post.comment_count != actual).execute()
+
 class Like(BaseModel):
     user = ForeignKeyField(User, backref='likes')
-    post = ForeignKeyField(Post, backref='likes')
+    # Not 'likes': that backref would shadow the Post.likes counter column
+    post = ForeignKeyField(Post, backref='like_rows')
     created_at = DateTimeField(default=datetime.now)
 
     class Meta:
         table_name = 'like'
         primary_key = CompositeKey('post', 'user')
+        indexes = (
+            (('user', 'post'), False),  # a user's likes, e.g. which posts on a page they liked
+        )
+
+    @classmethod
+    def liked_post_ids(cls, user_id, post_ids):
+        # The subset of post_ids this user has liked, in one query
+        if not user_id or not post_ids:
+            return set()
+        query = cls.select(cls.post).where((cls.user == user_id) & (cls.post.in_(post_ids)))
+        return {like.post_id for like in query}
+
+    @classmethod
+    def toggle(cls, post, user):
+        """Like or unlike a post, adjusting Post.likes atomically.
+
+        Returns (liked, likes) as seen after the toggle.
+        """
+        with db.atomic():
+            removed = cls.delete().where((cls.post == post) & (cls.user == user)).execute()
+            if removed:
+                delta = -removed
+            else:
+                # A concurrent duplicate like hits the primary key and inserts nothing
+                delta = cls.insert(post=post, user=user).on_conflict_ignore().as_rowcount().execute()
+
+            likes = (Post
+                     .update(likes=Post.likes + delta,
+                             hot_score=hot_score(Post.likes + delta, Post.comment_count, Post.created_at))
+                     .where(Post.id == post.id)
+                     .returning(Post.likes)
+                     .execute())
+            return not removed, likes[0].likes if likes else 0
+
+    @classmethod
+    def reconcile_counts(cls):
+        """Repair drift between Post.likes and the like rows. Returns posts fixed."""
+        actual = (cls
+                  .select(fn.COUNT(cls.user))
+                  .where(cls.post == Post.id))
+        return Post.update(likes=actual).where(Post.likes != actual).execute()
+
+
+class TimelineEntry(BaseModel):
+    # Fan-out-on-write home timeline: one row per (member, post) of the communities they joined
+    user = ForeignKeyField(User, backref='timeline')
+    post = ForeignKeyField(Post, backref='timeline_entries')
+    community = ForeignKeyField(Community, backref='timeline_entries')
+    created_at = DateTimeField()
+
+    class Meta:
+        table_name = 'timeline_entry'
+        primary_key = CompositeKey('user', 'post')
+        indexes = (
+            (('user', 'created_at', 'post'), False),  # timeline reads are a range scan on this
+            (('user', 'community'), False),
+        )
+
+    @classmethod
+    def _materialize(cls, where=None):
+        # INSERT ... SELECT every matching (member, post) pair in one statement
+        query = (
+            UserCommunity
+            .select(UserCommunity.user, Post.id, Post.community, Post.created_at)
+            .join(Post, on=(Post.community == UserCommunity.community))
+        )
+        if where is not None:
+            query = query.where(where)
+        (cls
+         .insert_from(query, [cls.user, cls.post, cls.community, cls.created_at])
+         .on_conflict_ignore()
+         .execute())
+
+    @classmethod
+    def fan_out(cls, post):
+        cls._materialize(Post.id == post.id)
+
+    @classmethod
+    def backfill(cls, user, community):
+        cls._materialize((UserCommunity.user == user) & (UserCommunity.community == community))
+
+    @classmethod
+    def remove(cls, user, community):
+        return cls.delete().where((cls.user == user) & (cls.community == community)).execute()
+
+    @classmethod
+    def rebuild(cls, user=None):
+        if user is None:
+            cls.delete().execute()
+            cls._materialize()
+        else:
+            cls.delete().where(cls.user == user).execute()
+            cls._materialize(UserCommunity.user == user)
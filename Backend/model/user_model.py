@@ -1,8 +1,10 @@
 import typing
 
-from Backend.model.database_model import BaseModel
-from peewee import CharField, DateField, IntegerField, ForeignKeyField, DateTimeField, SQL, TextField, BooleanField
+from Backend.model.database_model import BaseModel, db
+from peewee import (CharField, DateField, IntegerField, FloatField, ForeignKeyField, DateTimeField, SQL, TextField,
+                    BooleanField)
 import datetime
+from collections import defaultdict
 from typing import List
 from .image_model import Image
 
@@ -30,37 +32,106 @@ class User(BaseModel):
     bio = TextField(null=True, default=None)
 
     def to_dict(self):
-        return {
-            "id": self.id,
-            "email": self.email,
-            "username": self.username,
-            "firstname": self.firstname,
-            'full_name': f"{self.firstname} {self.lastname}",
-            "lastname": self.lastname,
-            "year_level": self.year_level,
-            "degree": self.degree,
-            "date_of_birth": self.date_of_birth.isoformat() if self.date_of_birth else None,
-            "gender": self.gender,
-            "profile_picture": self.profile_picture.url if self.profile_picture else None,
-            "profile_picture_url": self.profile_picture.url if self.profile_picture else None,
-            "neurotypes": [unt.neurotype.name for unt in self.neurotypes],
-            "interests": [ui.interest.name for ui in self.interests],
-            # Keep both pronoun & pronoun coz we are using these interchangeably...
-            "pronoun": self.pronoun,
-            "pronouns": self.pronoun,
-            "bio": self.bio,
-            "photos": [photo.photo_url for photo in self.photos if photo.photo_url],
-        }
+        return User.to_dicts([self])[0]
+
+    @classmethod
+    def to_dicts(cls, users):
+        """to_dict() for a list of users in at most 4 queries, however many there are.
+
+        Profile pictures already joined onto the users are not fetched again.
+        """
+        users = list(users)
+        if not users:
+            return []
+        user_ids = [user.id for user in users]
+        pictures = cls.profile_pictures(users)
+
+        neurotypes = defaultdict(list)
+        for user_id, name in (UserNeurotype
+                              .select(UserNeurotype.user, Neurotype.name)
+                              .join(Neurotype)
+                              .where(UserNeurotype.user.in_(user_ids))
+                              .order_by(UserNeurotype.id)
+                              .tuples()):
+            neurotypes[user_id].append(name)
+
+        interests = defaultdict(list)
+        for user_id, name in (UserInterest
+                              .select(UserInterest.user, Interest.name)
+                              .join(Interest)
+                              .where(UserInterest.user.in_(user_ids))
+                              .order_by(UserInterest.id)
+                              .tuples()):
+            interests[user_id].append(name)
+
+        photos = defaultdict(list)
+        for user_id, url in (UserPhoto
+                             .select(UserPhoto.user, UserPhoto.photo_url)
+                             .where(UserPhoto.user.in_(user_ids))
+                             .order_by(UserPhoto.id)
+                             .tuples()):
+            if url:
+                photos[user_id].append(url)
+
+        out = []
+        for user in users:
+            picture = pictures.get(user.profile_picture_id)
+            out.append({
+                "id": user.id,
+                "email": user.email,
+                "username": user.username,
+                "firstname": user.firstname,
+                'full_name': f"{user.firstname} {user.lastname}",
+                "lastname": user.lastname,
+                "year_level": user.year_level,
+                "degree": user.degree,
+                "date_of_birth": user.date_of_birth.isoformat() if user.date_of_birth else None,
+                "gender": user.gender,
+                "profile_picture": picture.url if picture else None,
+                "profile_picture_url": picture.url if picture else None,
+                "neurotypes": neurotypes[user.id],
+                "interests": interests[user.id],
+                # Keep both pronoun & pronoun coz we are using these interchangeably...
+                "pronoun": user.pronoun,
+                "pronouns": user.pronoun,
+                "bio": user.bio,
+                "photos": photos[user.id],
+            })
+        return out
+
+    @classmethod
+    def cards(cls, users):
+        """The lightweight projection for list rows: names and picture only, at most 1 query."""
+        users = list(users)
+        pictures = cls.profile_pictures(users)
+        out = []
+        for user in users:
+            picture = pictures.get(user.profile_picture_id)
+            out.append({
+                "id": user.id,
+                "email": user.email,
+                "username": user.username,
+                "full_name": f"{user.firstname} {user.lastname}",
+                "profile_picture_url": picture.url if picture else None,
+            })
+        return out
+
+    @staticmethod
+    def profile_pictures(users):
+        # {image id: Image} for the users' profile pictures, reusing any joined onto them
+        pictures = {user.profile_picture_id: user.profile_picture for user in users
+                    if user.profile_picture_id and 'profile_picture' in user.__rel__}
+        missing = {user.profile_picture_id for user in users
+                   if user.profile_picture_id and user.profile_picture_id not in pictures}
+        if missing:
+            pictures.update((image.id, image) for image in Image.select().where(Image.id.in_(missing)))
+        return pictures
 
     def is_friend_with(self, other_user):
-        from Backend.model.user_model import Friend  # to avoid circular import issues
-        return Friend.select().where(
-            (
-                ((Friend.user == self) & (Friend.connected_user == other_user)) |
-                ((Friend.user == other_user) & (Friend.connected_user == self))
-            ) &
-            (Friend.status == 'accepted')
-        ).exists()
+        from Backend.friend_graph import friend_graph  # to avoid circular import issues
+        if friend_graph.loaded:
+            return friend_graph.are_friends(self.id, [other_user.id])[other_user.id]
+        return Friendship.select().where((Friendship.user == self) & (Friendship.friend == other_user)).exists()
 
 
 class Interest(BaseModel):
@@ -90,7 +161,49 @@ class Friend(BaseModel):
     updated_at = DateTimeField(default=datetime.datetime.now)
 
     class Meta:
-        indexes = ((('user', 'connected_user'), True),)
+        indexes = (
+            (('user', 'connected_user'), True),
+            (('updated_at',), False),  # friend graph refreshes read recent changes
+        )
+
+
+class Friendship(BaseModel):
+    # Accepted friendships stored once per direction, so "friends of X" is an index range on user.
+    # Friend keeps the requests; this is kept in step with it when one is accepted.
+    user = ForeignKeyField(User, backref='friendships')
+    friend = ForeignKeyField(User, backref='befriended_by')
+    created_at = DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        table_name = 'friendship'
+        indexes = (
+            (('user', 'friend'), True),
+        )
+
+    @classmethod
+    def link(cls, user, friend):
+        now = datetime.datetime.now()
+        with db.atomic():
+            (cls
+             .insert_many([(user, friend, now), (friend, user, now)], fields=[cls.user, cls.friend, cls.created_at])
+             .on_conflict_ignore()
+             .execute())
+
+    @classmethod
+    def unlink(cls, user, friend):
+        return cls.delete().where(
+            ((cls.user == user) & (cls.friend == friend)) | ((cls.user == friend) & (cls.friend == user))).execute()
+
+    @classmethod
+    def backfill(cls):
+        """Add both directions of every accepted Friend request that is missing here."""
+        accepted = Friend.status == 'accepted'
+        pairs = (Friend.select(Friend.user, Friend.connected_user, Friend.updated_at).where(accepted) |
+                 Friend.select(Friend.connected_user, Friend.user, Friend.updated_at).where(accepted))
+        return (cls
+                .insert_from(pairs, [cls.user, cls.friend, cls.created_at])
+                .on_conflict_ignore()
+                .execute())
 
 class UserPhoto(BaseModel):
     user = ForeignKeyField(User, backref='photos')
@@ -99,4 +212,27 @@ class UserPhoto(BaseModel):
     created_at = DateTimeField(default=datetime.datetime.now)
     
     class Meta:
-        table_name = 'user_photos'
\ No newline at end of file
+        table_name = 'user_photos'
+
+
+class FriendSuggestion(BaseModel):
+    # Precomputed by Backend/recommender.py; a user's suggestions are replaced as a whole
+    user = ForeignKeyField(User, backref='friend_suggestions')
+    suggested_user = ForeignKeyField(User, backref='suggested_to')
+    score = FloatField()
+
+    class Meta:
+        table_name = 'friend_suggestion'
+        indexes = (
+            (('user', 'score', 'suggested_user'), False),
+        )
+
+
+class SuggestionState(BaseModel):
+    # Fingerprint of the features a user's suggestions were computed from, so unchanged users are skipped
+    user = ForeignKeyField(User, primary_key=True, backref='suggestion_state')
+    fingerprint = CharField()
+    computed_at = DateTimeField(default=datetime.datetime.utcnow)
+
+    class Meta:
+        table_name = 'friend_suggestion_state'
@@ -0,0 +1,211 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from Backend.model.user_model import Friendship
+from Backend.model.homepage_model import UserCommunity
+from Backend.model.message_model import GroupChatMember
+
+logger = logging.getLogger(__name__)
+
+# Sockets that haven't sent a heartbeat for this long count as gone
+PRESENCE_TTL = int(os.environ.get("PRESENCE_TTL_SECONDS", 90))
+# Unset keeps presence in this process; a redis:// URL shares it between processes
+PRESENCE_BACKEND = os.environ.get("PRESENCE_BACKEND", "")
+
+# What an online user is counted as online *in*
+FRIENDS = "friends"        # id is a user whose friends list shows them
+COMMUNITY = "community"
+GROUP = "group"
+
+
+class MemoryStore:
+    """Sets and scored sets held in this process."""
+
+    def __init__(self):
+        self._sets = defaultdict(set)
+        self._scores = defaultdict(dict)
+        self._lock = threading.RLock()
+
+    def sadd(self, key, *members):
+        with self._lock:
+            self._sets[key].update(members)
+
+    def srem(self, key, *members):
+        with self._lock:
+            self._sets[key].difference_update(members)
+            if not self._sets[key]:
+                del self._sets[key]
+
+    def smembers(self, key):
+        with self._lock:
+            return set(self._sets.get(key, ()))
+
+    def delete(self, key):
+        with self._lock:
+            self._sets.pop(key, None)
+
+    def zadd(self, key, member, score):
+        with self._lock:
+            self._scores[key][member] = score
+
+    def zrem(self, key, member):
+        with self._lock:
+            self._scores[key].pop(member, None)
+            if not self._scores[key]:
+                del self._scores[key]
+
+    def zscore(self, key, member):
+        with self._lock:
+            return self._scores.get(key, {}).get(member)
+
+    def zcard(self, key):
+        with self._lock:
+            return len(self._scores.get(key, ()))
+
+    def zbelow(self, key, score):
+        with self._lock:
+            return [member for member, s in self._scores.get(key, {}).items() if s <= score]
+
+
+class RedisStore:
+    """The same operations on Redis, so every process sees one presence state."""
+
+    def __init__(self, url, prefix="presence:"):
+        import redis  # optional dependency, only needed for a shared backend
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def sadd(self, key, *members):
+        self.redis.sadd(self.prefix + key, *members)
+
+    def srem(self, key, *members):
+        self.redis.srem(self.prefix + key, *members)
+
+    def smembers(self, key):
+        return self.redis.smembers(self.prefix + key)
+
+    def delete(self, key):
+        self.redis.delete(self.prefix + key)
+
+    def zadd(self, key, member, score):
+        self.redis.zadd(self.prefix + key, {member: score})
+
+    def zrem(self, key, member):
+        self.redis.zrem(self.prefix + key, member)
+
+    def zscore(self, key, member):
+        return self.redis.zscore(self.prefix + key, member)
+
+    def zcard(self, key):
+        return self.redis.zcard(self.prefix + key)
+
+    def zbelow(self, key, score):
+        return self.redis.zrangebyscore(self.prefix + key, "-inf", score)
+
+
+class PresenceRegistry:
+    """Who is online, indexed by where they count as online.
+
+    A user is online while at least one of their sockets has heartbeated in
+    the last `ttl` seconds. When they come online they are added to one set
+    per friend, community and group they belong to, so "who is online in X"
+    is a single set read, proportional to the answer rather than to X.
+
+    Keys (all sets of user ids unless noted):
+      online                       every online user
+      sessions:<user>              scored set of socket ids -> expiry
+      expiry                       scored set of "<user>|<sid>" -> expiry
+      in:<user>                    "<kind>:<id>" entries the user was added to
+      online:<kind>:<id>           online users in that friends list/community/group
+    """
+
+    def __init__(self, store=None, ttl=PRESENCE_TTL):
+        self.store = store or MemoryStore()
+        self.ttl = ttl
+
+    def connect(self, user_id, sid, memberships=(), now=None):
+        """Register a socket. `memberships` are the (kind, id) pairs the user counts in."""
+        expires = (now or time.time()) + self.ttl
+        first = self.store.zcard(f"sessions:{user_id}") == 0
+        self.store.zadd(f"sessions:{user_id}", sid, expires)
+        self.store.zadd("expiry", f"{user_id}|{sid}", expires)
+        if first:
+            self.store.sadd("online", user_id)
+            for kind, target in memberships:
+                self.add_membership(user_id, kind, target)
+        return first
+
+    def heartbeat(self, user_id, sid, now=None):
+        expires = (now or time.time()) + self.ttl
+        if self.store.zscore(f"sessions:{user_id}", sid) is None:
+            return False
+        self.store.zadd(f"sessions:{user_id}", sid, expires)
+        self.store.zadd("expiry", f"{user_id}|{sid}", expires)
+        return True
+
+    def disconnect(self, user_id, sid):
+        """Drop a socket. Returns True if that was the user's last one."""
+        self.store.zrem(f"sessions:{user_id}", sid)
+        self.store.zrem("expiry", f"{user_id}|{sid}")
+        if self.store.zcard(f"sessions:{user_id}"):
+            return False
+        for entry in self.store.smembers(f"in:{user_id}"):
+            self.store.srem(f"online:{entry}", user_id)
+        self.store.delete(f"in:{user_id}")
+        self.store.srem("online", user_id)
+        return True
+
+    def expire(self, now=None):
+        """Disconnect sockets whose heartbeat lapsed. Returns how many were dropped."""
+        stale = self.store.zbelow("expiry", now or time.time())
+        for entry in stale:
+            user_id, sid = entry.split("|", 1)
+            self.disconnect(int(user_id), sid)
+        return len(stale)
+
+    def run_sweeper(self, sleep):
+        while True:
+            sleep(max(self.ttl / 3, 1))
+            try:
+                self.expire()
+            except Exception:
+                logger.exception("Presence sweep failed")
+
+    def is_online(self, user_id):
+        return self.store.zcard(f"sessions:{user_id}") > 0
+
+    def online(self, kind, target):
+        """Ids of online users in a friends list, community or group."""
+        return {int(user_id) for user_id in self.store.smembers(f"online:{kind}:{target}")}
+
+    # Keeping the indexes current while users are online
+
+    def add_membership(self, user_id, kind, target):
+        if not self.is_online(user_id):
+            return
+        self.store.sadd(f"in:{user_id}", f"{kind}:{target}")
+        self.store.sadd(f"online:{kind}:{target}", user_id)
+
+    def remove_membership(self, user_id, kind, target):
+        self.store.srem(f"in:{user_id}", f"{kind}:{target}")
+        self.store.srem(f"online:{kind}:{target}", user_id)
+
+    def add_friendship(self, user_id, friend_id):
+        self.add_membership(user_id, FRIENDS, friend_id)
+        self.add_membership(friend_id, FRIENDS, user_id)
+
+
+def memberships_of(user_id):
+    """Every (kind, id) a user counts as online in: 3 indexed queries, run once per connect."""
+    for (friend_id,) in Friendship.select(Friendship.friend).where(Friendship.user == user_id).tuples():
+        yield FRIENDS, friend_id
+    for (community_id,) in UserCommunity.select(UserCommunity.community).where(UserCommunity.user == user_id).tuples():
+        yield COMMUNITY, community_id
+    for (group_id,) in GroupChatMember.select(GroupChatMember.group).where(GroupChatMember.user == user_id).tuples():
+        yield GROUP, group_id
+
+
+presence = PresenceRegistry(RedisStore(PRESENCE_BACKEND) if PRESENCE_BACKEND else MemoryStore())
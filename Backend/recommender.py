@@ -0,0 +1,140 @@
+import hashlib
+import os
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+from peewee import EXCLUDED, chunked
+
+from Backend.model.database_model import db
+from Backend.model.user_model import User, UserInterest, UserNeurotype, Friend, FriendSuggestion, SuggestionState
+from Backend.model.homepage_model import UserCommunity
+
+# Suggestions stored per user
+FRIEND_SUGGESTION_COUNT = int(os.environ.get("FRIEND_SUGGESTION_COUNT", 50))
+# cosine: shared / sqrt(|a| * |b|), jaccard: shared / |a or b|, over interests, neurotypes and communities
+FRIEND_SUGGESTION_METRIC = os.environ.get("FRIEND_SUGGESTION_METRIC", "cosine")
+METRICS = ("cosine", "jaccard")
+# Users scored per sparse product; bounds memory when a community is very large
+BATCH_SIZE = 500
+
+# Each becomes a block of binary feature columns
+FEATURES = (
+    (UserInterest, UserInterest.interest),
+    (UserNeurotype, UserNeurotype.neurotype),
+    (UserCommunity, UserCommunity.community),
+)
+
+
+def feature_matrix():
+    """Users x features CSR matrix of 1s, the user id of each row (ascending) and the
+    (block, feature id) of each column, ascending.
+    """
+    user_ids = np.fromiter((user_id for (user_id,) in User.select(User.id).order_by(User.id).tuples()), np.int64)
+    rows, columns, keys, width = [], [], [], 0
+    for block, (model, field) in enumerate(FEATURES):
+        pairs = np.array(list(model.select(model.user, field).distinct().tuples()), np.int64).reshape(-1, 2)
+        features, column = np.unique(pairs[:, 1], return_inverse=True)
+        rows.append(np.searchsorted(user_ids, pairs[:, 0]))
+        columns.append(column + width)
+        keys.append(np.column_stack([np.full(len(features), block, np.int64), features]))
+        width += len(features)
+    rows, columns, keys = np.concatenate(rows), np.concatenate(columns), np.concatenate(keys)
+    matrix = sparse.csr_matrix((np.ones(len(rows), np.float32), (rows, columns)), shape=(len(user_ids), width))
+    matrix.sort_indices()
+    return matrix, user_ids, keys
+
+
+def fingerprint(matrix, keys, row):
+    # Over the features themselves: column numbers shift whenever anyone adds a new interest
+    return hashlib.sha1(keys[matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]].tobytes()).hexdigest()
+
+
+def connections(user_ids):
+    """Row -> rows of every user it already has a Friend row with, in either direction and any status."""
+    pairs = np.array(list(Friend.select(Friend.user, Friend.connected_user).tuples()), np.int64).reshape(-1, 2)
+    pairs = np.searchsorted(user_ids, pairs)
+    linked = {}
+    for a, b in np.concatenate([pairs, pairs[:, ::-1]]):
+        linked.setdefault(int(a), []).append(b)
+    return {row: np.array(others) for row, others in linked.items()}
+
+
+def top_candidates(matrix, rows, excluded, k=FRIEND_SUGGESTION_COUNT, metric=FRIEND_SUGGESTION_METRIC):
+    """Yield (row, candidate rows, scores) for each row, best first, at most `k`.
+
+    Candidates share at least one feature; `excluded` maps a row to rows it
+    must not be suggested (existing connections).
+    """
+    degrees = np.asarray(matrix.sum(axis=1), np.float64).ravel()
+    shared = (matrix[rows] @ matrix.T).tocsr()
+    for i, row in enumerate(rows):
+        start, end = shared.indptr[i], shared.indptr[i + 1]
+        candidates = shared.indices[start:end]
+        counts = shared.data[start:end].astype(np.float64)
+
+        keep = candidates != row
+        if row in excluded:
+            keep &= ~np.isin(candidates, excluded[row])
+        candidates, counts = candidates[keep], counts[keep]
+        if metric == "jaccard":
+            scores = counts / (degrees[row] + degrees[candidates] - counts)
+        else:
+            scores = counts / np.sqrt(degrees[row] * degrees[candidates])
+
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            candidates, scores = candidates[best], scores[best]
+        order = np.lexsort((candidates, -scores))  # ties go to the older account
+        yield row, candidates[order], scores[order]
+
+
+def refresh_suggestions(full=False, k=FRIEND_SUGGESTION_COUNT, metric=FRIEND_SUGGESTION_METRIC):
+    """Recompute stored friend suggestions. Returns how many users were recomputed.
+
+    Incremental by default: only users whose interests, neurotypes or
+    communities changed since their last run (or who never had one) are
+    scored again. Other users' lists only pick up those changes on a `full`
+    run, so schedule both, e.g. incremental every few minutes and full nightly.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"FRIEND_SUGGESTION_METRIC must be one of {', '.join(METRICS)}")
+
+    with db.atomic(isolation_level="REPEATABLE READ"):
+        # One snapshot, so every feature and connection row refers to a user in user_ids
+        matrix, user_ids, keys = feature_matrix()
+        known = dict(SuggestionState.select(SuggestionState.user, SuggestionState.fingerprint).tuples())
+        prints = {row: fingerprint(matrix, keys, row) for row in range(len(user_ids))}
+        stale = [row for row, user_id in enumerate(user_ids.tolist()) if full or known.get(user_id) != prints[row]]
+        if not stale:
+            return 0
+        excluded = connections(user_ids)
+
+    for start in range(0, len(stale), BATCH_SIZE):
+        batch = stale[start:start + BATCH_SIZE]
+        suggestions = [
+            {"user": int(user_ids[row]), "suggested_user": int(user_ids[candidate]), "score": float(score)}
+            for row, candidates, scores in top_candidates(matrix, batch, excluded, k, metric)
+            for candidate, score in zip(candidates, scores)
+        ]
+        batch_user_ids = [int(user_ids[row]) for row in batch]
+        now = datetime.utcnow()
+        with db.atomic():
+            # Accounts deleted since the snapshot are left out rather than failing their foreign keys
+            mentioned = {row["suggested_user"] for row in suggestions} | set(batch_user_ids)
+            existing = {user_id for (user_id,) in User.select(User.id).where(User.id.in_(mentioned)).tuples()}
+            suggestions = [row for row in suggestions if row["user"] in existing and row["suggested_user"] in existing]
+            batch = [row for row in batch if int(user_ids[row]) in existing]
+            FriendSuggestion.delete().where(FriendSuggestion.user.in_(batch_user_ids)).execute()
+            for rows in chunked(suggestions, 1000):
+                FriendSuggestion.insert_many(rows).execute()
+            if not batch:
+                continue
+            (SuggestionState
+             .insert_many([{"user": int(user_ids[row]), "fingerprint": prints[row], "computed_at": now}
+                           for row in batch])
+             .on_conflict(conflict_target=[SuggestionState.user],
+                          update={SuggestionState.fingerprint: EXCLUDED.fingerprint,
+                                  SuggestionState.computed_at: EXCLUDED.computed_at})
+             .execute())
+    return len(stale)
@@ -0,0 +1,142 @@
+# Production entry point: `python -m Backend.server`
+#
+# Runs Flask + Socket.IO on an async (green thread) server instead of the
+# Werkzeug dev server. Each worker patches the standard library and psycopg2
+# *before* it imports the app, so blocking socket and database calls yield to
+# other clients instead of stalling the whole process.
+#
+#   SOCKETIO_ASYNC_MODE   eventlet (default) or gevent
+#   SERVER_HOST           default 0.0.0.0
+#   SERVER_PORT           default 5002 (the Docker image pins 5000)
+#   SERVER_WORKERS        worker processes sharing the port (default 1)
+#   SERVER_CONCURRENCY    max concurrent connections per worker (default 1000)
+#
+# With SERVER_WORKERS > 1 the parent binds the port and forks the workers,
+# which accept from the same socket. A client may then land on any worker, so
+# SOCKETIO_MESSAGE_QUEUE must be set for them to share rooms, and clients must
+# use the websocket transport (long-polling needs every request of a session
+# on the same worker). Keep DATABASE_MAX_CONNECTIONS * SERVER_WORKERS within
+# the database's max_connections; requests beyond a worker's pool wait up to
+# DATABASE_POOL_TIMEOUT for a pooled connection.
+import os
+import signal
+import socket
+import sys
+
+ASYNC_MODE = os.environ.get("SOCKETIO_ASYNC_MODE", "eventlet")
+SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", 5002))
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", 1))
+SERVER_CONCURRENCY = int(os.environ.get("SERVER_CONCURRENCY", 1000))
+
+
+def make_psycopg_green(wait_read, wait_write):
+    """Make psycopg2 wait on the event loop instead of blocking the process."""
+    import psycopg2
+    from psycopg2 import extensions
+
+    def wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                wait_read(conn.fileno())
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno())
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+    extensions.set_wait_callback(wait_callback)
+
+
+def listen(host, port):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(1024)
+    return listener
+
+
+def serve(listener):
+    """Patch this process for ASYNC_MODE, import and initialize the app and serve `listener` until stopped."""
+    if ASYNC_MODE == "eventlet":
+        import eventlet
+        import eventlet.wsgi
+        from eventlet.greenio import GreenSocket
+        from eventlet.hubs import trampoline
+
+        eventlet.monkey_patch()
+        make_psycopg_green(lambda fd: trampoline(fd, read=True), lambda fd: trampoline(fd, write=True))
+        from Backend.app import app, init_app
+
+        init_app()
+        eventlet.wsgi.server(GreenSocket(listener), app, max_size=SERVER_CONCURRENCY, log_output=False)
+    elif ASYNC_MODE == "gevent":
+        from gevent import monkey
+
+        monkey.patch_all()
+        from gevent import pywsgi
+        from gevent.pool import Pool
+        from gevent.socket import socket as green_socket, wait_read, wait_write
+
+        make_psycopg_green(wait_read, wait_write)
+        from Backend.app import app, init_app
+
+        init_app()
+        # gevent's server takes a pool size rather than a connection cap
+        server = pywsgi.WSGIServer(green_socket(fileno=listener.detach()), app, log=None,
+                                   spawn=Pool(SERVER_CONCURRENCY))
+        server.serve_forever()
+    else:
+        raise RuntimeError(f"Unsupported SOCKETIO_ASYNC_MODE {ASYNC_MODE!r}; use eventlet or gevent")
+
+
+def fork_workers(listener, count):
+    """Run `count` workers on `listener`; stop them all on SIGTERM/SIGINT or when any one exits."""
+    workers = set()
+    stopping = []
+    for _ in range(count):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                serve(listener)
+            finally:
+                os._exit(1)
+        workers.add(pid)
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    status = 0
+    while workers:
+        pid, code = os.wait()
+        workers.discard(pid)
+        if code and not stopping:
+            # One worker died: take the rest down so the container is restarted whole
+            status = 1
+            print(f"worker {pid} exited ({code}), stopping", file=sys.stderr)
+            stop(None, None)
+    return status
+
+
+def main():
+    if SERVER_WORKERS > 1 and not os.environ.get("SOCKETIO_MESSAGE_QUEUE"):
+        raise RuntimeError("SERVER_WORKERS > 1 needs SOCKETIO_MESSAGE_QUEUE so workers share rooms")
+    listener = listen(SERVER_HOST, SERVER_PORT)
+    if SERVER_WORKERS == 1:
+        serve(listener)
+        return 0
+    return fork_workers(listener, SERVER_WORKERS)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
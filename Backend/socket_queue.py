@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+import psycopg2
+import socketio
+
+from Backend.model.database_model import DATABASE_NAME, DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST, DATABASE_PORT
+
+logger = logging.getLogger(__name__)
+
+# Where Socket.IO processes share emits and room changes:
+#   unset / ""        single process, rooms are in memory (development)
+#   postgres          LISTEN/NOTIFY on the app's own database
+#   redis://host/db   Redis pub/sub (needs `pip install redis`)
+SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE", "")
+SOCKETIO_CHANNEL = os.environ.get("SOCKETIO_CHANNEL", "loop_socketio")
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_LIMIT = 7999
+
+
+class PostgresManager(socketio.PubSubManager):
+    """Socket.IO client manager that fans out through Postgres LISTEN/NOTIFY.
+
+    Every process LISTENs on one channel; emits, room joins and disconnects
+    for clients held by another process are NOTIFYed as JSON and replayed
+    there. Payloads over the NOTIFY limit are dropped with an error, so keep
+    socket events to chat-sized messages.
+    """
+    name = "postgres"
+
+    def __init__(self, connect_kwargs, channel=SOCKETIO_CHANNEL, write_only=False, logger=None):
+        self.connect_kwargs = connect_kwargs
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        conn.autocommit = True
+        return conn
+
+    def _publish(self, data):
+        payload = json.dumps(data)
+        if len(payload.encode("utf-8")) > NOTIFY_PAYLOAD_LIMIT:
+            logger.error("Socket.IO %s message too large for NOTIFY, not sent to other processes", data.get("method"))
+            return
+
+        with self._publish_lock:
+            # One reconnect attempt, e.g. after a database restart
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None or self._publish_conn.closed:
+                        self._publish_conn = self._connect()
+                    with self._publish_conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                    return
+                except psycopg2.Error:
+                    self._publish_conn = None
+                    logger.error("Cannot publish to postgres%s", "... retrying" if attempt == 0 else "... giving up")
+
+    def _listen(self):
+        retry_sleep = 1
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                retry_sleep = 1
+                while True:
+                    # Wake up now and then so a dead connection is noticed
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        with conn.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+                    conn.poll()
+                    while conn.notifies:
+                        yield conn.notifies.pop(0).payload
+            except psycopg2.Error:
+                if conn is not None:
+                    conn.close()
+                logger.error("Cannot receive from postgres... retrying in %s secs", retry_sleep)
+                time.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+
+
+def socketio_queue_options(url=SOCKETIO_MESSAGE_QUEUE):
+    """Keyword arguments for SocketIO() that attach the configured message queue."""
+    if not url:
+        return {}
+    if url == "postgres":
+        return {"client_manager": PostgresManager({
+            "dbname": DATABASE_NAME, "user": DATABASE_USER, "password": DATABASE_PASSWORD,
+            "host": DATABASE_HOST, "port": DATABASE_PORT,
+        })}
+    if url.startswith(("postgres://", "postgresql://")):
+        return {"client_manager": PostgresManager({"dsn": url})}
+    # redis://, kafka://, amqp:// ... are handled by Flask-SocketIO itself
+    return {"message_queue": url, "channel": SOCKETIO_CHANNEL}
@@ -0,0 +1,136 @@
+import threading
+from collections import OrderedDict
+
+from flask import request, session
+from flask_jwt_extended import decode_token
+from peewee import JOIN, fn
+
+from Backend.model.user_model import User
+from Backend.model.image_model import Image
+from Backend.model.community_model import Community
+from Backend.model.message_model import GroupChatMember, ReadWatermark
+
+# Room kinds, named like the read watermarks they share ids with
+DIRECT = ReadWatermark.DIRECT        # room "<email>_<email>", lowercased and sorted
+GROUP = ReadWatermark.GROUP          # room "<GroupChat id>"
+COMMUNITY = ReadWatermark.COMMUNITY  # room "<Community id>"
+
+
+def authenticate(auth):
+    """Resolve the connecting client's JWT to the user fields chat events need.
+
+    The token comes from the Socket.IO `auth` payload ({"token": ...}) or a
+    `token` query parameter. Returns None if it is missing or invalid.
+    """
+    token = (auth or {}).get("token") or request.args.get("token")
+    if not token:
+        return None
+    try:
+        user_id = decode_token(token)["sub"]
+    except Exception:
+        return None
+
+    user = (
+        User
+        .select(User.id, User.email, User.username, Image)
+        .join(Image, JOIN.LEFT_OUTER, on=(User.profile_picture == Image.id))
+        .where(User.id == user_id)
+        .first()
+    )
+    if user is None:
+        return None
+    return {
+        "id": user.id,
+        "email": user.email,
+        "username": user.username,
+        "avatar": user.profile_picture.url if user.profile_picture else None,
+    }
+
+
+def start_session(user):
+    session["user"] = user
+    session["rooms"] = {}
+
+
+def current_user():
+    return session.get("user")
+
+
+class RoomRegistry:
+    """Process-wide cache of what chat room names resolve to.
+
+    Direct room partners are looked up by email and community rooms by
+    whether the community exists. Group membership can change, so it is
+    checked per socket when the room is joined instead.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._rooms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key, load):
+        with self._lock:
+            if key in self._rooms:
+                self._rooms.move_to_end(key)
+                return self._rooms[key]
+        value = load()
+        if not value:
+            # Misses aren't cached: the user or community may exist shortly
+            return value
+        with self._lock:
+            self._rooms[key] = value
+            if len(self._rooms) > self.maxsize:
+                self._rooms.popitem(last=False)
+        return value
+
+    def user_id(self, email):
+        # Id of the user with this (lowercased) email, or None
+        return self._cached((DIRECT, email), lambda: User.select(User.id).where(
+            fn.LOWER(User.email) == email).scalar())
+
+    def community_exists(self, community_id):
+        return self._cached((COMMUNITY, community_id),
+                            lambda: Community.select().where(Community.id == community_id).exists())
+
+
+rooms = RoomRegistry()
+
+
+def direct_room(*emails):
+    return "_".join(sorted(email.lower() for email in emails))
+
+
+def join(room, kind=None):
+    """Authorize the current socket for a room and remember what it refers to.
+
+    Numeric rooms are ambiguous between group and community ids unless the
+    client says which `kind` it means; without it both are tried. Returns
+    whether the socket may join.
+    """
+    user = current_user()
+    allowed = session["rooms"]
+
+    if kind in (None, DIRECT) and "@" in room:
+        # The caller must be one side of the room; the rest names the other
+        me = user["email"].lower()
+        partner = room[len(me) + 1:] if room.startswith(me + "_") else room[:-len(me) - 1]
+        partner_id = rooms.user_id(partner)
+        if partner_id is not None and direct_room(me, partner) == room:
+            allowed[(DIRECT, room)] = partner_id
+        return (DIRECT, room) in allowed
+
+    if not room.isdigit():
+        return False
+    target = int(room)
+    if kind in (None, GROUP) and GroupChatMember.select().where(
+            (GroupChatMember.group == target) & (GroupChatMember.user == user["id"])).exists():
+        allowed[(GROUP, room)] = target
+    if kind in (None, COMMUNITY) and rooms.community_exists(target):
+        allowed[(COMMUNITY, room)] = target
+    return (GROUP, room) in allowed or (COMMUNITY, room) in allowed
+
+
+def joined(kind, room):
+    """The id a joined room refers to (the other user for direct rooms), or None."""
+    return session.get("rooms", {}).get((kind, str(room)))
@@ -0,0 +1,95 @@
+import logging
+import os
+from contextlib import contextmanager
+
+import pytest
+
+# Database tests run against TEST_DATABASE_NAME (e.g. a throwaway `createdb loop_test`), which
+# they wipe and reseed, so they never touch the DATABASE_* one. Without it they are skipped.
+TEST_DATABASE_NAME = os.environ.get("TEST_DATABASE_NAME")
+if TEST_DATABASE_NAME:
+    os.environ["DATABASE_NAME"] = TEST_DATABASE_NAME
+    for name, default in (("USER", "postgres"), ("PASSWORD", ""), ("HOST", "localhost"), ("PORT", "5432")):
+        os.environ[f"DATABASE_{name}"] = os.environ.get(f"TEST_DATABASE_{name}", default)
+else:
+    # Models import fine without a server; PostgresqlDatabase only connects when used
+    for name in ("NAME", "USER", "PASSWORD", "HOST"):
+        os.environ.setdefault(f"DATABASE_{name}", "unused")
+    os.environ.setdefault("DATABASE_PORT", "5432")
+
+for name, value in (("SECRET_KEY", "test"), ("JWT_SECRET_KEY", "test-jwt-secret-key-of-at-least-32-bytes"),
+                    ("S3_BUCKET", "test"), ("S3_KEY", "test"), ("S3_SECRET", "test")):
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The Flask app on a freshly created test database."""
+    if not TEST_DATABASE_NAME:
+        pytest.skip("set TEST_DATABASE_NAME (and TEST_DATABASE_USER/PASSWORD/HOST/PORT) to run database tests")
+    from Backend.model.database_model import db
+
+    with db.connection_context():
+        db.execute_sql("DROP SCHEMA public CASCADE")
+        db.execute_sql("CREATE SCHEMA public")
+    # Migrates the empty database to the current schema; sockets and sweepers aren't needed
+    from Backend.app import app, init_app
+    init_app(background_tasks=False)
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def database(app):
+    """The test database, emptied before each test."""
+    from Backend.model.database_model import db
+    from Backend.tests.factories import reset_database
+
+    with db.connection_context():
+        reset_database()
+        yield db
+
+
+@pytest.fixture
+def client(app, database):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth(app):
+    """auth(user) -> request headers carrying that user's access token."""
+    from flask_jwt_extended import create_access_token
+
+    def headers(user):
+        with app.app_context():
+            return {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+    return headers
+
+
+class QueryLog(logging.Handler):
+    # peewee logs every statement it runs as (sql, params) at DEBUG
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.queries = []
+
+    def emit(self, record):
+        if isinstance(record.msg, tuple):
+            self.queries.append(record.msg)
+
+
+@pytest.fixture
+def queries():
+    """queries() -> context manager collecting the (sql, params) of every statement run inside it."""
+    @contextmanager
+    def record():
+        log = QueryLog()
+        logger = logging.getLogger("peewee")
+        level = logger.level
+        logger.addHandler(log)
+        logger.setLevel(logging.DEBUG)
+        try:
+            yield log.queries
+        finally:
+            logger.removeHandler(log)
+            logger.setLevel(level)
+    return record
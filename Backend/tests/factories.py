@@ -0,0 +1,77 @@
+import uuid
+from datetime import datetime, timedelta
+
+from peewee import chunked
+
+from Backend.friend_graph import friend_graph
+from Backend.model.database_model import db
+from Backend.model.migrations import MODELS
+from Backend.model.user_model import User
+from Backend.model.community_model import Community
+from Backend.model.homepage_model import UserCommunity
+from Backend.model.post_model import Post, Comment, Like, TimelineEntry
+from Backend.model.message_model import Message, CommunityMessage, GroupChat, GroupChatMember, GroupMessage
+
+
+def reset_database():
+    """Empty every table, and the friend graph loaded from them."""
+    tables = ", ".join(f'"{model._meta.table_name}"' for model in MODELS)
+    db.execute_sql(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+    friend_graph.load()
+
+
+def insert_all(model, rows):
+    for batch in chunked(rows, 1000):
+        model.insert_many(batch).execute()
+
+
+def make_users(n, prefix="user"):
+    insert_all(User, [{"email": f"{prefix}{i}@example.com", "hash_salted_password": "x",
+                       "username": f"{prefix}{i}", "firstname": prefix, "lastname": str(i)} for i in range(n)])
+    return list(User.select().where(User.email.startswith(prefix)).order_by(User.id))
+
+
+def make_community(owner, members, name="community"):
+    community = Community.create(name=name, description=name, owner=owner, members=len(members))
+    insert_all(UserCommunity, [{"user": user, "community": community} for user in members])
+    return community
+
+
+def make_group(creator, members, name="group"):
+    group = GroupChat.create(name=name, creator=creator)
+    insert_all(GroupChatMember, [{"group": group, "user": user} for user in members])
+    return group
+
+
+def make_posts(communities, authors, n, comments_per_post=0, text="post"):
+    """`n` posts spread over the communities, newest last, with their timelines materialized."""
+    start = datetime.now() - timedelta(days=1)
+    posts = [{"id": uuid.uuid4(), "author": authors[i % len(authors)], "community": communities[i % len(communities)],
+              "topic": f"{text} {i}", "content": f"{text} number {i}", "created_at": start + timedelta(seconds=i),
+              "comment_count": comments_per_post} for i in range(n)]
+    insert_all(Post, posts)
+    insert_all(Comment, [{"post": post["id"], "user": authors[j % len(authors)], "content": f"comment {j}",
+                          "created_at": post["created_at"] + timedelta(seconds=j)}
+                         for post in posts for j in range(comments_per_post)])
+    Post.backfill_search_vectors()
+    TimelineEntry.rebuild()
+    return posts
+
+
+def like_posts(user, posts):
+    insert_all(Like, [{"user": user, "post": post["id"]} for post in posts])
+
+
+def make_direct_messages(pairs, per_pair, text="hello"):
+    insert_all(Message, [{"sender": a if i % 2 else b, "recipient": b if i % 2 else a, "text": f"{text} {i}"}
+                         for a, b in pairs for i in range(per_pair)])
+
+
+def make_community_messages(community, senders, n, text="hello"):
+    insert_all(CommunityMessage, [{"community": community, "sender": senders[i % len(senders)], "text": f"{text} {i}"}
+                                  for i in range(n)])
+
+
+def make_group_messages(group, senders, n, text="hello"):
+    insert_all(GroupMessage, [{"group": group, "sender": senders[i % len(senders)], "text": f"{text} {i}"}
+                              for i in range(n)])
@@ -0,0 +1,36 @@
+import pytest
+
+from Backend.model.post_model import Post, Comment, COMMENT_PREVIEW_SIZE
+from Backend.tests import factories
+
+
+def test_add_keeps_comment_count_in_step(database):
+    author, reader = factories.make_users(2)
+    community = factories.make_community(author, [author, reader])
+    [post] = factories.make_posts([community], [author], 1, comments_per_post=2)
+    post = Post.get_by_id(post["id"])
+
+    for i in range(3):
+        Comment.add(post, reader, f"reply {i}")
+
+    assert Post.get_by_id(post.id).comment_count == Comment.select().where(Comment.post == post).count() == 5
+    assert Comment.reconcile_counts() == 0
+
+
+@pytest.mark.parametrize("n", [1, 20])
+def test_latest_by_post_returns_every_preview_in_one_query(n, database, queries):
+    users = factories.make_users(2)
+    community = factories.make_community(users[0], users)
+    posts = factories.make_posts([community], users, n, comments_per_post=5)
+    post_ids = [post["id"] for post in posts]
+
+    with queries() as statements:
+        previews = Comment.latest_by_post(post_ids)
+        # Authors come with the comments
+        authors = {comment.user.username for comments in previews.values() for comment in comments}
+    assert len(statements) == 1
+
+    assert authors == {user.username for user in users}
+    for post_id in post_ids:
+        # The newest few, oldest first
+        assert [c.content for c in previews[post_id]] == [f"comment {j}" for j in range(5 - COMMENT_PREVIEW_SIZE, 5)]
@@ -0,0 +1,28 @@
+import threading
+
+from Backend.model.database_model import db, pool_stats, DATABASE_MAX_CONNECTIONS
+
+
+def test_pool_stats_count_checkouts_of_the_real_pool(client):
+    before = pool_stats()
+    # This test's own connection is checked out by the database fixture
+    assert before["in_use"] >= 1 and before["max_connections"] == DATABASE_MAX_CONNECTIONS
+    borrowed, release = threading.Event(), threading.Event()
+
+    def borrow():
+        with db.connection_context():
+            borrowed.set()
+            release.wait()
+
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    borrowed.wait()
+    during = pool_stats()
+    release.set()
+    thread.join()
+    after = pool_stats()
+
+    assert during["in_use"] == before["in_use"] + 1
+    assert during["available"] == before["available"] - 1
+    assert after["in_use"] == before["in_use"] and after["idle"] == during["idle"] + 1
+    assert client.get("/health/db").get_json().keys() == after.keys()
@@ -0,0 +1,56 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from Backend.model.post_model import Post, hot_score, HOT_GRAVITY, NEW_POST_HOT_SCORE
+from Backend.tests import factories
+
+
+def make_post(author, community, hours_old, likes, comments=0):
+    post = {"id": uuid.uuid4(), "author": author, "community": community, "content": "post",
+            "created_at": datetime.now() - timedelta(hours=hours_old), "likes": likes, "comment_count": comments}
+    factories.insert_all(Post, [post])
+    return post["id"]
+
+
+def scores_at(now):
+    return dict(Post.select(Post.id, hot_score(Post.likes, Post.comment_count, Post.created_at, now)).tuples())
+
+
+def test_a_newer_post_with_fewer_likes_overtakes_an_old_one_as_it_decays(client, auth):
+    author, reader = factories.make_users(2)
+    community = factories.make_community(author, [author])
+    old = make_post(author, community, hours_old=30, likes=20)
+    new = make_post(author, community, hours_old=1, likes=2)
+
+    # An hour after it was posted the old post was far ahead of where the new one is now
+    created = Post.get_by_id(old).created_at
+    assert scores_at(created + timedelta(hours=1))[old] > scores_at(datetime.now())[new]
+    now = scores_at(datetime.now())
+    assert now[new] > now[old]
+
+    Post.recompute_hot_scores()
+    response = client.get("/post?sort=hot", headers=auth(reader))
+    assert response.status_code == 200, response.get_json()
+    assert [post["id"] for post in response.get_json()["posts"]] == [str(new), str(old)]
+
+
+def test_recompute_hot_scores_updates_the_stored_scores(database):
+    author, = factories.make_users(1)
+    community = factories.make_community(author, [author])
+    recent = make_post(author, community, hours_old=10, likes=5, comments=2)
+    stale = make_post(author, community, hours_old=24 * 8, likes=50)
+    assert [post.hot_score for post in Post.select()] == pytest.approx([NEW_POST_HOT_SCORE] * 2, rel=1e-6)
+
+    assert Post.recompute_hot_scores() == 1
+    # (likes + 2 * comments + 1) / (age in hours + 2) ^ gravity
+    assert Post.get_by_id(recent).hot_score == pytest.approx(10 / 12 ** HOT_GRAVITY, rel=1e-3)
+    # Past the window posts stop being re-scored and drop out of the hot feed's top
+    assert Post.get_by_id(stale).hot_score == 0
+
+
+def test_an_unknown_sort_is_rejected(client, auth):
+    user, = factories.make_users(1)
+    response = client.get("/post?sort=top", headers=auth(user))
+    assert response.status_code == 400
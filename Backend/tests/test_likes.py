@@ -0,0 +1,43 @@
+import pytest
+from peewee import IntegrityError
+
+from Backend.model.database_model import db
+from Backend.model.post_model import Post, Like
+from Backend.tests import factories
+
+
+def make_post():
+    author, *likers = factories.make_users(3)
+    community = factories.make_community(author, [author])
+    [post] = factories.make_posts([community], [author], 1)
+    return Post.get_by_id(post["id"]), likers
+
+
+def test_a_duplicate_like_is_rejected_by_the_unique_index(database):
+    post, (user, _) = make_post()
+    Like.create(post=post, user=user)
+    with pytest.raises(IntegrityError):
+        with db.atomic():
+            Like.insert(post=post, user=user).execute()
+    assert Like.select().count() == 1
+
+
+def test_toggle_moves_the_like_count_by_exactly_one(database):
+    post, (user, other) = make_post()
+
+    assert Like.toggle(post, user) == (True, 1)
+    assert Like.toggle(post, other) == (True, 2)
+    assert Like.toggle(post, user) == (False, 1)
+    assert Like.toggle(post, user) == (True, 2)
+    assert Post.get_by_id(post.id).likes == Like.select().where(Like.post == post).count() == 2
+
+
+def test_reconcile_counts_repairs_drifted_counters(database):
+    post, (user, other) = make_post()
+    Like.toggle(post, user)
+    Like.toggle(post, other)
+    Post.update(likes=7).where(Post.id == post.id).execute()
+
+    assert Like.reconcile_counts() == 1
+    assert Post.get_by_id(post.id).likes == 2
+    assert Like.reconcile_counts() == 0
@@ -0,0 +1,86 @@
+import threading
+from datetime import date, datetime, timedelta
+
+from Backend.message_archive import archive_old_partitions, read_archive
+from Backend.model.database_model import db
+from Backend.model.message_model import Message, GroupMessage, GroupChatMember, MessageArchive
+from Backend.model.partitions import add_months, create_partition, month_start, partition_name
+from Backend.model.user_model import User
+from Backend.tests import factories
+
+
+def old_month():
+    return add_months(month_start(date.today()), -14)
+
+
+def archive(model, rows, tmp_path):
+    """Insert `rows` into an old month of `model`'s table and archive that month."""
+    month = old_month()
+    start = datetime(month.year, month.month, 2)
+    factories.insert_all(model, [dict(row, date=start + timedelta(minutes=i)) for i, row in enumerate(rows)])
+    create_partition(model, month)
+    assert [(table, count) for table, when, count in archive_old_partitions(directory=str(tmp_path))
+            if when == month] == [(model._meta.table_name, len(rows))]
+
+
+def test_history_reads_only_its_conversation_from_the_archive(client, auth, tmp_path):
+    me, friend, other = factories.make_users(3)
+    archive(Message, [{"sender": sender, "recipient": recipient, "text": f"{text} {i}"}
+                      for i in range(30)
+                      for sender, recipient, text in ((me, friend, "friend"), (other, me, "other"))], tmp_path)
+
+    entries = list(MessageArchive.select().order_by(MessageArchive.conversation))
+    assert [(entry.conversation, entry.row_count) for entry in entries] == [
+        (f"{me.id}:{friend.id}", 30), (f"{me.id}:{other.id}", 30)]
+    # Each conversation decompresses on its own from its byte range
+    for entry in entries:
+        rows = list(read_archive(Message, entry.path, entry.byte_offset, entry.byte_length))
+        assert len(rows) == 30 and {(row["sender"], row["recipient"]) for row in rows} <= {
+            (me.id, friend.id), (friend.id, me.id), (me.id, other.id), (other.id, me.id)}
+        assert len({tuple(sorted((row["sender"], row["recipient"]))) for row in rows}) == 1
+
+    response = client.get(f"/message/history/{friend.email}?limit=20", headers=auth(me))
+    assert response.status_code == 200, response.get_json()
+    assert [m["text"] for m in response.get_json()] == [f"friend {i}" for i in range(10, 30)]
+
+    oldest = response.get_json()[0]["id"]
+    response = client.get(f"/message/history/{friend.email}?limit=20&before={oldest}", headers=auth(me))
+    assert [m["text"] for m in response.get_json()] == [f"friend {i}" for i in range(10)]
+
+
+def test_archived_messages_of_a_deleted_sender_still_render(client, auth, tmp_path):
+    me, gone = factories.make_users(2)
+    group = factories.make_group(me, [me, gone])
+    archive(GroupMessage, [{"group": group, "sender": sender, "text": text}
+                           for sender, text in ((gone, "hello"), (me, "hi"))], tmp_path)
+    # Nothing in the database refers to them any more once their messages are archived
+    GroupChatMember.delete().where(GroupChatMember.user == gone).execute()
+    User.delete_by_id(gone.id)
+
+    response = client.get(f"/message/group-history/{group.id}", headers=auth(me))
+    assert response.status_code == 200, response.get_json()
+    assert [(m["from"], m["text"]) for m in response.get_json()] == [(None, "hello"), (me.email, "hi")]
+
+
+def test_concurrent_partition_creation_creates_it_once(database):
+    month = add_months(month_start(date.today()), -30)
+    barrier = threading.Barrier(4)
+    results, errors = [], []
+
+    def create():
+        try:
+            with db.connection_context():
+                barrier.wait()
+                results.append(create_partition(Message, month))
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=create) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(results) == [False, False, False, True]
+    assert db.table_exists(partition_name(Message, month))
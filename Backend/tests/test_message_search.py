@@ -0,0 +1,45 @@
+from Backend.tests import factories
+
+
+def search(client, headers, query):
+    response = client.get(f"/message/search?{query}", headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_non_members_get_no_hits_from_groups_or_communities(client, auth):
+    member, outsider = factories.make_users(2)
+    group = factories.make_group(member, [member])
+    community = factories.make_community(member, [member])
+    factories.make_group_messages(group, [member], 3, text="zebra")
+    factories.make_community_messages(community, [member], 3, text="zebra")
+
+    assert len(search(client, auth(member), "q=zebra")["results"]) == 6
+    for query in ("q=zebra", f"q=zebra&group_id={group.id}", f"q=zebra&community_id={community.id}"):
+        assert search(client, auth(outsider), query) == {"results": [], "next_cursor": None}
+
+
+def test_results_come_best_match_first_across_pages(client, auth):
+    me, friend = factories.make_users(2)
+    group = factories.make_group(me, [me, friend])
+    community = factories.make_community(me, [me, friend])
+    # More mentions of the term rank higher; the three tables reuse ids, so ties span kinds
+    for n in range(1, 4):
+        text = " ".join(["zebra"] * n)
+        factories.make_direct_messages([(me, friend)], 2, text=text)
+        factories.make_group_messages(group, [friend], 2, text=text)
+        factories.make_community_messages(community, [friend], 2, text=text)
+
+    results, cursor = [], None
+    while True:
+        page = search(client, auth(me), "q=zebra&limit=4" + (f"&before={cursor}" if cursor else ""))
+        assert len(page["results"]) <= 4
+        results += page["results"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(results) == 18
+    assert len({(r["kind"], r["id"]) for r in results}) == 18
+    assert [r["rank"] for r in results] == sorted((r["rank"] for r in results), reverse=True)
+    assert results[0]["text"].count("zebra") == 3 and results[-1]["text"].count("zebra") == 1
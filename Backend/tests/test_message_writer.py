@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from Backend.message_writer import MessageWriter
+from Backend.model.message_model import Message, UnreadCounter
+from Backend.tests import factories
+
+# A worker that journals three messages, waits for a line on stdin, then dies
+# without flushing, as if the process were killed
+CRASHING_WORKER = """
+import os, sys
+from Backend.model.database_model import db
+from Backend.model.message_model import Message
+from Backend.message_writer import MessageWriter
+
+writer = MessageWriter(mode="journaled", journal_path=sys.argv[1])
+with db.connection_context():
+    for i in range(3):
+        writer.write(Message, sender=int(sys.argv[2]), recipient=int(sys.argv[3]), text=f"unflushed {i}")
+print("written", flush=True)
+sys.stdin.readline()
+os._exit(1)
+"""
+
+
+def test_recover_replays_only_journals_of_dead_workers(database, tmp_path):
+    alice, bob = factories.make_users(2)
+    journal_path = str(tmp_path / "chat-journal.jsonl")
+    worker = subprocess.Popen([sys.executable, "-c", CRASHING_WORKER, journal_path, str(alice.id), str(bob.id)],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    assert worker.stdout.readline() == "written\n"
+    [journal] = os.listdir(tmp_path)
+    assert journal.endswith(f".{worker.pid}")
+
+    # A starting worker leaves a running one's journal alone
+    assert MessageWriter(mode="journaled", journal_path=journal_path).recover() == 0
+    assert os.listdir(tmp_path) == [journal]
+    assert Message.select().count() == 0
+
+    worker.communicate("crash\n", timeout=10)
+    assert worker.returncode == 1
+    # The crash tore the line being written
+    with open(tmp_path / journal, "a", encoding="utf-8") as torn:
+        torn.write('{"table": "message", "ro')
+
+    assert MessageWriter(mode="journaled", journal_path=journal_path).recover() == 3
+    assert [m.text for m in Message.select().order_by(Message.id)] == ["unflushed 0", "unflushed 1", "unflushed 2"]
+    assert UnreadCounter.get(UnreadCounter.user == bob).count == 3
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_flush_does_not_stop_the_flusher(tmp_path, monkeypatch):
+    writer = MessageWriter(mode="batched", interval=0, journal_path=str(tmp_path / "chat-journal.jsonl"))
+    flushes = []
+
+    def flush():
+        flushes.append(1)
+        if len(flushes) == 1:
+            raise OSError("disk full")
+
+    def sleep(seconds):
+        if len(flushes) == 3:
+            raise StopIteration
+
+    monkeypatch.setattr(writer, "flush", flush)
+    with pytest.raises(StopIteration):
+        writer.run(sleep)
+    assert len(flushes) == 3
+
+
+def test_the_flusher_waits_with_the_given_sleep_and_wakes_when_the_buffer_fills(tmp_path, monkeypatch):
+    writer = MessageWriter(mode="batched", interval=60, journal_path=str(tmp_path / "chat-journal.jsonl"))
+    flushes, sleeps = [], []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if flushes:
+            raise StopIteration
+        if len(sleeps) == 3:
+            # What write() does when the buffer reaches batch_size
+            writer._wakeup.set()
+
+    def wait(timeout=None):
+        raise AssertionError("the flusher must not block on a threading primitive")
+
+    monkeypatch.setattr(writer, "flush", lambda: flushes.append(1))
+    monkeypatch.setattr(writer._wakeup, "wait", wait)
+    with pytest.raises(StopIteration):
+        writer.run(sleep)
+    # Woken on the third check, long before the 60s interval
+    assert flushes == [1] and len(sleeps) == 4 and max(sleeps) <= 0.005
@@ -0,0 +1,35 @@
+import pytest
+
+from Backend.api.feed import feed_page_query, serialize_posts
+from Backend.model.community_model import Category, CommunityCategory
+from Backend.model.image_model import Image
+from Backend.model.post_model import Post
+from Backend.tests import factories
+
+
+def make_page(n):
+    users = factories.make_users(3)
+    for user in users:
+        user.profile_picture = Image.create(filename=f"{user.username}.png")
+        user.save()
+    category = Category.create(topic="topic", subtopic="subtopic")
+    communities = [factories.make_community(users[i], users, f"community {i}") for i in range(3)]
+    for community in communities:
+        CommunityCategory.create(community=community, category=category)
+    posts = factories.make_posts(communities, users, n, comments_per_post=4)
+    factories.like_posts(users[0], posts[::2])
+    return users[0], list(feed_page_query().order_by(Post.created_at.desc()))
+
+
+@pytest.mark.parametrize("n", [1, 20])
+def test_serialize_posts_runs_a_fixed_number_of_queries(n, database, queries):
+    reader, posts = make_page(n)
+    with queries() as statements:
+        serialized = serialize_posts(posts, reader.id)
+    # Communities, their categories, the reader's likes, comment previews: one query each
+    assert len(statements) == 4
+
+    assert len(serialized) == n
+    assert all(len(post["comments"]) == 3 for post in serialized)
+    assert serialized[-1]["liked_by_user"] and serialized[-1]["author"]["photo_url"].endswith(".png")
+    assert serialized[-1]["community"]["name"] == "community 0"
@@ -0,0 +1,13 @@
+from Backend.tests import factories
+
+
+def test_community_presence_is_for_members_only(client, auth):
+    member, outsider = factories.make_users(2)
+    community = factories.make_community(member, [member])
+
+    response = client.get(f"/presence/community/{community.id}", headers=auth(member))
+    assert response.status_code == 200
+    assert response.get_json() == {"online": [], "count": 0}
+
+    response = client.get(f"/presence/community/{community.id}", headers=auth(outsider))
+    assert response.status_code == 404
@@ -0,0 +1,109 @@
+import re
+
+import pytest
+
+from Backend.model.database_model import db
+from Backend.tests import factories
+
+# Tables that grow with usage; reading any of them with a full scan is a regression.
+# Chat partitions count as their parent table.
+LARGE_TABLES = {"message", "community_messages", "groupmessage", "post", "comment", "like", "timeline_entry"}
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+PARTITION = re.compile(r"_(p\d{4}_\d{2}|default)$")
+
+
+def full_scans(sql, params):
+    plan = [row[0] for row in db.execute_sql("EXPLAIN " + sql, params).fetchall()]
+    scanned = []
+    for line in plan:
+        match = SEQ_SCAN.search(line)
+        if not match or PARTITION.sub("", match.group(1)) not in LARGE_TABLES:
+            continue
+        # Scanning an empty partition (next months', the default one) costs nothing
+        if db.execute_sql(f'SELECT EXISTS (SELECT 1 FROM "{match.group(1)}")').fetchone()[0]:
+            scanned.append(match.group(1))
+    return scanned, plan
+
+
+@pytest.fixture(scope="module")
+def seeded(app):
+    # Seeded once for every endpoint below; the tests only read
+    with db.connection_context():
+        factories.reset_database()
+        yield seed()
+
+
+def seed():
+    users = factories.make_users(60)
+    me, friend = users[0], users[1]
+    communities = [factories.make_community(users[i], users[i * 10:i * 10 + 20], f"community {i}") for i in range(5)]
+    group = factories.make_group(me, users[:8])
+
+    posts = factories.make_posts(communities, users, 3000, comments_per_post=3)
+    factories.like_posts(me, posts[::3])
+    factories.make_direct_messages([(users[i], users[j]) for i in range(20) for j in range(i + 1, 20)], 40)
+    factories.make_community_messages(communities[0], users[:20], 6000)
+    factories.make_group_messages(group, users[:8], 6000)
+    # One rare word to search for
+    factories.make_posts(communities[:1], [me], 1, text="zebra")
+    factories.make_direct_messages([(me, friend)], 1, text="zebra")
+    # As autovacuum would have by now; also flushes the GIN indexes' pending lists
+    db.execute_sql("VACUUM ANALYZE")
+    return {"me": me, "friend": friend, "community": communities[0], "group": group, "post": posts[-1]}
+
+
+# Each endpoint's URL for the seeded data, requested as the seeded "me"
+ENDPOINTS = {
+    "post feed": lambda seeded: "/post",
+    "hot feed": lambda seeded: "/post?sort=hot",
+    "home timeline": lambda seeded: "/post/timeline",
+    "post search": lambda seeded: "/post/search?q=zebra",
+    "post comments": lambda seeded: f"/post/{seeded['post']['id']}/comments",
+    "direct history": lambda seeded: f"/message/history/{seeded['friend'].email}",
+    "community chat": lambda seeded: f"/message/community/{seeded['community'].id}/messages",
+    "group chat": lambda seeded: f"/message/group-history/{seeded['group'].id}",
+    "message search": lambda seeded: "/message/search?q=zebra",
+    "conversations": lambda seeded: "/message/conversations",
+}
+
+
+@pytest.mark.parametrize("name", ENDPOINTS)
+def test_endpoint_reads_use_indexes(name, seeded, app, auth, queries):
+    """EXPLAIN every query the endpoint actually ran, against a seeded and analyzed database."""
+    with queries() as statements:
+        response = app.test_client().get(ENDPOINTS[name](seeded), headers=auth(seeded["me"]))
+    assert response.status_code == 200, response.get_json()
+
+    reads = [(sql, params) for sql, params in statements if sql.lstrip().upper().startswith(("SELECT", "WITH"))]
+    assert reads
+    for sql, params in reads:
+        scanned, plan = full_scans(sql, params)
+        assert not scanned, f"{name} scans {', '.join(scanned)}:\n{sql}\n" + "\n".join(plan)
+
+
+def rows_read(sql, params, tables):
+    """Rows the executed plan read from `tables` (partitions included), over all loops."""
+    plan = db.execute_sql("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params).fetchone()[0][0]["Plan"]
+    total, nodes = 0, [plan]
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get("Plans", []))
+        if PARTITION.sub("", node.get("Relation Name", "")) in tables:
+            total += node["Actual Rows"] * node["Actual Loops"]
+    return total
+
+
+def test_direct_conversations_probe_each_partner_instead_of_reading_the_inbox(seeded, app, auth, queries):
+    with queries() as statements:
+        response = app.test_client().get("/message/conversations", headers=auth(seeded["me"]))
+    assert response.status_code == 200, response.get_json()
+    partners = sum(not c["is_group"] for c in response.get_json())
+    assert partners == 19
+
+    direct = [(sql, params) for sql, params in statements if 'FROM "message"' in sql]
+    assert len(direct) == 2
+    for sql, params in direct:
+        scanned, plan = full_scans(sql, params)
+        assert not scanned, "\n".join(plan)
+        # The caller has 761 direct messages; each partner should cost a few index probes
+        assert rows_read(sql, params, {"message"}) <= 5 * partners
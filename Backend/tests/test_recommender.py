@@ -0,0 +1,39 @@
+from Backend.model.user_model import (User, Interest, UserInterest, Neurotype, UserNeurotype, FriendSuggestion,
+                                      SuggestionState)
+from Backend.recommender import refresh_suggestions
+from Backend.tests import factories
+
+
+def suggested(user):
+    return [s.suggested_user_id for s in FriendSuggestion.select().where(FriendSuggestion.user == user)
+            .order_by(FriendSuggestion.score.desc(), FriendSuggestion.suggested_user)]
+
+
+def test_incremental_refresh_recomputes_only_users_whose_features_changed(database):
+    a, b, c = factories.make_users(3)
+    coding, music = Interest.create(name="coding"), Interest.create(name="music")
+    adhd = Neurotype.create(name="ADHD")
+    UserInterest.insert_many([(a, coding), (b, coding), (c, music)],
+                             fields=[UserInterest.user, UserInterest.interest]).execute()
+    UserNeurotype.insert_many([(a, adhd), (c, adhd)], fields=[UserNeurotype.user, UserNeurotype.neurotype]).execute()
+
+    assert refresh_suggestions() == 3
+    assert suggested(a) == [b.id, c.id]
+    assert refresh_suggestions() == 0
+
+    # b is the first to pick a new interest, which shifts every later feature column;
+    # nobody else's features changed, so nobody else is recomputed
+    UserInterest.create(user=b, interest=Interest.create(name="chess"))
+    assert refresh_suggestions() == 1
+
+
+def test_deleting_a_user_deletes_suggestions_to_and_from_them(client, auth):
+    user, other = factories.make_users(2)
+    FriendSuggestion.insert_many([{"user": user, "suggested_user": other, "score": 1},
+                                  {"user": other, "suggested_user": user, "score": 1}]).execute()
+    SuggestionState.create(user=user, fingerprint="x")
+
+    response = client.delete("/user/delete-user", headers=auth(user))
+    assert response.status_code == 200, response.get_json()
+    assert not User.select().where(User.id == user.id).exists()
+    assert not FriendSuggestion.select().exists() and not SuggestionState.select().exists()
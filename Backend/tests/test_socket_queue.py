@@ -0,0 +1,78 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from Backend.socket_session import direct_room
+from Backend.tests import factories
+
+socketio = pytest.importorskip("socketio")
+pytest.importorskip("websocket", reason="the Socket.IO websocket client needs websocket-client")
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@contextmanager
+def server_process(port):
+    """`python -m Backend.server` on the test database, sharing rooms through Postgres."""
+    env = dict(os.environ, SERVER_HOST="127.0.0.1", SERVER_PORT=str(port), SOCKETIO_ASYNC_MODE="eventlet",
+               SOCKETIO_MESSAGE_QUEUE="postgres", CHAT_PERSISTENCE="sync")
+    process = subprocess.Popen([sys.executable, "-m", "Backend.server"], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if process.poll() is not None:
+                pytest.fail("server exited:\n" + process.stderr.read().decode())
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    pytest.fail("server did not start listening")
+                time.sleep(0.2)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def chat_client(url, token, on_message=None):
+    client = socketio.Client(reconnection=False)
+    if on_message is not None:
+        client.on("receive_message", on_message)
+    client.connect(url, auth={"token": token}, transports=["websocket"], wait_timeout=10)
+    return client
+
+
+def test_emit_reaches_client_on_another_process(database, auth):
+    alice, bob = factories.make_users(2)
+    room = direct_room(alice.email, bob.email)
+    token = lambda user: auth(user)["Authorization"].split()[1]
+
+    with server_process(free_port()) as first, server_process(free_port()) as second:
+        received = []
+        arrived = threading.Event()
+        sender = chat_client(first, token(alice))
+        receiver = chat_client(second, token(bob), lambda data: received.append(data) or arrived.set())
+        try:
+            # call() waits for each join to be handled before the message is sent
+            sender.call("join_room", {"room": room, "kind": "direct"}, timeout=10)
+            receiver.call("join_room", {"room": room, "kind": "direct"}, timeout=10)
+            sender.emit("send_message", {"room": room, "text": "across processes"})
+            assert arrived.wait(10), "message never reached the other process's client"
+        finally:
+            sender.disconnect()
+            receiver.disconnect()
+
+    assert [message["text"] for message in received] == ["across processes"]
+    assert received[0]["from"] == alice.email
@@ -0,0 +1,52 @@
+from Backend.message_writer import MessageWriter
+from Backend.model.message_model import GroupChatMember, GroupMessage, ReadWatermark, UnreadCounter, UnreadTotal
+from Backend.model.user_model import User
+from Backend.tests import factories
+
+
+def unread(user, group):
+    return (UnreadCounter.select(UnreadCounter.count)
+            .where((UnreadCounter.user == user) & (UnreadCounter.conversation_id == group.id)).scalar())
+
+
+def test_group_messages_from_before_joining_never_count_as_unread(database):
+    sender, member, newcomer = factories.make_users(3)
+    group = factories.make_group(sender, [sender, member])
+    factories.make_group_messages(group, [sender], 5)
+    UnreadCounter.rebuild()
+
+    GroupChatMember.join(group, newcomer)
+    writer = MessageWriter(mode="sync")
+    for i in range(2):
+        writer.write(GroupMessage, group=group.id, sender=sender.id, text=f"after {i}")
+    assert (unread(member, group), unread(newcomer, group)) == (7, 2)
+
+    UnreadCounter.rebuild()
+    assert (unread(member, group), unread(newcomer, group)) == (7, 2)
+    assert UnreadTotal.get_by_id(newcomer.id).count == 2
+
+
+def test_deleting_a_user_deletes_their_read_state(client, auth):
+    user, friend = factories.make_users(2)
+    ReadWatermark.advance(user, ReadWatermark.DIRECT, friend.id, 1)
+    UnreadCounter.insert(user=user, kind=ReadWatermark.DIRECT, conversation_id=friend.id, count=3).execute()
+    UnreadTotal.insert(user=user, count=3).execute()
+
+    response = client.delete("/user/delete-user", headers=auth(user))
+    assert response.status_code == 200, response.get_json()
+    assert not User.select().where(User.id == user.id).exists()
+    for model in (ReadWatermark, UnreadCounter, UnreadTotal):
+        assert not model.select().exists()
+
+
+def test_non_members_can_neither_read_a_group_nor_mark_it_read(client, auth):
+    member, outsider = factories.make_users(2)
+    group = factories.make_group(member, [member])
+    factories.make_group_messages(group, [member], 3)
+
+    response = client.get(f"/message/group-history/{group.id}", headers=auth(outsider))
+    assert response.status_code == 403
+    assert not ReadWatermark.select().where(ReadWatermark.user == outsider).exists()
+
+    response = client.get(f"/message/group-history/{group.id}", headers=auth(member))
+    assert response.status_code == 200 and len(response.get_json()) == 3
@@ -0,0 +1,46 @@
+import pytest
+
+from Backend.model.image_model import Image
+from Backend.model.user_model import User, Interest, UserInterest, Neurotype, UserNeurotype, UserPhoto
+from Backend.tests import factories
+
+
+def make_profiles(n):
+    users = factories.make_users(n)
+    interests = [Interest.create(name=f"interest {i}") for i in range(2)]
+    neurotypes = [Neurotype.create(name=f"neurotype {i}") for i in range(2)]
+    for user in users:
+        user.profile_picture = Image.create(filename=f"{user.username}.png")
+        user.save()
+        for interest in interests:
+            UserInterest.create(user=user, interest=interest)
+        for neurotype in neurotypes:
+            UserNeurotype.create(user=user, neurotype=neurotype)
+        for i in range(2):
+            UserPhoto.create(user=user, photo_url=f"https://photos/{user.id}/{i}")
+    return list(User.select().where(User.id.in_([user.id for user in users])).order_by(User.id))
+
+
+@pytest.mark.parametrize("n", [1, 25])
+def test_to_dicts_runs_a_fixed_number_of_queries(n, database, queries):
+    users = make_profiles(n)
+    with queries() as statements:
+        dicts = User.to_dicts(users)
+    # Profile pictures, neurotypes, interests, photos: one query each, whatever the list length
+    assert len(statements) == 4
+
+    first = dicts[0]
+    assert first["profile_picture_url"].endswith(f"{users[0].username}.png")
+    assert first["interests"] == ["interest 0", "interest 1"]
+    assert first["neurotypes"] == ["neurotype 0", "neurotype 1"]
+    assert first["photos"] == [f"https://photos/{users[0].id}/0", f"https://photos/{users[0].id}/1"]
+    assert dicts == [user.to_dict() for user in users]
+
+
+@pytest.mark.parametrize("n", [1, 25])
+def test_cards_run_one_query(n, database, queries):
+    users = make_profiles(n)
+    with queries() as statements:
+        cards = User.cards(users)
+    assert len(statements) == 1
+    assert [card["id"] for card in cards] == [user.id for user in users]
@@ -61,7 +61,7 @@ const tabs = ['My Feed', 'Add Friends', 'My Friends'] as const;
 type Tab = (typeof tabs)[number];
 
 // Interfaces
-type Comment = { user: string; content: string; created_at: string };
+type Comment = { id: number; user: string; content: string; created_at: string };
 interface Post {
   id: string;
   author: { username: string; photo_url?: string };
@@ -70,6 +70,7 @@ interface Post {
   content: string;
   created_at: string;
   likes: number;
+  comment_count: number;
   comments: Comment[];
   liked_by_user: boolean;
 }
@@ -87,6 +88,8 @@ export default function FeedScreen() {
   // Posts
   const [posts, setPosts] = useState<Post[]>([]);
   const [loading, setLoading] = useState(true);
+  const [postsCursor, setPostsCursor] = useState<string | null>(null);
+  const [loadingMorePosts, setLoadingMorePosts] = useState(false);
 
   // Search + Category filter
   const [search, setSearch] = useState('');
@@ -106,6 +109,9 @@ export default function FeedScreen() {
   const [commentModalOpen, setCommentModalOpen] = useState(false);
   const [selectedPostId, setSelectedPostId] = useState<string | null>(null);
   const [newComment, setNewComment] = useState('');
+  const [threadComments, setThreadComments] = useState<Comment[]>([]);
+  const [commentsCursor, setCommentsCursor] = useState<string | null>(null);
+  const [loadingComments, setLoadingComments] = useState(false);
 
   // Friends
   const [friendsList, setFriendsList] = useState<User[]>([]);
@@ -120,32 +126,28 @@ export default function FeedScreen() {
   const router = useRouter();
   const { isDarkColorScheme } = useColorScheme();
 
-  // Load posts
+  // Normalize a post from the API
+  const toPost = (post: Post): Post => ({
+    ...post,
+    id: post.id.toString(),
+    community: {
+      id: Number(post.community.id),
+      name: post.community.name,
+      categories: post.community.categories,
+    },
+    author: {
+      username: post.author.username,
+      photo_url: post.author.photo_url,
+    },
+  });
+
+  // Load posts (first page)
   const loadPosts = async () => {
     setLoading(true);
     try {
-      const fetchedPosts = await PostService.getPosts();
-      // Make sure all post IDs are string type
-      const postsWithStringId = fetchedPosts.map((post) => ({
-        ...post,
-        id: post.id.toString(),
-        community: {
-          id: Number(post.community.id),
-          name: post.community.name,
-          categories: post.community.categories,
-        },
-        author: {
-          username: post.author.username,
-          photo_url: post.author.photo_url,
-        },
-        topic: post.topic,
-        content: post.content,
-        created_at: post.created_at,
-        likes: post.likes,
-        liked_by_user: post.liked_by_user,
-        comments: post.comments,
-      }));
-      setPosts(postsWithStringId);
+      const page = await PostService.getPostPage();
+      setPosts(page.posts.map(toPost));
+      setPostsCursor(page.next_cursor);
     } catch (error) {
       console.error('Failed to load posts:', error);
     } finally {
@@ -153,6 +155,24 @@ export default function FeedScreen() {
     }
   };
 
+  // Load the next page of older posts
+  const loadMorePosts = async () => {
+    if (!postsCursor || loadingMorePosts) return;
+    setLoadingMorePosts(true);
+    try {
+      const page = await PostService.getPostPage(postsCursor);
+      setPosts((ps) => [
+        ...ps,
+        ...page.posts.map(toPost).filter((p) => !ps.some((existing) => existing.id === p.id)),
+      ]);
+      setPostsCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Failed to load more posts:', error);
+    } finally {
+      setLoadingMorePosts(false);
+    }
+  };
+
   // add categories
   const allCategories = React.useMemo(() => {
     const s = new Set<number>();
@@ -285,13 +305,40 @@ export default function FeedScreen() {
     }
   };
 
+  // Load a post's comment thread; pages come newest first, the thread is shown oldest first
+  const loadComments = async (postId: string, before?: string) => {
+    setLoadingComments(true);
+    try {
+      const page = await PostService.getComments(postId, before);
+      const older = [...page.comments].reverse();
+      setThreadComments((cs) => (before ? [...older, ...cs] : older));
+      setCommentsCursor(page.next_cursor);
+      setPosts((ps) =>
+        ps.map((p) => (p.id === postId ? { ...p, comment_count: page.comment_count } : p))
+      );
+    } catch (err) {
+      console.error('Failed to load comments', err);
+    } finally {
+      setLoadingComments(false);
+    }
+  };
+
+  const openComments = (postId: string) => {
+    setSelectedPostId(postId);
+    setThreadComments([]);
+    setCommentsCursor(null);
+    setCommentModalOpen(true);
+    loadComments(postId);
+  };
+
   // Comment
   const handleComment = async () => {
     if (!selectedPostId || !newComment.trim()) return;
     try {
       await PostService.commentOnPost(selectedPostId, newComment.trim());
-      console.log(posts.find((p) => p.id === selectedPostId)?.comments);
-      await loadPosts(); // Wait for posts to reload
+      setPosts((ps) =>
+        ps.map((p) => (p.id === selectedPostId ? { ...p, comment_count: p.comment_count + 1 } : p))
+      );
       setNewComment('');
       setCommentModalOpen(false); // Close AFTER reload
     } catch (err) {
@@ -356,13 +403,10 @@ export default function FeedScreen() {
           <Text className="ml-2">{item.likes}</Text>
         </TouchableOpacity>
         <TouchableOpacity
-          onPress={() => {
-            setSelectedPostId(item.id);
-            setCommentModalOpen(true);
-          }}
+          onPress={() => openComments(item.id)}
           className="flex-row items-center">
           <MessageCircle color={isDarkColorScheme ? 'white' : 'black'} />
-          <Text className="ml-2">{item.comments.length}</Text>
+          <Text className="ml-2">{item.comment_count}</Text>
         </TouchableOpacity>
       </CardFooter>
     </Card>
@@ -518,6 +562,9 @@ export default function FeedScreen() {
             renderItem={renderPost}
             keyExtractor={(p) => p.id}
             contentContainerStyle={{ padding: 16 }}
+            onEndReached={loadMorePosts}
+            onEndReachedThreshold={0.5}
+            ListFooterComponent={loadingMorePosts ? <Text>Loading...</Text> : null}
           />
         ))}
 
@@ -649,7 +696,21 @@ export default function FeedScreen() {
 
             <View style={{ flex: 1 }}>
               <FlatList
-                data={posts.find((p) => p.id === selectedPostId)?.comments ?? []}
+                data={threadComments}
+                ListHeaderComponent={
+                  commentsCursor && selectedPostId ? (
+                    <Button
+                      variant="ghost"
+                      size="sm"
+                      disabled={loadingComments}
+                      onPress={() => loadComments(selectedPostId, commentsCursor)}>
+                      <Text>Load earlier comments</Text>
+                    </Button>
+                  ) : null
+                }
+                ListEmptyComponent={
+                  loadingComments ? <Text>Loading...</Text> : <Text>No comments yet.</Text>
+                }
                 renderItem={({ item }) => (
                   <View className="mb-3">
                     <Text className="font-semibold">{item.user}</Text>
@@ -659,7 +720,7 @@ export default function FeedScreen() {
                     </Text>
                   </View>
                 )}
-                keyExtractor={(c) => c.created_at}
+                keyExtractor={(c) => c.id.toString()}
                 nestedScrollEnabled
                 style={{ flex: 1 }}
                 contentContainerStyle={{ flexGrow: 1, paddingBottom: 8 }}
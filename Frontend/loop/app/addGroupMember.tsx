@@ -6,6 +6,7 @@ import { Checkbox } from '~/components/ui/checkbox';
 import { Button } from '~/components/ui/button';
 import { SearchBar } from '~/components/ui/searchbar';
 import * as SecureStore from 'expo-secure-store';
+import { FriendService } from '~/services/FriendService';
 import {ArrowLeft } from 'lucide-react-native';
 import { useColorScheme } from "~/lib/useColorScheme";
 interface Friend {
@@ -34,10 +35,7 @@ export default function AddGroupMember() {
                 const membersData = await membersRes.json();
                 setMembers(membersData.members.map(m => m.email));
 
-                const friendsRes = await fetch(`${process.env.EXPO_PUBLIC_API_URL}/friends/list`, {
-                    headers: { Authorization: `Bearer ${token}` }
-                });
-                const friendsData = await friendsRes.json();
+                const friendsData = await FriendService.getMyFriends();
                 setFriends(friendsData);
             } catch (err) {
                 console.error("Failed to fetch friends or members:", err);
@@ -20,6 +20,7 @@ import { UserService } from '~/services/UserService';
 import * as SecureStore from 'expo-secure-store';
 import { Avatar, AvatarFallback, AvatarImage } from "~/components/ui/avatar";
 import { Button } from '~/components/ui/button';
+import { fetchHistoryPage, HISTORY_PAGE_SIZE } from '~/lib/chatHistory';
 import { useColorScheme } from "~/lib/useColorScheme";
 
 // Types
@@ -37,6 +38,9 @@ export default function Chat() {
 
     const [message, setMessage] = useState('');
     const [messages, setMessages] = useState<Message[]>([]);
+    const [hasEarlier, setHasEarlier] = useState(false);
+    const [loadingEarlier, setLoadingEarlier] = useState(false);
+    const keepScrollRef = useRef(false);
     const [sender, setSender] = useState<string>('');
     const [recipientUsername, setRecipientUsername] = useState<string>('');
     const [recipientPfp, setRecipientPfp] = useState<string>('');
@@ -45,18 +49,9 @@ export default function Chat() {
     useEffect(() => {
         const fetchHistory = async () => {
             try {
-                const token = await SecureStore.getItemAsync("access_token");
-                const res = await fetch(`${process.env.EXPO_PUBLIC_API_URL}/message/history/${user}`, {
-                    headers: {
-                        Authorization: `Bearer ${token}`,
-                    },
-                });
-                const data = await res.json();
-                if (!Array.isArray(data)) {
-                    console.error("Expected array, got:", data);
-                    return;
-                }
+                const data = await fetchHistoryPage<Message>(`/message/history/${user}`);
                 setMessages(data);
+                setHasEarlier(data.length >= HISTORY_PAGE_SIZE);
                 flatListRef.current?.scrollToEnd({ animated: true });
             } catch (err) {
                 console.error("Failed to load message history", err);
@@ -74,7 +69,7 @@ export default function Chat() {
                 await fetchHistory();
                 socket.connect();
                 const room = getRoomId(userProfile.email, user as string);
-                socket.emit('join_room', { room });
+                socket.emit('join_room', { room, kind: 'direct' });
 
                 const token = await SecureStore.getItemAsync("access_token");
                 const res = await fetch(`${process.env.EXPO_PUBLIC_API_URL}/user/email/${user}`, {
@@ -105,6 +100,21 @@ export default function Chat() {
         };
     }, []);
 
+    const loadEarlier = async () => {
+        if (loadingEarlier || messages.length === 0) return;
+        setLoadingEarlier(true);
+        try {
+            const older = await fetchHistoryPage<Message>(`/message/history/${user}`, messages[0].id);
+            keepScrollRef.current = true;
+            setMessages(prev => [...older, ...prev]);
+            setHasEarlier(older.length >= HISTORY_PAGE_SIZE);
+        } catch (err) {
+            console.error("Failed to load earlier messages", err);
+        } finally {
+            setLoadingEarlier(false);
+        }
+    };
+
     const getRoomId = (user1: string, user2: string) => [user1.toLowerCase(), user2.toLowerCase()].sort().join('_');
 
     const handleSend = () => {
@@ -165,7 +175,19 @@ export default function Chat() {
                                     </View>
                                 )}
                                 contentContainerStyle={{ paddingBottom: 16 }}
-                                onContentSizeChange={() => flatListRef.current?.scrollToEnd({ animated: true })}
+                                ListHeaderComponent={hasEarlier ? (
+                                    <TouchableOpacity onPress={loadEarlier} disabled={loadingEarlier} style={{ alignItems: 'center', paddingVertical: 8 }}>
+                                        <Text className="text-muted-foreground">{loadingEarlier ? 'Loading...' : 'Load earlier messages'}</Text>
+                                    </TouchableOpacity>
+                                ) : null}
+                                onContentSizeChange={() => {
+                                    // Stay put when older messages were added above
+                                    if (keepScrollRef.current) {
+                                        keepScrollRef.current = false;
+                                        return;
+                                    }
+                                    flatListRef.current?.scrollToEnd({ animated: true });
+                                }}
                                 onLayout={() => flatListRef.current?.scrollToEnd({ animated: true })}
                             />
 
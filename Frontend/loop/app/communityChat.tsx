@@ -17,8 +17,8 @@ import { useSafeAreaInsets } from 'react-native-safe-area-context';
 import { socket } from '~/lib/socket';
 import { Community, CommunityService } from '~/services/CommunityService';
 import { UserService } from '~/services/UserService';
-import * as SecureStore from 'expo-secure-store';
 import { Button } from '~/components/ui/button';
+import { fetchHistoryPage, HISTORY_PAGE_SIZE } from '~/lib/chatHistory';
 import { useColorScheme } from '~/lib/useColorScheme';
 import { Avatar, AvatarFallback, AvatarImage } from "~/components/ui/avatar";
 
@@ -39,6 +39,9 @@ const CommunityMessages: React.FC = () => {
     const [community, setCommunity] = useState<Community>();
     const [message, setMessage] = useState('');
     const [messages, setMessages] = useState<Message[]>([]);
+    const [hasEarlier, setHasEarlier] = useState(false);
+    const [loadingEarlier, setLoadingEarlier] = useState(false);
+    const keepScrollRef = useRef(false);
     const [sender, setSender] = useState<string>('');
     const { isDarkColorScheme } = useColorScheme();
     const flatListRef = useRef<FlatList>(null);
@@ -59,13 +62,9 @@ const CommunityMessages: React.FC = () => {
     useEffect(() => {
         const fetchHistory = async () => {
             try {
-                const token = await SecureStore.getItemAsync("access_token");
-                const res = await fetch(`${process.env.EXPO_PUBLIC_API_URL}/message/community/${community_id}/messages`, {
-                    headers: { Authorization: `Bearer ${token}` },
-                });
-                const data = await res.json();
-                if (!Array.isArray(data)) return;
+                const data = await fetchHistoryPage<Message>(`/message/community/${community_id}/messages`);
                 setMessages(data);
+                setHasEarlier(data.length >= HISTORY_PAGE_SIZE);
             } catch (error) {
                 console.error("Failed to fetch messages:", error);
             }
@@ -79,7 +78,7 @@ const CommunityMessages: React.FC = () => {
                 const user = await UserService.getCurrentUser();
                 setSender(user.email);
                 socket.connect();
-                socket.emit('join_room', { room: community_id });
+                socket.emit('join_room', { room: community_id, kind: 'community' });
             } catch (error) {
                 console.error("Init error:", error);
             }
@@ -96,6 +95,21 @@ const CommunityMessages: React.FC = () => {
         return () => socket.off('receive_message');
     }, []);
 
+    const loadEarlier = async () => {
+        if (loadingEarlier || messages.length === 0) return;
+        setLoadingEarlier(true);
+        try {
+            const older = await fetchHistoryPage<Message>(`/message/community/${community_id}/messages`, messages[0].id);
+            keepScrollRef.current = true;
+            setMessages(prev => [...older, ...prev]);
+            setHasEarlier(older.length >= HISTORY_PAGE_SIZE);
+        } catch (err) {
+            console.error("Failed to load earlier messages", err);
+        } finally {
+            setLoadingEarlier(false);
+        }
+    };
+
     const handleSend = () => {
         if (!message.trim() || !sender) return;
         const msg: Message = { id: Date.now().toString(), from: sender, text: message.trim() };
@@ -194,7 +208,19 @@ const CommunityMessages: React.FC = () => {
                             keyExtractor={item => item.id}
                             renderItem={renderItem}
                             contentContainerStyle={{ paddingBottom: 12 }}
-                            onContentSizeChange={() => flatListRef.current?.scrollToEnd({ animated: true })}
+                            ListHeaderComponent={hasEarlier ? (
+                                <TouchableOpacity onPress={loadEarlier} disabled={loadingEarlier} style={{ alignItems: 'center', paddingVertical: 8 }}>
+                                    <Text className="text-muted-foreground">{loadingEarlier ? 'Loading...' : 'Load earlier messages'}</Text>
+                                </TouchableOpacity>
+                            ) : null}
+                            onContentSizeChange={() => {
+                                // Stay put when older messages were added above
+                                if (keepScrollRef.current) {
+                                    keepScrollRef.current = false;
+                                    return;
+                                }
+                                flatListRef.current?.scrollToEnd({ animated: true });
+                            }}
                             onLayout={() => flatListRef.current?.scrollToEnd({ animated: true })}
                         />
 
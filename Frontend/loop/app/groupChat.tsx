@@ -16,10 +16,10 @@ import { useSafeAreaInsets } from 'react-native-safe-area-context';
 import { Avatar, AvatarImage, AvatarFallback } from '~/components/ui/avatar';
 import { Button } from '~/components/ui/button';
 import { socket } from '~/lib/socket';
-import * as SecureStore from 'expo-secure-store';
 import { UserService } from '~/services/UserService';
 import { InfoIcon, ArrowLeft } from 'lucide-react-native';
 import { useRouter, Stack } from 'expo-router';
+import { fetchHistoryPage, HISTORY_PAGE_SIZE } from '~/lib/chatHistory';
 import { useColorScheme } from "~/lib/useColorScheme";
 
 
@@ -36,6 +36,9 @@ export default function GroupChat() {
     const { group_id, group_name } = useLocalSearchParams();
     const insets = useSafeAreaInsets();
     const [messages, setMessages] = useState<GroupMessage[]>([]);
+    const [hasEarlier, setHasEarlier] = useState(false);
+    const [loadingEarlier, setLoadingEarlier] = useState(false);
+    const keepScrollRef = useRef(false);
     const [message, setMessage] = useState('');
     const [senderEmail, setSenderEmail] = useState('');
     const flatListRef = useRef<FlatList>(null);
@@ -47,14 +50,11 @@ export default function GroupChat() {
             const user = await UserService.getCurrentUser();
             setSenderEmail(user.email);
 
-            const token = await SecureStore.getItemAsync('access_token');
-            const res = await fetch(`${process.env.EXPO_PUBLIC_API_URL}/message/group-history/${group_id}`, {
-                headers: { Authorization: `Bearer ${token}` },
-            });
-            const data = await res.json();
+            const data = await fetchHistoryPage<GroupMessage>(`/message/group-history/${group_id}`);
             setMessages(data);
+            setHasEarlier(data.length >= HISTORY_PAGE_SIZE);
             socket.connect();
-            socket.emit('join_room', { room: group_id });
+            socket.emit('join_room', { room: group_id, kind: 'group' });
         };
 
         init();
@@ -69,6 +69,21 @@ export default function GroupChat() {
         return () => socket.off('receive_group_message');
     }, []);
 
+    const loadEarlier = async () => {
+        if (loadingEarlier || messages.length === 0) return;
+        setLoadingEarlier(true);
+        try {
+            const older = await fetchHistoryPage<GroupMessage>(`/message/group-history/${group_id}`, messages[0].id);
+            keepScrollRef.current = true;
+            setMessages(prev => [...older, ...prev]);
+            setHasEarlier(older.length >= HISTORY_PAGE_SIZE);
+        } catch (err) {
+            console.error("Failed to load earlier messages", err);
+        } finally {
+            setLoadingEarlier(false);
+        }
+    };
+
     const handleSend = () => {
         if (!message.trim()) return;
         socket.emit('send_group_message', {
@@ -163,7 +178,19 @@ export default function GroupChat() {
                             keyExtractor={item => item.id}
                             renderItem={renderItem}
                             contentContainerStyle={{ paddingBottom: 12 }}
-                            onContentSizeChange={() => flatListRef.current?.scrollToEnd({ animated: true })}
+                            ListHeaderComponent={hasEarlier ? (
+                                <TouchableOpacity onPress={loadEarlier} disabled={loadingEarlier} style={{ alignItems: 'center', paddingVertical: 8 }}>
+                                    <Text className="text-muted-foreground">{loadingEarlier ? 'Loading...' : 'Load earlier messages'}</Text>
+                                </TouchableOpacity>
+                            ) : null}
+                            onContentSizeChange={() => {
+                                // Stay put when older messages were added above
+                                if (keepScrollRef.current) {
+                                    keepScrollRef.current = false;
+                                    return;
+                                }
+                                flatListRef.current?.scrollToEnd({ animated: true });
+                            }}
                             onLayout={() => flatListRef.current?.scrollToEnd({ animated: true })}
                         />
 
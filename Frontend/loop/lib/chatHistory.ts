@@ -0,0 +1,18 @@
+import * as SecureStore from "expo-secure-store";
+
+// Same as the server's default history page size; a shorter page means there is nothing older
+export const HISTORY_PAGE_SIZE = 50;
+
+// One page of chat history, oldest first. Pass the oldest loaded message id as `before` to scroll back.
+export async function fetchHistoryPage<T>(path: string, before?: string | number): Promise<T[]> {
+    const token = await SecureStore.getItemAsync("access_token");
+    const query = before !== undefined ? `?before=${encodeURIComponent(before)}` : "";
+    const res = await fetch(`${process.env.EXPO_PUBLIC_API_URL}${path}${query}`, {
+        headers: { Authorization: `Bearer ${token}` },
+    });
+    const data = await res.json();
+    if (!Array.isArray(data)) {
+        throw new Error(data.error || "Failed to load messages");
+    }
+    return data as T[];
+}
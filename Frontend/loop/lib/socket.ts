@@ -1,18 +1,29 @@
 import { io } from "socket.io-client";
+import * as SecureStore from "expo-secure-store";
 
-// Connect to your backend
+// Connect to your backend; the server authenticates the socket once with the access token
 export const socket = io(process.env.EXPO_PUBLIC_API_URL as string, {
     transports: ["websocket"],
     autoConnect: false,
+    auth: (cb) => {
+        SecureStore.getItemAsync("access_token").then((token) => cb({ token }));
+    },
 });
 
+// Keeps the user marked online; the server drops sockets that go quiet for 90s
+const HEARTBEAT_INTERVAL_MS = 30000;
+let heartbeat: ReturnType<typeof setInterval> | undefined;
+
 // Log connection status
 socket.on("connect", () => {
     console.log("Connected to Socket.IO server");
+    clearInterval(heartbeat);
+    heartbeat = setInterval(() => socket.emit("heartbeat"), HEARTBEAT_INTERVAL_MS);
 });
 
 socket.on("disconnect", () => {
     console.log("Disconnected from Socket.IO server");
+    clearInterval(heartbeat);
 });
 
 socket.on("connect_error", (err) => {
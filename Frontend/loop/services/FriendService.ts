@@ -13,6 +13,26 @@ export type FriendRequest = {
   profile_picture_url?: string;
 };
 
+export type FriendPage = {
+  friends: User[];
+  next_cursor: string | null;
+};
+
+export type FriendRequestPage = {
+  pending_requests: FriendRequest[];
+  next_cursor: string | null;
+};
+
+export type SuggestionPage = {
+  users: User[];
+  next_cursor: string | null;
+};
+
+export type FriendCounts = {
+  friends: number;
+  pending_requests: number;
+};
+
 export class FriendService {
   private static apiUrl = process.env.EXPO_PUBLIC_API_URL;
 
@@ -34,37 +54,70 @@ export class FriendService {
     return await response.json();
   }
 
+  // Every friend, following the pages (pickers need the whole list)
   static async getMyFriends(): Promise<User[]> {
+    const friends: User[] = [];
+    let before: string | undefined;
+    do {
+      const page = await this.getFriendPage(before, 100);
+      friends.push(...page.friends);
+      before = page.next_cursor ?? undefined;
+    } while (before);
+    return friends;
+  }
+
+  static async getFriendPage(before?: string, limit?: number): Promise<FriendPage> {
+    const response = await this.getPage("/friends/list", before, limit);
+    if (!response.ok) {
+      throw new Error("Failed to fetch friends list");
+    }
+    return (await response.json()) as FriendPage;
+  }
+
+  static async getPendingRequests(): Promise<FriendRequest[]> {
+    const requests: FriendRequest[] = [];
+    let before: string | undefined;
+    do {
+      const page = await this.getPendingRequestPage(before, 100);
+      requests.push(...page.pending_requests);
+      before = page.next_cursor ?? undefined;
+    } while (before);
+    return requests;
+  }
+
+  static async getPendingRequestPage(before?: string, limit?: number): Promise<FriendRequestPage> {
+    const response = await this.getPage("/friends/requests/pending", before, limit);
+    if (!response.ok) {
+      throw new Error("Failed to fetch pending requests");
+    }
+    return (await response.json()) as FriendRequestPage;
+  }
+
+  static async getCounts(): Promise<FriendCounts> {
     const token = await SecureStore.getItemAsync("access_token");
-    const response = await fetch(`${this.apiUrl}/friends/list`, {
-      method: "GET",
+    const response = await fetch(`${this.apiUrl}/friends/counts`, {
       headers: {
         Authorization: `Bearer ${token}`,
       },
     });
 
     if (!response.ok) {
-      throw new Error("Failed to fetch friends list");
+      throw new Error("Failed to fetch friend counts");
     }
-
-    const r = await response.json();
-    console.log(r);
-    return r;
+    return (await response.json()) as FriendCounts;
   }
 
-  static async getPendingRequests(): Promise<FriendRequest[]> {
+  private static async getPage(path: string, before?: string, limit?: number) {
     const token = await SecureStore.getItemAsync("access_token");
-    const response = await fetch(`${this.apiUrl}/friends/requests/pending`, {
+    const params = new URLSearchParams();
+    if (before) params.set("before", before);
+    if (limit) params.set("limit", String(limit));
+    const query = params.toString() ? `?${params}` : "";
+    return fetch(`${this.apiUrl}${path}${query}`, {
       headers: {
         Authorization: `Bearer ${token}`,
       },
     });
-  
-    if (!response.ok) {
-      throw new Error("Failed to fetch pending requests");
-    }
-    const data = await response.json();
-    return data as FriendRequest[]; // assuming backend returns { friends: [...] }
   }
 
   static async respondToFriendRequest(requestId: string, action: "accept" | "reject") {
@@ -85,21 +138,17 @@ export class FriendService {
     return await response.json();
   }
 
-  static async suggestUsers() {
-    const token = await SecureStore.getItemAsync("access_token");
-
-    const response = await fetch(`${this.apiUrl}/friends/suggestions`, {
-      method: "GET",
-      headers: {
-        Authorization: `Bearer ${token}`,
-      },
-    });
+  static async suggestUsers(): Promise<User[]> {
+    const page = await this.getSuggestionPage();
+    return page.users;
+  }
 
+  static async getSuggestionPage(before?: string, limit?: number): Promise<SuggestionPage> {
+    const response = await this.getPage("/friends/suggestions", before, limit);
     if (!response.ok) {
       throw new Error("Failed to fetch users");
     }
-    const data = await response.json();
-    return data;
+    return (await response.json()) as SuggestionPage;
   }
 
 }
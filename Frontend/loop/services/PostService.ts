@@ -2,6 +2,7 @@ import * as SecureStore from "expo-secure-store";
 import type { Category } from './CommunityService';
 
 type Comment = {
+  id: number;
   user: string;
   content: string;
   created_at: string;
@@ -15,10 +16,23 @@ export type Post = {
   content: string;
   created_at: string;
   likes: number;
+  comment_count: number;
+  // Only the latest few comments; use getComments for the full thread
   comments: Comment[];
   liked_by_user: boolean;
 };
 
+export type PostPage = {
+  posts: Post[];
+  next_cursor: string | null;
+};
+
+export type CommentPage = {
+  comments: Comment[];
+  comment_count: number;
+  next_cursor: string | null;
+};
+
 export interface CreatePostPayload {
   communityId: number;
   content:     string;
@@ -28,9 +42,15 @@ export interface CreatePostPayload {
 export class PostService {
   private static apiUrl = process.env.EXPO_PUBLIC_API_URL;
 
-  static async getPosts(): Promise<Post[]> {
+  static async getPosts(before?: string): Promise<Post[]> {
+    const page = await this.getPostPage(before);
+    return page.posts;
+  }
+
+  static async getPostPage(before?: string): Promise<PostPage> {
     const token = await SecureStore.getItemAsync("access_token");
-    const response = await fetch(`${this.apiUrl}/post`, {
+    const query = before ? `?before=${encodeURIComponent(before)}` : "";
+    const response = await fetch(`${this.apiUrl}/post${query}`, {
       headers: {
         Authorization: `Bearer ${token}`,
       },
@@ -41,7 +61,7 @@ export class PostService {
     }
 
     const data = await response.json();
-    return data as Post[];
+    return data as PostPage;
   }
 
   static async createPost({ communityId, content, topic }: CreatePostPayload) {
@@ -83,6 +103,22 @@ export class PostService {
     return await response.json();
   }
 
+  static async getComments(postId: string, before?: string): Promise<CommentPage> {
+    const token = await SecureStore.getItemAsync("access_token");
+    const query = before ? `?before=${encodeURIComponent(before)}` : "";
+    const response = await fetch(`${this.apiUrl}/post/${postId}/comments${query}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+
+    if (!response.ok) {
+      throw new Error("Failed to fetch comments");
+    }
+
+    return (await response.json()) as CommentPage;
+  }
+
   static async commentOnPost(postId: string, comment: string) {
     const token = await SecureStore.getItemAsync("access_token");
     const response = await fetch(`${this.apiUrl}/post/${postId}/comment`, {